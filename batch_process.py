@@ -0,0 +1,332 @@
+"""Xử lý hàng loạt video không cần giao diện (không import PyQt6)
+
+Ví dụ:
+    python batch_process.py videos --model YOLOv3 --classes person car --workers 4
+    python batch_process.py "videos/*.mp4" --format npz --output results
+    python batch_process.py videos --export-video --video-writer ffmpeg
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from config import YOLO_CONFIGS, CLASSES, EXPORT, VIDEO_INDEX
+from exporter import DetectionExporter
+from model_registry import create_detector
+
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mkv', '.mov']
+OUTPUT_FORMATS = ['jsonl', 'npz']
+
+# Mỗi process worker giữ một detector riêng
+_detector = None
+_model_name = None
+_target_objects = None
+_export = None  # Cấu hình EXPORT nếu xuất thêm video đã vẽ kết quả
+
+
+def find_videos(source):
+    """Lấy danh sách video từ một thư mục hoặc một mẫu glob"""
+    if os.path.isdir(source):
+        files = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        files = glob.glob(source)
+
+    return sorted(f for f in files
+                  if os.path.isfile(f) and os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS)
+
+
+def source_root(videos):
+    """Thư mục chung gần nhất của các video"""
+    return os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in videos])
+
+
+def output_path_for(video_path, output_dir, output_format, root=None):
+    """File kết quả của video; root: giữ cấu trúc thư mục con tính từ root để video trùng tên không đè nhau"""
+    if root is None:
+        name = os.path.basename(video_path)
+    else:
+        name = os.path.relpath(os.path.abspath(video_path), root)
+    return os.path.join(output_dir, f"{os.path.splitext(name)[0]}.{output_format}")
+
+
+class JsonlWriter:
+    """Ghi detections: dòng đầu là thông tin video, mỗi dòng sau là một frame"""
+
+    def __init__(self, file, meta):
+        self.file = open(file, "w", encoding="utf-8")
+        self.file.write(json.dumps(meta, ensure_ascii=False) + "\n")
+
+    def write(self, frame_index, timestamp, detections):
+        record = {
+            "frame": frame_index,
+            "time": round(timestamp, 3),
+            "detections": [
+                {"class": class_name, "confidence": round(conf, 4), "box": box}
+                for class_name, conf, box in detections
+            ]
+        }
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class NpzWriter:
+    """Ghi detections dạng mảng nén: mỗi detection một dòng, kèm chỉ số frame"""
+
+    def __init__(self, file, meta):
+        self.file = file
+        self.meta = meta
+        self.frames = []
+        self.class_ids = []
+        self.confidences = []
+        self.boxes = []
+        self.frame_times = []
+        self.class_index = {name: i for i, name in enumerate(meta["classes"])}
+
+    def write(self, frame_index, timestamp, detections):
+        self.frame_times.append(timestamp)
+        for class_name, conf, box in detections:
+            self.frames.append(frame_index)
+            self.class_ids.append(self.class_index[class_name])
+            self.confidences.append(conf)
+            self.boxes.append(box)
+
+    def close(self):
+        with open(self.file, "wb") as f:
+            np.savez_compressed(
+                f,
+                frame=np.array(self.frames, dtype=np.int32),
+                class_id=np.array(self.class_ids, dtype=np.int16),
+                confidence=np.array(self.confidences, dtype=np.float32),
+                box=np.array(self.boxes, dtype=np.int32).reshape(-1, 4),
+                frame_time=np.array(self.frame_times, dtype=np.float64),
+                meta=np.array(json.dumps(self.meta, ensure_ascii=False))
+            )
+
+
+WRITERS = {'jsonl': JsonlWriter, 'npz': NpzWriter}
+
+
+def process_video(detector, video_path, target_objects, writer, exporter=None):
+    """Chạy detect_batch trên toàn bộ video và ghi kết quả từng frame, trả về số frame
+
+    exporter (tùy chọn): DetectionExporter vẽ và mã hóa video kết quả trong thread riêng
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Không thể mở file video: {video_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_index = 0
+    try:
+        while True:
+            frames = []
+            while len(frames) < detector.batch_size:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frames.append(frame)
+            if not frames:
+                break
+
+            for frame, frame_detections in zip(frames, detector.detect_batch(frames, target_objects)):
+                timestamp = frame_index * 1000.0 / fps if fps > 0 else cap.get(cv2.CAP_PROP_POS_MSEC)
+                writer.write(frame_index, timestamp, frame_detections)
+                if exporter is not None:
+                    exporter.submit(frame, frame_detections, frame_index, timestamp)
+                frame_index += 1
+    finally:
+        cap.release()
+
+    return frame_index
+
+
+def video_meta(video_path, model_name, detector):
+    cap = cv2.VideoCapture(video_path)
+    meta = {
+        "video": video_path,
+        "model": model_name,
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "conf_threshold": detector.conf_threshold,
+        "nms_threshold": detector.nms_threshold,
+        "classes": detector.classes
+    }
+    cap.release()
+    return meta
+
+
+def init_worker(model_name, target_objects, batch_size, threads, export=None):
+    """Khởi tạo detector một lần cho mỗi process worker"""
+    global _detector, _model_name, _target_objects, _export
+    if threads:
+        cv2.setNumThreads(threads)
+    _detector = create_detector(model_name, batch_size=batch_size)
+    _model_name = model_name
+    _target_objects = target_objects
+    _export = export
+
+
+def annotated_path_for(output_path, extension=".mp4"):
+    """Video đã vẽ kết quả nằm cạnh file detections (thêm hậu tố để không ghi đè video gốc)"""
+    return f"{os.path.splitext(output_path)[0]}_annotated{extension}"
+
+
+def create_video_exporter(path, meta):
+    """Exporter chỉ ghi video (detections đã có writer riêng); chặn khi đầy để không mất frame"""
+    return DetectionExporter(
+        path,
+        None,
+        meta["fps"],
+        {name: {'rgb': (0, 255, 0)} for name in CLASSES},
+        _export.get('video_writer', "opencv"),
+        _export.get('codec', "mp4v"),
+        _export.get('ffmpeg_args'),
+        _export.get('queue_size', 32),
+        block=True
+    )
+
+
+def run_job(job):
+    """Xử lý một video; ghi ra file tạm rồi đổi tên khi xong để hỗ trợ resume"""
+    video_path, output_path, output_format = job
+    temp_path = output_path + ".part"
+    # Video tạm giữ nguyên phần mở rộng để VideoWriter/ffmpeg chọn đúng container
+    extension = _export.get('extension', ".mp4") if _export else ".mp4"
+    annotated_path = annotated_path_for(output_path, extension) if _export else None
+    annotated_temp = f"{os.path.splitext(annotated_path)[0]}.part{extension}" if _export else None
+    started = time.monotonic()
+    try:
+        meta = video_meta(video_path, _model_name, _detector)
+        writer = WRITERS[output_format](temp_path, meta)
+        exporter = create_video_exporter(annotated_temp, meta) if _export else None
+        try:
+            frames = process_video(_detector, video_path, _target_objects, writer, exporter=exporter)
+        finally:
+            writer.close()
+            if exporter is not None:
+                exporter.close()
+
+        if exporter is not None:
+            if exporter.error is not None:
+                raise IOError(exporter.error)
+            os.replace(annotated_temp, annotated_path)
+        os.replace(temp_path, output_path)
+        return {"video": video_path, "frames": frames, "seconds": time.monotonic() - started}
+    except Exception as e:
+        for path in (temp_path, annotated_temp):
+            if path and os.path.exists(path):
+                os.remove(path)
+        return {"video": video_path, "error": str(e), "seconds": time.monotonic() - started}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Phát hiện đối tượng hàng loạt trên video (không giao diện)")
+    parser.add_argument("source", nargs="?", default="videos", help="Thư mục video hoặc mẫu glob")
+    parser.add_argument("--model", default="YOLOv3", choices=list(YOLO_CONFIGS.keys()))
+    parser.add_argument("--classes", nargs="+", default=None,
+                        help="Danh sách đối tượng cần phát hiện (mặc định: tất cả)")
+    parser.add_argument("--output", default="results", help="Thư mục lưu kết quả")
+    parser.add_argument("--format", default="jsonl", choices=OUTPUT_FORMATS)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Số luồng OpenCV cho mỗi worker (mặc định: số core / số worker)")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--overwrite", action="store_true", help="Xử lý lại cả các video đã có kết quả")
+    parser.add_argument("--export-video", action="store_true",
+                        help="Ghi thêm video đã vẽ kết quả (mặc định chỉ ghi detections, không mã hóa lại)")
+    parser.add_argument("--video-writer", default=EXPORT['video_writer'], choices=["opencv", "ffmpeg"])
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    target_objects = [name.lower() for name in args.classes] if args.classes else list(CLASSES)
+    unknown = [name for name in target_objects if name not in CLASSES]
+    if unknown:
+        print(f"Đối tượng không hợp lệ: {', '.join(unknown)}")
+        return 2
+
+    videos = find_videos(args.source)
+    if not videos:
+        print(f"Không tìm thấy video: {args.source}")
+        return 1
+
+    export = dict(EXPORT, video_writer=args.video_writer) if args.export_video else None
+
+    # Resume: bỏ qua video đã có đủ mọi file kết quả được yêu cầu (detections và video nếu xuất)
+    root = source_root(videos)
+    jobs = []
+    for video_path in videos:
+        output_path = output_path_for(video_path, args.output, args.format, root)
+        outputs = [output_path]
+        if export is not None:
+            outputs.append(annotated_path_for(output_path, export.get('extension', ".mp4")))
+        if all(os.path.exists(path) for path in outputs) and not args.overwrite:
+            continue
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        jobs.append((video_path, output_path, args.format))
+
+    skipped = len(videos) - len(jobs)
+    print(f"Tìm thấy {len(videos)} video, bỏ qua {skipped} video đã xử lý, còn {len(jobs)} video")
+    if not jobs:
+        return 0
+
+    workers = max(1, min(args.workers, len(jobs)))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    initargs = (args.model, target_objects, args.batch_size, threads, export)
+
+    started = time.monotonic()
+    failed = 0
+    total_frames = 0
+    output_paths = {job[0]: job[1] for job in jobs}
+    completed = []  # File kết quả đã xong, để cập nhật index tìm kiếm
+
+    def report(done, result):
+        nonlocal failed, total_frames
+        elapsed = time.monotonic() - started
+        eta = elapsed / done * (len(jobs) - done)
+        if "error" in result:
+            failed += 1
+            print(f"[{done}/{len(jobs)}] LỖI {result['video']}: {result['error']}")
+        else:
+            total_frames += result['frames']
+            completed.append(output_paths[result['video']])
+            fps = result['frames'] / result['seconds'] if result['seconds'] > 0 else 0
+            print(f"[{done}/{len(jobs)}] {result['video']}: {result['frames']} frame, "
+                  f"{fps:.1f} fps, còn khoảng {eta:.0f}s")
+        sys.stdout.flush()
+
+    if workers == 1:
+        init_worker(*initargs)
+        for done, result in enumerate(map(run_job, jobs), 1):
+            report(done, result)
+    else:
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+            for done, result in enumerate(pool.imap_unordered(run_job, jobs), 1):
+                report(done, result)
+
+    elapsed = time.monotonic() - started
+    print(f"Hoàn thành {len(jobs) - failed}/{len(jobs)} video, {total_frames} frame trong {elapsed:.1f}s")
+
+    if VIDEO_INDEX['update_after_batch'] and completed:
+        from video_index import update_index
+        try:
+            print(f"Đã cập nhật index tìm kiếm: {update_index(completed)} video")
+        except Exception as e:
+            print(f"Không cập nhật được index tìm kiếm: {str(e)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""Benchmark offline cho các model YOLO (chỉ cần CPU, không cần mạng hay file .weights thật)
+
+Weights được sinh ngẫu nhiên (có seed) theo đúng cấu trúc của file .cfg nên tốc độ giống
+weights thật. Mỗi cấu hình chạy trong một process riêng để đo đúng peak RSS và số luồng.
+
+Ví dụ:
+    python benchmark.py run --models YOLOv3 --sizes 320 416 --batch-sizes 1 4 --threads 1 4
+    python benchmark.py run --video videos/test.mp4 --output bench/current.json
+    python benchmark.py compare bench/baseline.json bench/current.json --tolerance 0.1
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from config import YOLO_CONFIGS, CLASSES
+from darknet_cfg import parse_cfg
+
+try:
+    import resource
+except ImportError:  # Windows: không đo được peak RSS, bỏ qua cột này
+    resource = None
+
+WEIGHTS_DIR = os.path.join("cache", "bench_weights")
+
+
+def peak_rss_mb():
+    """Peak RSS của process (MB), None nếu hệ điều hành không hỗ trợ"""
+    if resource is None:
+        return None
+    # ru_maxrss trên Linux tính bằng KB, trên macOS bằng byte
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def conv_layers(cfg_path):
+    """List (filters, số kênh vào, kernel size, groups, batch_normalize) của các lớp convolutional"""
+    sections = parse_cfg(cfg_path)
+    net = sections[0][1]
+    channels = int(net.get("channels", 3))
+    outputs = []  # Số kênh ra của từng layer (không tính [net])
+    convs = []
+
+    for name, params in sections[1:]:
+        if name == "convolutional":
+            filters = int(params["filters"])
+            groups = int(params.get("groups", 1))
+            convs.append((filters, channels, int(params["size"]), groups, int(params.get("batch_normalize", 0))))
+            channels = filters
+        elif name == "route":
+            layers = [int(v) for v in params["layers"].split(",")]
+            layers = [i if i >= 0 else len(outputs) + i for i in layers]
+            channels = sum(outputs[i] for i in layers) // int(params.get("groups", 1))
+        elif name == "reorg":
+            stride = int(params.get("stride", 2))
+            channels = channels * stride * stride
+        # maxpool, shortcut, upsample, yolo, region, dropout... giữ nguyên số kênh
+        outputs.append(channels)
+    return convs
+
+
+def write_random_weights(cfg_path, weights_path, seed=0):
+    """Sinh file .weights Darknet với giá trị ngẫu nhiên nhỏ (khởi tạo kiểu He) cho cfg"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(weights_path) or ".", exist_ok=True)
+    tmp_path = weights_path + ".part"
+    with open(tmp_path, "wb") as f:
+        # Header: major, minor, revision (int32), seen (int64 vì version >= 0.2)
+        np.array([0, 2, 0], dtype=np.int32).tofile(f)
+        np.array([0], dtype=np.int64).tofile(f)
+
+        for filters, in_channels, size, groups, batch_normalize in conv_layers(cfg_path):
+            fan_in = in_channels // groups * size * size
+            np.zeros(filters, dtype=np.float32).tofile(f)  # biases
+            if batch_normalize:
+                np.ones(filters, dtype=np.float32).tofile(f)  # scales
+                np.zeros(filters, dtype=np.float32).tofile(f)  # rolling mean
+                np.ones(filters, dtype=np.float32).tofile(f)  # rolling variance
+            weights = rng.standard_normal(filters * fan_in, dtype=np.float32) * np.sqrt(1.0 / fan_in)
+            weights.astype(np.float32).tofile(f)
+    os.replace(tmp_path, weights_path)
+
+
+def bench_weights(model_name, seed=0):
+    """Đường dẫn weights ngẫu nhiên cho model, sinh mới nếu cfg thay đổi hoặc chưa có"""
+    cfg_path = YOLO_CONFIGS[model_name]["config"]
+    with open(cfg_path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    weights_path = os.path.join(WEIGHTS_DIR, f"{model_name}_{digest}_{seed}.weights")
+    if not os.path.exists(weights_path):
+        print(f"Sinh weights ngẫu nhiên cho {model_name}...")
+        write_random_weights(cfg_path, weights_path, seed)
+    return weights_path
+
+
+def load_frames(video_path, count, width=1280, height=720, seed=0):
+    """Frame từ video (lặp lại nếu thiếu) hoặc frame tổng hợp cố định theo seed"""
+    import cv2
+
+    frames = []
+    if video_path:
+        cap = cv2.VideoCapture(video_path)
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        if not frames:
+            raise RuntimeError(f"Không đọc được frame từ {video_path}")
+        recorded = len(frames)
+        while len(frames) < count:
+            frames.append(frames[len(frames) % recorded])
+        return frames
+
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        # Thêm vài hình khối để ảnh không chỉ là nhiễu
+        for _ in range(8):
+            x, y = int(rng.integers(0, width - 100)), int(rng.integers(0, height - 100))
+            w, h = int(rng.integers(20, 200)), int(rng.integers(20, 200))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+        frames.append(frame)
+    return frames
+
+
+def run_case(case):
+    """Chạy một cấu hình trong process con; trả về dict kết quả"""
+    import cv2
+    from timing import timings
+    from utils import draw_detections
+    from yolo import YOLODetector
+
+    cv2.setNumThreads(case["threads"])
+    config = YOLO_CONFIGS[case["model"]]
+    weights = config["weights"] if case["real_weights"] else bench_weights(case["model"], case["seed"])
+    detector = YOLODetector(
+        weights,
+        config["config"],
+        case["conf_threshold"] if case["conf_threshold"] is not None else config["conf_threshold"],
+        config["nms_threshold"],
+        case["batch_size"],
+        backend="cpu",
+        input_size=case["input_size"]
+    )
+    frames = load_frames(case["video"], case["frames"], seed=case["seed"])
+    colors = {name: {"rgb": (0, 255, 0)} for name in CLASSES}
+
+    started = time.perf_counter()
+    detector.warmup()
+    warmup_seconds = time.perf_counter() - started
+
+    timings.reset()
+    detections_total = 0
+    started = time.perf_counter()
+    for _ in range(case["repeat"]):
+        for start in range(0, len(frames), case["batch_size"]):
+            chunk = frames[start:start + case["batch_size"]]
+            for frame, detections in zip(chunk, detector.detect_batch(chunk, CLASSES)):
+                detections_total += len(detections)
+                with timings.measure("draw"):
+                    draw_detections(frame.copy(), detections, colors)
+    elapsed = time.perf_counter() - started
+    processed = len(frames) * case["repeat"]
+
+    return {
+        "model": case["model"],
+        "input_size": case["input_size"],
+        "batch_size": case["batch_size"],
+        "threads": case["threads"],
+        "frames": processed,
+        "seconds": elapsed,
+        "fps": processed / elapsed if elapsed > 0 else 0.0,
+        "warmup_seconds": warmup_seconds,
+        "detections": detections_total,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": timings.summary()
+    }
+
+
+def case_key(result):
+    return result["model"], result["input_size"], result["batch_size"], result["threads"]
+
+
+def environment():
+    import cv2
+
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__
+    }
+
+
+def run(args):
+    cases = [
+        {
+            "model": model,
+            "input_size": size,
+            "batch_size": batch_size,
+            "threads": threads,
+            "frames": args.frames,
+            "repeat": args.repeat,
+            "video": args.video,
+            "seed": args.seed,
+            "real_weights": args.real_weights,
+            "conf_threshold": args.conf_threshold
+        }
+        for model in args.models
+        for size in args.sizes
+        for batch_size in args.batch_sizes
+        for threads in args.threads
+    ]
+
+    results = []
+    # spawn: mỗi cấu hình một process mới để peak RSS và số luồng không ảnh hưởng lẫn nhau
+    context = multiprocessing.get_context("spawn")
+    for i, case in enumerate(cases, 1):
+        with context.Pool(1) as pool:
+            try:
+                result = pool.apply(run_case, (case,))
+            except Exception as e:
+                print(f"[{i}/{len(cases)}] LỖI {case_key(case)}: {str(e)}")
+                continue
+        results.append(result)
+        forward = result["stages"].get("forward", {})
+        rss = f" | RSS {result['peak_rss_mb']:.0f} MB" if result["peak_rss_mb"] is not None else ""
+        print(f"[{i}/{len(cases)}] {result['model']} {result['input_size']} batch {result['batch_size']}"
+              f" threads {result['threads']}: {result['fps']:.1f} FPS"
+              f" | forward p50 {forward.get('p50_ms', 0):.1f} ms p95 {forward.get('p95_ms', 0):.1f} ms{rss}")
+
+    report = {"environment": environment(), "results": results}
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Đã lưu kết quả: {args.output}")
+    return 0 if len(results) == len(cases) else 1
+
+
+def compare(args):
+    """So sánh hai file kết quả; trả về 1 nếu FPS giảm hoặc p95 của stage tăng quá tolerance"""
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = {case_key(result): result for result in json.load(f)["results"]}
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = {case_key(result): result for result in json.load(f)["results"]}
+
+    regressions = []
+    for key, result in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        name = " ".join(str(v) for v in key)
+        if result["fps"] < base["fps"] * (1 - args.tolerance):
+            regressions.append(f"{name}: FPS {base['fps']:.1f} -> {result['fps']:.1f}")
+        for stage in args.stages:
+            before = base["stages"].get(stage, {}).get("p95_ms")
+            after = result["stages"].get(stage, {}).get("p95_ms")
+            if before and after and after > before * (1 + args.tolerance):
+                regressions.append(f"{name}: {stage} p95 {before:.2f} ms -> {after:.2f} ms")
+        # Kết quả đo trên Windows không có peak RSS
+        before, after = base.get("peak_rss_mb"), result.get("peak_rss_mb")
+        if before and after and after > before * (1 + args.memory_tolerance):
+            regressions.append(f"{name}: RSS {base['peak_rss_mb']:.0f} MB -> {result['peak_rss_mb']:.0f} MB")
+
+    missing = [key for key in baseline if key not in current]
+    print(f"So sánh {len(current)} cấu hình, thiếu {len(missing)} cấu hình so với baseline")
+    for line in regressions:
+        print(f"CHẬM HƠN: {line}")
+    if not regressions:
+        print("Không có regression")
+    return 1 if regressions else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline cho các model YOLO")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Chạy benchmark và lưu JSON")
+    run_parser.add_argument("--models", nargs="+", default=list(YOLO_CONFIGS.keys()),
+                            choices=list(YOLO_CONFIGS.keys()))
+    run_parser.add_argument("--sizes", nargs="+", type=int, default=[416])
+    run_parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1])
+    run_parser.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count() or 1])
+    run_parser.add_argument("--frames", type=int, default=16, help="Số frame mỗi lượt")
+    run_parser.add_argument("--repeat", type=int, default=2, help="Số lượt chạy lại các frame")
+    run_parser.add_argument("--video", default=None, help="Dùng frame từ video thay cho frame tổng hợp")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--real-weights", action="store_true",
+                            help="Dùng file .weights trong YOLO_CONFIGS thay cho weights ngẫu nhiên")
+    run_parser.add_argument("--conf-threshold", type=float, default=None)
+    run_parser.add_argument("--output", default=os.path.join("bench", "results.json"))
+
+    compare_parser = commands.add_parser("compare", help="So sánh với kết quả baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1,
+                                help="Tỉ lệ chậm hơn cho phép (0.1 = 10%%)")
+    compare_parser.add_argument("--memory-tolerance", type=float, default=0.2)
+    compare_parser.add_argument("--stages", nargs="+", default=["forward", "postprocess", "blob"])
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "compare":
+        return compare(args)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Đo thời gian khởi động và chi phí import, báo lỗi khi chậm hơn baseline
+
+Mỗi probe chạy trong một process Python mới (như khi mở ứng dụng hoặc tạo worker):
+    gui     import main và hiện cửa sổ chính (QT_QPA_PLATFORM=offscreen nếu không có màn hình)
+    worker  import batch_process như một worker xử lý hàng loạt
+
+Ví dụ:
+    python check_startup.py --save bench/startup.json
+    python check_startup.py --baseline bench/startup.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Module không được có trong process sau khi probe chạy xong (nạp khi dùng lần đầu)
+FORBIDDEN = {
+    "gui": ["torch", "cv2", "numpy", "detector", "model_registry", "yolo", "multi_stream"],
+    "worker": ["torch", "PyQt6"]
+}
+
+PROBE_CODE = """
+import json, os, sys, time
+started = time.perf_counter()
+probe = sys.argv[1]
+if probe == "gui":
+    import main
+    imported = time.perf_counter()
+    from PyQt6.QtWidgets import QApplication
+    app = QApplication(sys.argv[:1])
+    window = main.MainWindow()
+    window.show()
+else:
+    import batch_process
+    imported = time.perf_counter()
+ready = time.perf_counter()
+try:
+    import resource
+    # ru_maxrss trên Linux tính bằng KB, trên macOS bằng byte
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+except ImportError:  # Windows
+    peak_rss = 0.0
+print(json.dumps({
+    "import_seconds": imported - started,
+    "ready_seconds": ready - started,
+    "peak_rss_mb": peak_rss,
+    "modules": sorted(name for name in sys.modules if "." not in name)
+}))
+"""
+
+
+def run_probe(probe):
+    """Chạy một probe trong process mới; trả về dict kết quả (thời gian tính cả khởi động Python)"""
+    env = dict(os.environ)
+    if probe == "gui" and not env.get("DISPLAY") and sys.platform.startswith("linux"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", PROBE_CODE, probe], capture_output=True, text=True,
+                               env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    total = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Probe {probe} lỗi:\n{completed.stderr.strip()}")
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["probe"] = probe
+    result["total_seconds"] = total
+    result["forbidden"] = [name for name in FORBIDDEN[probe] if name in result["modules"]]
+    return result
+
+
+def measure(probes, repeat):
+    """Lấy lần nhanh nhất trong repeat lần chạy của mỗi probe để giảm nhiễu"""
+    results = {}
+    for probe in probes:
+        runs = [run_probe(probe) for _ in range(repeat)]
+        results[probe] = min(runs, key=lambda result: result["total_seconds"])
+    return results
+
+
+def compare(baseline, current, tolerance, memory_tolerance):
+    regressions = []
+    for probe, result in current.items():
+        base = baseline.get(probe)
+        if base is None:
+            continue
+        for key in ("total_seconds", "ready_seconds"):
+            if result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{probe}: {key} {base[key]:.3f}s -> {result[key]:.3f}s")
+        if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + memory_tolerance):
+            regressions.append(f"{probe}: RSS {base['peak_rss_mb']:.0f} MB -> {result['peak_rss_mb']:.0f} MB")
+        added = sorted(set(result["modules"]) - set(base["modules"]))
+        if added:
+            regressions.append(f"{probe}: thêm module lúc khởi động: {', '.join(added)}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Kiểm tra thời gian khởi động và chi phí import")
+    parser.add_argument("--probes", nargs="+", default=list(FORBIDDEN), choices=list(FORBIDDEN))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", default=None, help="Lưu kết quả làm baseline (JSON)")
+    parser.add_argument("--baseline", default=None, help="So sánh với baseline đã lưu")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Tỉ lệ chậm hơn cho phép")
+    parser.add_argument("--memory-tolerance", type=float, default=0.1, help="Tỉ lệ tăng RSS cho phép")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        results = measure(args.probes, max(1, args.repeat))
+    except Exception as e:
+        print(f"Lỗi: {str(e)}")
+        return 1
+
+    failures = []
+    for probe, result in results.items():
+        print(f"{probe}: import {result['import_seconds']:.3f}s | sẵn sàng {result['ready_seconds']:.3f}s"
+              f" | tổng {result['total_seconds']:.3f}s | RSS {result['peak_rss_mb']:.0f} MB")
+        if result["forbidden"]:
+            failures.append(f"{probe}: import sớm {', '.join(result['forbidden'])}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Đã lưu baseline: {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures += compare(json.load(f), results, args.tolerance, args.memory_tolerance)
+
+    for line in failures:
+        print(f"REGRESSION: {line}")
+    if not failures:
+        print("Không có regression")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,22 +3,114 @@ YOLO_CONFIGS = {
         "weights": "YOLO_MODEL/YOLO_V2/yolov2.weights",
         "config": "YOLO_MODEL/YOLO_V2/yolov2.cfg",
         "conf_threshold": 0.5,
-        "nms_threshold": 0.4
+        "nms_threshold": 0.4,
+        "batch_size": 4,
+        "input_size": 416
     },
     "YOLOv3": {
         "weights": "YOLO_MODEL/YOLO_V3/yolov3.weights",
         "config": "YOLO_MODEL/YOLO_V3/yolov3.cfg",
         "conf_threshold": 0.5,
-        "nms_threshold": 0.4
+        "nms_threshold": 0.4,
+        "batch_size": 4,
+        "input_size": 416
+        # Engine chạy mạng (xem engines.py), mặc định OpenCV DNN. Ví dụ dùng model INT8 từ darknet_onnx.py:
+        # "engine": {"type": "onnxruntime", "model": "YOLO_MODEL/YOLO_V3/yolov3_416.int8.onnx", "threads": 4}
+        # hoặc chọn backend/số luồng của OpenCV: {"type": "opencv", "dnn_backend": "openvino", "threads": 4}
     },
     "YOLOv4": {
         "weights": "YOLO_MODEL/YOLO_V4/yolov4.weights",
         "config": "YOLO_MODEL/YOLO_V4/yolov4.cfg",
         "conf_threshold": 0.5,
-        "nms_threshold": 0.4
+        "nms_threshold": 0.4,
+        "batch_size": 4,
+        "input_size": 416
     }
 }
 
+# Motion gate: bỏ qua inference khi khung hình gần như không đổi
+MOTION_GATE = {
+    "sensitivity": 0.01,  # Tỉ lệ pixel thay đổi tối thiểu (1%)
+    "pixel_threshold": 25,  # Chênh lệch độ sáng để coi một pixel là thay đổi
+    "max_reuse": 30  # Tối đa số frame liên tiếp dùng lại detections cũ
+}
+
+# Tracker: chỉ detect mỗi N frame (N tự điều chỉnh theo độ trễ), các frame còn lại dự đoán box
+TRACKER = {
+    "iou_threshold": 0.3,  # IoU tối thiểu để ghép detection với track
+    "max_age": 3,  # Số lần detect liên tiếp không khớp trước khi xóa track
+    "min_hits": 2,  # Số lần khớp để tính là một đối tượng (và bắt đầu hiển thị box)
+    "max_interval": 5  # N lớn nhất
+}
+
+# Chế độ chia ô cho video độ phân giải cao (tham số của YOLODetector.detect_tiled)
+TILING = {
+    "tile_size": 832,  # Kích thước ô (pixel trên frame gốc)
+    "overlap": 0.2,  # Tỉ lệ chồng lấn giữa hai ô liền kề
+    "include_full_frame": True  # Detect thêm cả frame để giữ các đối tượng lớn
+}
+
+# Tự động chỉnh kích thước input theo độ trễ đo được để đạt FPS mục tiêu
+ADAPTIVE_RESOLUTION = {
+    "sizes": [320, 416, 512, 608],  # Các kích thước được phép, từ nhỏ tới lớn
+    "target_fps": None,  # None: dùng FPS của nguồn video
+    "models": None,  # Ví dụ ["YOLOv2", "YOLOv3"]: cho phép chuyển sang model nhẹ hơn khi vẫn chậm
+    "patience": 5,  # Số lần đo liên tiếp vượt ngưỡng trước khi đổi kích thước
+    "cooldown": 2.0  # Số giây tối thiểu giữa hai lần đổi
+}
+
+# Bảng Objects Count: tần suất làm mới và thống kê thêm
+STATS = {
+    "refresh_hz": 5,  # Số lần cập nhật bảng mỗi giây
+    "window": 30,  # Số frame để tính trung bình trượt
+    "show_average": True,
+    "show_peak": True
+}
+
+# Nhịp phát video: "realtime" bám theo timestamp (bỏ frame khi chậm), "max" chạy nhanh nhất có thể
+PLAYBACK = {
+    "mode": "realtime",
+    "late_tolerance": 2.0  # Số frame được phép trễ trước khi bỏ frame
+}
+
+# Chế độ nhiều nguồn: mỗi dòng là chỉ số camera, file hoặc URL RTSP (thêm " @ fps" để giới hạn FPS)
+MULTI_STREAM = {
+    "sources": ["0", "videos/sample.mp4"],  # File cục bộ dùng thay camera khi thử nghiệm
+    "batch_size": 4,  # Số frame (từ các stream khác nhau) mỗi lần forward
+    "fps_cap": 10,  # Giới hạn FPS xử lý mặc định cho mỗi stream (None: không giới hạn)
+    "loop_files": True
+}
+
+# Detection Log: số dòng giữ lại, giới hạn lỗi lặp lại, ghi file xoay vòng (None: không ghi file)
+LOG = {
+    "max_entries": 1000,
+    "flush_ms": 200,  # Gom các dòng log mới trong khoảng này rồi mới cập nhật giao diện
+    "rate_limit": 5,  # Số thông báo giống nhau tối đa trong rate_period giây
+    "rate_period": 10.0,
+    "file": None,  # Ví dụ "logs/detection.log"
+    "max_file_bytes": 5 * 1024 * 1024,
+    "backup_count": 3
+}
+
+# Xuất video đã vẽ kết quả và file detections đi kèm (mã hóa trong thread riêng)
+EXPORT = {
+    "directory": "exports",
+    "video_writer": "opencv",  # "opencv" (cv2.VideoWriter) hoặc "ffmpeg" (pipe vào process ffmpeg)
+    "codec": "mp4v",  # FourCC cho cv2.VideoWriter
+    "ffmpeg_args": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p"],
+    "extension": ".mp4",
+    "sidecar_format": "jsonl",  # "jsonl" hoặc "npz" (cùng định dạng với batch_process)
+    "queue_size": 32,  # Số frame chờ mã hóa; đầy thì bỏ frame thay vì làm chậm inference
+    "max_gap_fill": 60  # Lặp lại frame trước cho tối đa số frame bị thiếu để giữ đúng thời lượng
+}
+
+# Index tìm kiếm lớp -> đoạn frame (video_index.py), cập nhật sau mỗi lần chạy batch_process
+VIDEO_INDEX = {
+    "path": "cache/video_index.json.gz",
+    "sources": ["results", "exports"],  # Thư mục chứa file kết quả .jsonl/.npz
+    "update_after_batch": True
+}
+
 CLASSES = [
     # Con người và phương tiện giao thông (9)
     "person", "bicycle", "car", "motorbike", "aeroplane", "bus", "train", "truck", "boat",
@@ -0,0 +1,17 @@
+"""Đọc file .cfg của Darknet (dùng chung cho benchmark.py và darknet_onnx.py)"""
+
+
+def parse_cfg(path):
+    """Đọc file .cfg Darknet thành list (tên section, dict tham số)"""
+    sections = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith("["):
+                sections.append((line.strip("[]").strip(), {}))
+            elif "=" in line and sections:
+                key, value = line.split("=", 1)
+                sections[-1][1][key.strip()] = value.strip()
+    return sections
@@ -0,0 +1,420 @@
+"""Chuyển model Darknet (cfg + weights) sang ONNX để chạy bằng ONNX Runtime, có thể lượng tử hóa INT8
+
+Output của model ONNX giống hệt output lớp region/yolo của cv2.dnn (đã decode box, xác suất
+lớp = objectness * xác suất lớp) nên YOLODetector.postprocess dùng chung cho cả hai engine.
+Lưới decode phụ thuộc kích thước input nên model được xuất ở một kích thước cố định.
+
+Ví dụ:
+    python darknet_onnx.py YOLOv3 --size 416 --check
+    python darknet_onnx.py YOLOv4 --quantize static --calibration videos/sample.mp4 --check
+
+Sau đó chọn engine trong YOLO_CONFIGS:
+    "engine": {"type": "onnxruntime", "model": "YOLO_MODEL/YOLO_V3/yolov3_416.int8.onnx", "threads": 4}
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from config import YOLO_CONFIGS
+from darknet_cfg import parse_cfg
+
+OPSET = 13
+IR_VERSION = 8  # Ghi rõ để model đọc được bằng ONNX Runtime cũ hơn bản onnx dùng khi chuyển
+BN_EPSILON = 1e-6  # Giống normalize_cpu của Darknet
+
+
+class GraphBuilder:
+    """Gom node và initializer của graph ONNX, đặt tên tensor tự động"""
+
+    def __init__(self):
+        from onnx import helper, numpy_helper
+
+        self.helper = helper
+        self.numpy_helper = numpy_helper
+        self.nodes = []
+        self.initializers = []
+        self.count = 0
+
+    def name(self, prefix):
+        self.count += 1
+        return f"{prefix}_{self.count}"
+
+    def const(self, array, prefix="const"):
+        name = self.name(prefix)
+        self.initializers.append(self.numpy_helper.from_array(np.asarray(array), name))
+        return name
+
+    def node(self, op, inputs, prefix=None, **attrs):
+        output = self.name(prefix or op.lower())
+        self.nodes.append(self.helper.make_node(op, inputs, [output], name=output, **attrs))
+        return output
+
+
+def read_weights(weights_path):
+    """Đọc toàn bộ giá trị float32 sau header của file .weights"""
+    with open(weights_path, "rb") as f:
+        major, minor, _ = np.fromfile(f, dtype=np.int32, count=3)
+        # Từ version 0.2 trường seen là int64
+        if major * 10 + minor >= 2 and major < 1000 and minor < 1000:
+            np.fromfile(f, dtype=np.int64, count=1)
+        else:
+            np.fromfile(f, dtype=np.int32, count=1)
+        return np.fromfile(f, dtype=np.float32)
+
+
+def activation(graph, x, name):
+    if name == "linear":
+        return x
+    if name == "leaky":
+        return graph.node("LeakyRelu", [x], alpha=0.1)
+    if name == "relu":
+        return graph.node("Relu", [x])
+    if name == "logistic":
+        return graph.node("Sigmoid", [x])
+    if name == "mish":
+        # x * tanh(softplus(x))
+        return graph.node("Mul", [x, graph.node("Tanh", [graph.node("Softplus", [x])])])
+    if name == "swish":
+        return graph.node("Mul", [x, graph.node("Sigmoid", [x])])
+    raise ValueError(f"Không hỗ trợ activation: {name}")
+
+
+def decode(graph, x, height, width, anchors, classes, net_size, yolo=True, scale_x_y=1.0):
+    """Decode output (N, A * (5 + classes), H, W) thành (N, H * W * A, 5 + classes) như cv2.dnn
+
+    Thứ tự dòng giống OpenCV: (hàng, cột, anchor). yolo=False là lớp region của YOLOv2
+    (anchor tính theo ô lưới, softmax cho lớp); yolo=True là lớp yolo (anchor theo pixel, sigmoid).
+    """
+    count = len(anchors)
+    cell = 5 + classes
+    rows = height * width * count
+
+    x = graph.node("Reshape", [x, graph.const(np.array([-1, count, cell, height, width], dtype=np.int64))])
+    x = graph.node("Transpose", [x], perm=[0, 3, 4, 1, 2])
+    x = graph.node("Reshape", [x, graph.const(np.array([-1, rows, cell], dtype=np.int64))])
+
+    def part(start, end):
+        return graph.node("Slice", [
+            x,
+            graph.const(np.array([start], dtype=np.int64)),
+            graph.const(np.array([end], dtype=np.int64)),
+            graph.const(np.array([2], dtype=np.int64))
+        ])
+
+    # Tọa độ ô (cột, hàng) và kích thước anchor cho từng dòng
+    ys, xs = np.meshgrid(np.arange(height), np.arange(width), indexing="ij")
+    grid = np.repeat(np.stack([xs, ys], axis=-1)[:, :, None, :], count, axis=2).reshape(1, rows, 2)
+    anchor_scale = np.array(net_size if yolo else (width, height), dtype=np.float32)
+    anchor_sizes = np.tile(np.array(anchors, dtype=np.float32) / anchor_scale, (height * width, 1)).reshape(1, rows, 2)
+
+    xy = graph.node("Sigmoid", [part(0, 2)])
+    if scale_x_y != 1.0:
+        xy = graph.node("Mul", [xy, graph.const(np.array(scale_x_y, dtype=np.float32))])
+        xy = graph.node("Sub", [xy, graph.const(np.array(0.5 * (scale_x_y - 1), dtype=np.float32))])
+    xy = graph.node("Add", [xy, graph.const(grid.astype(np.float32))])
+    xy = graph.node("Div", [xy, graph.const(np.array([width, height], dtype=np.float32))])
+
+    wh = graph.node("Mul", [graph.node("Exp", [part(2, 4)]), graph.const(anchor_sizes)])
+    objectness = graph.node("Sigmoid", [part(4, 5)])
+    if yolo:
+        scores = graph.node("Sigmoid", [part(5, cell)])
+    else:
+        scores = graph.node("Softmax", [part(5, cell)], axis=2)
+    scores = graph.node("Mul", [scores, objectness])
+
+    return graph.node("Concat", [xy, wh, objectness, scores], prefix="detections", axis=2)
+
+
+def convert(cfg_path, weights_path, output_path, input_size=416):
+    """Dựng graph ONNX từ cfg, nạp weights (gộp batch norm vào conv) và lưu ra output_path"""
+    import onnx
+    from onnx import TensorProto, helper
+
+    sections = parse_cfg(cfg_path)
+    values = read_weights(weights_path)
+    offset = 0
+
+    def take(count):
+        nonlocal offset
+        chunk = values[offset:offset + count]
+        if len(chunk) != count:
+            raise ValueError("File weights ngắn hơn cấu trúc trong cfg")
+        offset += count
+        return chunk
+
+    width, height = (input_size, input_size) if isinstance(input_size, int) else input_size
+    graph = GraphBuilder()
+    x = "input"
+    channels, h, w = int(sections[0][1].get("channels", 3)), height, width
+    layers = []  # (tensor, số kênh, h, w) của từng layer
+    outputs = []
+
+    for index, (kind, params) in enumerate(sections[1:]):
+        if kind == "convolutional":
+            filters = int(params["filters"])
+            size = int(params["size"])
+            stride = int(params.get("stride", 1))
+            groups = int(params.get("groups", 1))
+            pad = size // 2 if int(params.get("pad", 0)) else int(params.get("padding", 0))
+
+            bias = take(filters)
+            if int(params.get("batch_normalize", 0)):
+                scales, mean, variance = take(filters), take(filters), take(filters)
+            kernel = take(filters * (channels // groups) * size * size).reshape(filters, channels // groups, size, size)
+            if int(params.get("batch_normalize", 0)):
+                # Gộp batch norm vào weights và bias của conv
+                factor = scales / np.sqrt(variance + BN_EPSILON)
+                kernel = kernel * factor[:, None, None, None]
+                bias = bias - mean * factor
+
+            x = graph.node("Conv", [x, graph.const(kernel.astype(np.float32), "weight"),
+                                    graph.const(bias.astype(np.float32), "bias")],
+                           kernel_shape=[size, size], strides=[stride, stride], pads=[pad] * 4, group=groups)
+            x = activation(graph, x, params.get("activation", "logistic"))
+            channels = filters
+            h = (h + 2 * pad - size) // stride + 1
+            w = (w + 2 * pad - size) // stride + 1
+
+        elif kind == "maxpool":
+            size = int(params.get("size", 2))
+            stride = int(params.get("stride", 2))
+            padding = int(params.get("padding", size - 1))
+            # Darknet đệm padding // 2 ở trên/trái, phần còn lại ở dưới/phải
+            pads = [padding // 2, padding // 2, padding - padding // 2, padding - padding // 2]
+            x = graph.node("MaxPool", [x], kernel_shape=[size, size], strides=[stride, stride], pads=pads)
+            h = (h + padding - size) // stride + 1
+            w = (w + padding - size) // stride + 1
+
+        elif kind == "route":
+            indices = [int(v) for v in params["layers"].split(",")]
+            indices = [i if i >= 0 else index + i for i in indices]
+            sources = [layers[i] for i in indices]
+            x = sources[0][0] if len(sources) == 1 else graph.node("Concat", [s[0] for s in sources], axis=1)
+            channels = sum(s[1] for s in sources)
+            h, w = sources[0][2], sources[0][3]
+
+        elif kind == "shortcut":
+            source = int(params["from"])
+            source = source if source >= 0 else index + source
+            x = graph.node("Add", [x, layers[source][0]])
+            x = activation(graph, x, params.get("activation", "linear"))
+
+        elif kind == "upsample":
+            stride = int(params.get("stride", 2))
+            x = graph.node("Resize", [x, "", graph.const(np.array([1, 1, stride, stride], dtype=np.float32))],
+                           mode="nearest", coordinate_transformation_mode="asymmetric", nearest_mode="floor")
+            h, w = h * stride, w * stride
+
+        elif kind == "reorg":
+            # reorg của Darknet (giống cv2.dnn): coi buffer C x H x W như (C / s^2) x (H * s) x (W * s)
+            # rồi chuyển các khối s x s thành kênh
+            stride = int(params.get("stride", 2))
+            x = graph.node("Reshape", [x, graph.const(np.array(
+                [-1, channels // (stride * stride), h, stride, w, stride], dtype=np.int64))])
+            x = graph.node("Transpose", [x], perm=[0, 3, 5, 1, 2, 4])
+            h, w = h // stride, w // stride
+            channels = channels * stride * stride
+            x = graph.node("Reshape", [x, graph.const(np.array([-1, channels, h, w], dtype=np.int64))])
+
+        elif kind in ("yolo", "region"):
+            anchors = [float(v) for v in params["anchors"].split(",")]
+            anchors = list(zip(anchors[0::2], anchors[1::2]))
+            if kind == "yolo":
+                mask = [int(v) for v in params["mask"].split(",")]
+                anchors = [anchors[i] for i in mask]
+            classes = int(params["classes"])
+            output = decode(graph, x, h, w, anchors, classes, (width, height),
+                            yolo=kind == "yolo", scale_x_y=float(params.get("scale_x_y", 1.0)))
+            outputs.append((output, h * w * len(anchors), 5 + classes))
+
+        elif kind != "dropout":
+            raise ValueError(f"Không hỗ trợ layer: {kind}")
+
+        layers.append((x, channels, h, w))
+
+    if offset != len(values):
+        print(f"Cảnh báo: còn {len(values) - offset} giá trị weights chưa dùng")
+
+    model = helper.make_model(
+        helper.make_graph(
+            graph.nodes,
+            os.path.splitext(os.path.basename(cfg_path))[0],
+            [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch", 3, height, width])],
+            [helper.make_tensor_value_info(name, TensorProto.FLOAT, ["batch", rows, cell])
+             for name, rows, cell in outputs],
+            graph.initializers
+        ),
+        opset_imports=[helper.make_opsetid("", OPSET)],
+        ir_version=IR_VERSION,
+        producer_name="darknet_onnx"
+    )
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
+    return output_path
+
+
+def calibration_blobs(source, input_size, count=32):
+    """Blob dùng để hiệu chỉnh lượng tử hóa: frame từ video, ảnh trong thư mục hoặc một ảnh"""
+    import cv2
+
+    frames = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source))[:count]:
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                frames.append(frame)
+    else:
+        cap = cv2.VideoCapture(source)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, total // count) if total > 0 else 1
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+            for _ in range(step - 1):
+                cap.grab()
+        cap.release()
+    if not frames:
+        raise ValueError(f"Không đọc được dữ liệu hiệu chỉnh từ {source}")
+    return [cv2.dnn.blobFromImage(frame, 1 / 255.0, input_size, swapRB=True, crop=False) for frame in frames]
+
+
+def quantize(model_path, output_path, mode="dynamic", calibration=None, input_size=(416, 416)):
+    """Lượng tử hóa INT8: dynamic (chỉ weights) hoặc static (QDQ, cần dữ liệu hiệu chỉnh)"""
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+
+    if mode == "dynamic":
+        quantize_dynamic(model_path, output_path, op_types_to_quantize=["Conv"], weight_type=QuantType.QUInt8)
+        return output_path
+
+    class BlobReader(CalibrationDataReader):
+        def __init__(self, blobs):
+            self.blobs = iter(blobs)
+
+        def get_next(self):
+            blob = next(self.blobs, None)
+            return None if blob is None else {"input": blob}
+
+    # Chỉ lượng tử hóa Conv: phần decode (exp, sigmoid, softmax) giữ float để box chính xác
+    quantize_static(
+        model_path,
+        output_path,
+        BlobReader(calibration_blobs(calibration, input_size)),
+        quant_format=QuantFormat.QDQ,
+        op_types_to_quantize=["Conv"],
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    return output_path
+
+
+def parity_detectors(weights_path, config_path, onnx_path, conf_threshold=0.5, nms_threshold=0.4):
+    """(cv2.dnn, ONNX Runtime) cùng weights và cùng kích thước input để so sánh"""
+    from yolo import YOLODetector
+
+    reference = YOLODetector(weights_path, config_path, conf_threshold, nms_threshold, backend="cpu")
+    candidate = YOLODetector(weights_path, config_path, conf_threshold, nms_threshold, backend="cpu",
+                             engine={"type": "onnxruntime", "model": onnx_path})
+    reference.set_input_size(candidate.input_size)
+    return reference, candidate
+
+
+def output_errors(reference, candidate, frame):
+    """Sai số lớn nhất (box/objectness, xác suất lớp) giữa output thô của hai detector
+
+    cv2.dnn đặt xác suất lớp nhỏ hơn ngưỡng của layer về 0 nên chỉ so các giá trị trên ngưỡng detect.
+    """
+    import cv2
+
+    blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, candidate.input_size, swapRB=True, crop=False)
+
+    def flatten(outputs):
+        return np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs])
+
+    expected = flatten(reference.engine.forward(blob))
+    actual = flatten(candidate.engine.forward(blob))
+    if expected.shape != actual.shape:
+        raise ValueError(f"Khác kích thước output: cv2.dnn {expected.shape}, ONNX {actual.shape}")
+
+    threshold = reference.conf_threshold
+    box_error = float(np.abs(expected[:, :5] - actual[:, :5]).max())
+    mask = (expected[:, 5:] > threshold) | (actual[:, 5:] > threshold)
+    score_error = float(np.abs(expected[:, 5:] - actual[:, 5:])[mask].max()) if mask.any() else 0.0
+    return box_error, score_error
+
+
+def check_parity(model_name, onnx_path, image_path="test_image.jpg", tolerance=1e-3):
+    """So sánh output thô và detections của ONNX Runtime với cv2.dnn trên cùng một ảnh"""
+    import cv2
+
+    config = YOLO_CONFIGS[model_name]
+    reference, candidate = parity_detectors(config['weights'], config['config'], onnx_path,
+                                            config['conf_threshold'], config['nms_threshold'])
+    frame = cv2.imread(image_path)
+    if frame is None:
+        raise ValueError(f"Không đọc được ảnh: {image_path}")
+
+    try:
+        box_error, score_error = output_errors(reference, candidate, frame)
+    except ValueError as e:
+        print(str(e))
+        return False
+    print(f"Sai số lớn nhất: box/objectness {box_error:.6f}, xác suất lớp {score_error:.6f}")
+
+    expected_detections = reference.detect(frame, reference.classes)
+    actual_detections = candidate.detect(frame, candidate.classes)
+    print(f"Detections: cv2.dnn {len(expected_detections)}, ONNX {len(actual_detections)}")
+    for class_name, conf, box in expected_detections:
+        print(f"  cv2.dnn {class_name} {conf:.3f} {box}")
+    for class_name, conf, box in actual_detections:
+        print(f"  ONNX    {class_name} {conf:.3f} {box}")
+
+    same = sorted(d[0] for d in expected_detections) == sorted(d[0] for d in actual_detections)
+    return same and box_error <= tolerance and score_error <= tolerance
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chuyển model Darknet sang ONNX (tùy chọn lượng tử hóa INT8)")
+    parser.add_argument("model", choices=list(YOLO_CONFIGS.keys()))
+    parser.add_argument("--size", type=int, default=None, help="Kích thước input (mặc định theo YOLO_CONFIGS)")
+    parser.add_argument("--output", default=None, help="File .onnx (mặc định cạnh file weights)")
+    parser.add_argument("--quantize", choices=["dynamic", "static"], default=None)
+    parser.add_argument("--calibration", default="test_image.jpg",
+                        help="Video, thư mục ảnh hoặc ảnh dùng để hiệu chỉnh khi lượng tử hóa static")
+    parser.add_argument("--check", action="store_true", help="So sánh kết quả với cv2.dnn sau khi chuyển")
+    parser.add_argument("--image", default="test_image.jpg", help="Ảnh dùng khi so sánh")
+    parser.add_argument("--tolerance", type=float, default=1e-3,
+                        help="Sai số cho phép khi so sánh (model INT8 cần lớn hơn, ví dụ 0.1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = YOLO_CONFIGS[args.model]
+    size = args.size or config.get('input_size', 416)
+    output = args.output or f"{os.path.splitext(config['weights'])[0]}_{size}.onnx"
+
+    convert(config['config'], config['weights'], output, size)
+    print(f"Đã xuất {output}")
+
+    if args.quantize:
+        float_model = output
+        output = f"{os.path.splitext(float_model)[0]}.int8.onnx"
+        quantize(float_model, output, args.quantize, args.calibration, (size, size))
+        print(f"Đã lượng tử hóa ({args.quantize}): {output}")
+
+    if args.check:
+        if not check_parity(args.model, output, args.image, args.tolerance):
+            print("Kết quả ONNX KHÁC cv2.dnn")
+            return 1
+        print("Kết quả ONNX khớp với cv2.dnn")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from logging.handlers import RotatingFileHandler
+
+LEVELS = {
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR
+}
+
+
+class DetectionLog:
+    """Log dùng chung cho GUI và các worker: ring buffer giới hạn, an toàn đa luồng
+
+    Worker chỉ ghi vào buffer; giao diện lấy các dòng mới theo lô bằng drain(). notify được gọi
+    một lần khi có dòng mới sau lần drain trước (để GUI hẹn một lần cập nhật thay vì mỗi dòng một lần).
+    """
+
+    def __init__(self, max_entries=1000, rate_limit=5, rate_period=10.0, file_path=None,
+                 max_file_bytes=5 * 1024 * 1024, backup_count=3, echo=False):
+        self.entries = deque(maxlen=max_entries)  # Toàn bộ lịch sử gần nhất
+        self.pending = deque(maxlen=max_entries)  # Các dòng GUI chưa lấy
+        self.rate_limit = rate_limit  # Số thông báo tối đa cho cùng một key trong rate_period giây
+        self.rate_period = rate_period
+        # key -> [thời điểm bắt đầu cửa sổ, số đã ghi, số đã bỏ qua]; key mặc định là nội dung dòng log
+        # (có số frame, tên file...) nên giới hạn số key và dọn key hết hạn định kỳ
+        self.rates = OrderedDict()
+        self.max_rate_keys = max_entries
+        self.last_prune = 0.0
+        self.echo = echo  # In ra console (khi không có giao diện)
+        self.notify = None
+        self.notified = False
+        self.lock = threading.Lock()
+
+        self.logger = None
+        if file_path:
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            self.logger = logging.getLogger(f"yolodetects.{id(self)}")
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+            handler = RotatingFileHandler(file_path, maxBytes=max_file_bytes,
+                                          backupCount=backup_count, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            self.logger.addHandler(handler)
+
+    def set_notify(self, callback):
+        """callback() được gọi (từ thread ghi log) khi có dòng mới chờ GUI lấy"""
+        self.notify = callback
+
+    def allow(self, key, now):
+        """Giới hạn tần suất theo key; trả về (có ghi không, số thông báo đã bỏ qua trước đó)"""
+        if now - self.last_prune >= self.rate_period:
+            self.prune(now)
+        state = self.rates.get(key)
+        if state is None or now - state[0] >= self.rate_period:
+            suppressed = state[2] if state is not None else 0
+            self.rates[key] = [now, 1, 0]
+            self.rates.move_to_end(key)
+            if len(self.rates) > self.max_rate_keys:
+                self.rates.popitem(last=False)
+            return True, suppressed
+        if state[1] < self.rate_limit:
+            state[1] += 1
+            return True, 0
+        state[2] += 1
+        return False, 0
+
+    def prune(self, now):
+        """Bỏ các key có cửa sổ đã hết hạn (gọi khi đang giữ lock)
+
+        Giữ lại key còn thông báo bị bỏ qua để lần ghi sau vẫn báo được số đó (đã có max_rate_keys chặn trên).
+        """
+        stale = [key for key, state in self.rates.items()
+                 if now - state[0] >= self.rate_period and not state[2]]
+        for key in stale:
+            del self.rates[key]
+        self.last_prune = now
+
+    def log(self, level, message, key=None):
+        """Ghi một dòng; các dòng cùng key (mặc định là chính nội dung) bị giới hạn tần suất"""
+        now = time.monotonic()
+        with self.lock:
+            allowed, suppressed = self.allow(key or message, now)
+            if not allowed:
+                return
+            if suppressed:
+                message += f" (bỏ qua {suppressed} thông báo tương tự)"
+
+            entry = f"[{time.strftime('%H:%M:%S')}] {message}"
+            self.entries.append(entry)
+            self.pending.append(entry)
+            notify = self.notify is not None and not self.notified
+            if notify:
+                self.notified = True
+
+        if self.echo:
+            print(entry)
+        if self.logger is not None:
+            self.logger.log(LEVELS[level], message)
+        if notify:
+            self.notify()
+
+    def info(self, message, key=None):
+        self.log("INFO", message, key)
+
+    def warning(self, message, key=None):
+        self.log("WARNING", message, key)
+
+    def error(self, message, key=None):
+        self.log("ERROR", message, key)
+
+    def drain(self):
+        """Lấy và xóa các dòng chưa hiển thị"""
+        with self.lock:
+            batch = list(self.pending)
+            self.pending.clear()
+            self.notified = False
+        return batch
+
+    def history(self):
+        with self.lock:
+            return list(self.entries)
+
+    def close(self):
+        if self.logger is not None:
+            for handler in list(self.logger.handlers):
+                handler.close()
+                self.logger.removeHandler(handler)
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+# Mỗi detection được lưu gọn 22 byte: chỉ số lớp, độ tin cậy, box (x, y, w, h)
+DETECTION_DTYPE = np.dtype([('class_id', '<i2'), ('confidence', '<f4'), ('box', '<i4', (4,))])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    input_size TEXT NOT NULL,
+    conf_threshold REAL NOT NULL,
+    nms_threshold REAL NOT NULL,
+    classes TEXT NOT NULL,
+    engine TEXT NOT NULL DEFAULT '',
+    UNIQUE (video_hash, model, input_size, conf_threshold, nms_threshold, classes, engine)
+);
+CREATE TABLE IF NOT EXISTS frames (
+    run_id INTEGER NOT NULL,
+    frame INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (run_id, frame)
+) WITHOUT ROWID;
+"""
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Tính hash nội dung file (đọc theo từng khối để không tốn RAM)"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_detections(detections, class_index):
+    """Chuyển list (class_name, conf, box) thành bytes gọn"""
+    data = np.empty(len(detections), dtype=DETECTION_DTYPE)
+    for i, (class_name, conf, box) in enumerate(detections):
+        data[i] = (class_index[class_name], conf, box)
+    return data.tobytes()
+
+
+def decode_detections(blob, classes):
+    """Chuyển bytes đã lưu về list (class_name, conf, box) như YOLODetector.detect"""
+    data = np.frombuffer(blob, dtype=DETECTION_DTYPE)
+    return [(classes[int(class_id)], float(conf), box.tolist())
+            for class_id, conf, box in zip(data['class_id'], data['confidence'], data['box'])]
+
+
+class DetectionStore:
+    """Lưu detections từng frame xuống SQLite, khóa theo video + model + ngưỡng"""
+
+    def __init__(self, path="cache/detections.sqlite", commit_every=200):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(runs)")]
+        if columns and "engine" not in columns:
+            # Store cũ không ghi engine: không biết lần chạy nào của engine nào nên bỏ đi
+            self.conn.executescript("DROP TABLE IF EXISTS frames; DROP TABLE IF EXISTS runs;")
+        self.conn.executescript(SCHEMA)
+        self.commit_every = commit_every
+        self.pending = 0
+
+    def video_hash(self, video_path):
+        """Hash toàn bộ nội dung video, chỉ tính lại khi kích thước hoặc thời gian sửa đổi thay đổi
+
+        Đọc cả file nên có thể mất vài giây với video lớn: gọi từ thread nền (xem DetectionThread.open_store_run).
+        """
+        path = os.path.abspath(video_path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.conn.execute("SELECT size, mtime, hash FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+
+        digest = file_hash(path)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO files (path, size, mtime, hash) VALUES (?, ?, ?, ?)",
+                              (path, stat.st_size, stat.st_mtime, digest))
+            self.conn.commit()
+        return digest
+
+    def open_run(self, video_path, model, input_size, conf_threshold, nms_threshold, target_objects, engine=""):
+        """Trả về id của lần chạy ứng với khóa (video, model, kích thước input, ngưỡng, lớp, engine)
+
+        engine: loại engine và file model thực sự chạy (vd. "onnxruntime:/.../yolov3_416.int8.onnx").
+        """
+        # NMS không phân biệt lớp nên kết quả phụ thuộc cả danh sách đối tượng được chọn
+        key = (self.video_hash(video_path), model, "x".join(str(v) for v in input_size),
+               float(conf_threshold), float(nms_threshold), ",".join(sorted(target_objects)), engine)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO runs"
+                " (video_hash, model, input_size, conf_threshold, nms_threshold, classes, engine)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", key)
+            self.conn.commit()
+            row = self.conn.execute(
+                "SELECT id FROM runs WHERE video_hash = ? AND model = ? AND input_size = ?"
+                " AND conf_threshold = ? AND nms_threshold = ? AND classes = ? AND engine = ?", key).fetchone()
+        return row[0]
+
+    def get_many(self, run_id, frames, classes):
+        """Trả về dict frame -> detections cho các frame đã có trong store"""
+        if not frames:
+            return {}
+        placeholders = ",".join("?" * len(frames))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT frame, data FROM frames WHERE run_id = ? AND frame IN ({placeholders})",
+                (run_id, *frames)).fetchall()
+        return {frame: decode_detections(data, classes) for frame, data in rows}
+
+    def get(self, run_id, frame, classes):
+        return self.get_many(run_id, [frame], classes).get(frame)
+
+    def put_many(self, run_id, items, classes):
+        """Lưu nhiều frame một lúc, items là list (frame, detections)"""
+        class_index = {name: i for i, name in enumerate(classes)}
+        rows = [(run_id, frame, encode_detections(detections, class_index)) for frame, detections in items]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO frames (run_id, frame, data) VALUES (?, ?, ?)", rows)
+            self.pending += len(rows)
+            if self.pending >= self.commit_every:
+                self.conn.commit()
+                self.pending = 0
+
+    def put(self, run_id, frame, detections, classes):
+        self.put_many(run_id, [(frame, detections)], classes)
+
+    def frame_count(self, run_id):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM frames WHERE run_id = ?", (run_id,)).fetchone()[0]
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
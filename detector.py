@@ -1,185 +1,640 @@
-import torch
+import threading
+import time
 import cv2
-import numpy as np
 from PyQt6.QtCore import QThread, pyqtSignal
+from PyQt6.QtGui import QImage
+from frame_cache import FrameCache
+from object_stats import ObjectStats
+from detection_log import DetectionLog
+from timing import timings
+from pacing import FramePacer
+from exporter import create_exporter
+from pipeline import FrameQueue
+from seek import KeyframeIndex, SeekScheduler, seek_capture
+from resolution import AdaptiveResolution
+from tracker import AdaptiveInterval
+from yolo import YOLODetector  # Giữ để main.py vẫn import được từ detector
 from utils import draw_detections
 
 
-class YOLODetector:
-    def __init__(self, weights_path, config_path, conf_threshold=0.5, nms_threshold=0.4):
-        # Kiểm tra CUDA
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        if torch.cuda.is_available():
-            print(f"Đang sử dụng GPU: {torch.cuda.get_device_name(0)}")
-            print(f"CUDA version: {torch.version.cuda}")
-        else:
-            print("Không tìm thấy GPU, sử dụng CPU")
-
-        # Tải model lên GPU nếu có
-        self.net = cv2.dnn.readNet(weights_path, config_path)
-        if self.device.type == 'cuda':
-            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
-            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
-
-        self.conf_threshold = conf_threshold
-        self.nms_threshold = nms_threshold
-
-        with open("coco.names", "r") as f:
-            self.classes = [line.strip() for line in f.readlines()]
-
-        self.output_layers = [self.net.getLayerNames()[i - 1] for i in self.net.getUnconnectedOutLayers()]
-
-    def detect(self, frame, target_objects):
-        height, width, _ = frame.shape
-
-        # Chuyển frame sang blob
-        blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, (416, 416), swapRB=True, crop=False)
-
-        # KHÔNG chuyển blob sang tensor PyTorch, giữ nguyên dạng numpy array
-        self.net.setInput(blob)
-        outputs = self.net.forward(self.output_layers)
-
-        class_ids = []
-        confidences = []
-        boxes = []
-
-        for output in outputs:
-            for detection in output:
-                scores = detection[5:]
-                class_id = np.argmax(scores)
-                confidence = scores[class_id]
-                if confidence > self.conf_threshold and self.classes[class_id] in target_objects:
-                    center_x, center_y, w, h = (detection[0:4] * np.array([width, height, width, height])).astype('int')
-                    x = int(center_x - w / 2)
-                    y = int(center_y - h / 2)
-                    boxes.append([x, y, int(w), int(h)])
-                    confidences.append(float(confidence))
-                    class_ids.append(class_id)
-
-        indices = cv2.dnn.NMSBoxes(boxes, confidences, self.conf_threshold, self.nms_threshold)
-
-        detections = []
-        for i in indices:
-            box = boxes[i]
-            class_name = self.classes[class_ids[i]]
-            conf = confidences[i]
-            detections.append((class_name, conf, box))
-
-        return detections
-
-
 class DetectionThread(QThread):
-    update_frame = pyqtSignal(np.ndarray, list)  # Thêm list để truyền detections
-
-    def __init__(self, detector, input_source, target_objects, object_colors, info_list=None):
+    update_frame = pyqtSignal(QImage, list)  # Ảnh đã vẽ ở kích thước hiển thị + detections
+    source_size = pyqtSignal(int, int)  # Kích thước frame gốc (để đổi tọa độ ROI)
+    object_stats = pyqtSignal(list)  # Số đếm theo lớp, gửi với tần suất giới hạn
+    queue_stats = pyqtSignal(dict)  # Độ sâu hàng đợi của từng stage
+
+    def __init__(self, detector, input_source, target_objects, object_colors, log=None, queue_size=8,
+                 store=None, model_name=None, cache_bytes=64 * 1024 * 1024, motion_gate=None,
+                 tracker=None, max_interval=5, regions=None, tiling=None, adaptive_resolution=None,
+                 display_size=None, stats_window=30, stats_refresh_hz=5, pacing=FramePacer.REALTIME,
+                 late_tolerance=2.0, export=None):
         super().__init__()
         self.detector = detector
         self.input_source = input_source
         self.target_objects = target_objects
         self.object_colors = object_colors
-        self.info_list = info_list
+        # Không có log của giao diện: ghi ra console
+        self.log = log if log is not None else DetectionLog(echo=True)
         self.running = True
         self.paused = False
         self.current_frame = 0
-        self.frame_cache = {}
-        self.cache_size = 30
+        # Cache LRU theo byte: chỉ lưu detections và frame hiển thị thu nhỏ
+        self.frame_cache = FrameCache(cache_bytes)
+
+        # Pipeline: decode -> inference -> render, nối bằng hàng đợi có giới hạn
+        self.queue_size = queue_size
+        self.decode_queue = None
+        self.render_queue = None
+        self.cap_lock = threading.Lock()
+        self.detect_lock = threading.Lock()  # cv2.dnn.Net không an toàn khi forward song song
+        self.stats_interval = 1.0
+
+        # Đồng bộ theo timestamp của nguồn (tạo trong run() khi đã biết FPS)
+        self.pacing = pacing
+        self.late_tolerance = late_tolerance
+        self.pacer = None
+
+        # Store lưu detections xuống đĩa: xem lại video đã phân tích không cần chạy mạng
+        self.store = store
+        self.model_name = model_name
+        self.store_run = None
+        self.store_generation = 0  # Tăng mỗi lần mở lại run để bỏ kết quả của lần mở cũ
+        self.store_hits = 0
+        self.store_misses = 0
+
+        # Tua video: worker tự xử lý, gộp các yêu cầu liên tiếp khi kéo slider
+        self.seeker = SeekScheduler()
+        self.keyframes = KeyframeIndex()
+        self.seek_generation = 0  # Tăng mỗi lần tua để bỏ các frame cũ còn trong pipeline
+
+        # Motion gate (tùy chọn): dùng lại detections trước khi khung hình không đổi
+        self.motion_gate = motion_gate
+        self.last_detections = []
+
+        # Tracker (tùy chọn): chỉ detect mỗi N frame, các frame còn lại dự đoán bằng tracker
+        self.tracker = tracker
+        self.max_interval = max_interval
+        self.interval = None
+
+        # Chỉ detect trong các vùng ROI, hoặc chia frame thành ô (dict tham số detect_tiled)
+        self.regions = list(regions or [])
+        self.tiling = tiling
+
+        # Tự động chỉnh kích thước input theo độ trễ (dict cấu hình ADAPTIVE_RESOLUTION)
+        self.adaptive_resolution = adaptive_resolution
+        self.resolution = None
+
+        # Vẽ overlay ở độ phân giải hiển thị (width, height) thay vì độ phân giải gốc
+        self.display_size = display_size
+
+        # Thống kê số đối tượng tính trong worker, giao diện chỉ nhận bản tóm tắt định kỳ
+        self.object_counter = ObjectStats(target_objects, stats_window, stats_refresh_hz)
+
+        # Xuất video đã vẽ + file detections (dict cấu hình EXPORT, thêm "detections_only")
+        self.export = export
+        self.exporter = None
+        self.fps = 0
+
+    @property
+    def is_live(self):
+        return self.input_source == "Camera"
 
     def set_frame_position(self, frame_number):
-        """Đặt vị trí frame hiện tại"""
+        """Đặt vị trí frame hiện tại (không chặn: worker sẽ tua và detect)"""
         self.current_frame = frame_number
-        if hasattr(self, 'cap'):
-            # Kiểm tra cache trước
-            if frame_number in self.frame_cache:
-                frame, detections = self.frame_cache[frame_number]
-                self.update_frame.emit(frame, detections)
+        if not self.is_live:
+            self.seeker.request(frame_number)
+
+    def lookup_detections(self, frame_number):
+        """Lấy detections đã có (cache hoặc store) mà không chạy mạng"""
+        cached = self.frame_cache.get(frame_number)
+        if cached is not None:
+            return cached.detections
+        run = self.store_run
+        if run is not None:
+            return self.store.get(run, frame_number, self.detector.classes)
+        return None
+
+    def handle_seek(self, cap, kind, target):
+        """Phục vụ một yêu cầu tua trong decoder thread"""
+        if kind == SeekScheduler.WAIT:
+            time.sleep(0.01)
+            return
+
+        with self.cap_lock:
+            # Bỏ các frame cũ còn nằm trong pipeline
+            self.seek_generation += 1
+            for queue in (self.decode_queue, self.render_queue):
+                queue.clear()
+            self.pacer.reset()
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
+            if self.tracker is not None:
+                self.tracker.reset()
+
+            # Preview từ cache: không cần giải mã
+            cached = self.frame_cache.get(target)
+            if kind == SeekScheduler.PREVIEW and cached is not None and cached.frame is not None:
+                image = self.render_image(cached.frame.copy(), cached.detections, cached.scale)
+                self.publish(image, cached.detections, force_stats=True)
                 return
 
-            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
-            ret, frame = self.cap.read()
-            if ret:
-                detections = self.detector.detect(frame, self.target_objects)
-                frame = draw_detections(frame, detections, self.object_colors)
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            seek_capture(cap, target, self.keyframes)
+            ret, frame = cap.read()
 
-                # Lưu vào cache
-                self.frame_cache[frame_number] = (frame.copy(), detections)
-                if len(self.frame_cache) > self.cache_size:
-                    # Xóa frame cũ nhất nếu cache đầy
-                    oldest_frame = min(self.frame_cache.keys())
-                    del self.frame_cache[oldest_frame]
+        if not ret:
+            return
 
-                self.update_frame.emit(frame, detections)
+        if kind == SeekScheduler.PREVIEW:
+            # Preview chỉ giải mã, dùng detections nếu đã có sẵn
+            detections = self.lookup_detections(target) or []
+        elif cached is not None:
+            detections = cached.detections
+        else:
+            detections = self.detect_frames([target], [frame])[0]
+            self.frame_cache.put(target, detections, frame)
+
+        self.publish(self.render_image(frame, detections), detections, force_stats=True)
 
     def pause(self):
         """Tạm dừng/tiếp tục video"""
         self.paused = not self.paused
-
-    def run(self):
+        if self.pacer is not None:
+            self.pacer.reset()  # Tiếp tục từ frame hiện tại, không đuổi theo thời gian đã dừng
+
+    def set_pacing(self, mode):
+        """Đổi giữa thời gian thực và tốc độ tối đa trong khi đang chạy"""
+        self.pacing = mode
+        if self.pacer is not None and not self.is_live:
+            self.pacer.set_mode(mode)
+
+    def open_capture(self):
+        """Mở camera hoặc file video, trả về None nếu thất bại"""
+        if self.is_live:
+            # Thử các camera index khác nhau
+            for camera_index in [0, 1, 2]:  # Thử camera 0, 1, 2
+                cap = cv2.VideoCapture(camera_index)
+                if cap.isOpened():
+                    self.log.info(f"Đã kết nối với camera {camera_index}")
+                    return cap
+                cap.release()
+
+            # Nếu không tìm thấy camera nào
+            self.log.error("Không thể kết nối với camera")
+            return None
+
+        # Thêm các flag để xử lý video tốt hơn
+        cap = cv2.VideoCapture(self.input_source, cv2.CAP_FFMPEG)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)
+        if not cap.isOpened():
+            self.log.error(f"Không thể mở nguồn video: {self.input_source}")
+            return None
+        return cap
+
+    def decode_loop(self, cap):
+        """Stage 1: đọc frame từ nguồn và đẩy vào decode_queue"""
         try:
-            if self.input_source == "Camera":
-                # Thử các camera index khác nhau
-                for camera_index in [0, 1, 2]:  # Thử camera 0, 1, 2
-                    cap = cv2.VideoCapture(camera_index)
-                    if cap.isOpened():
-                        self.info_list.addItem(f"Đã kết nối với camera {camera_index}")
-                        break
-                    cap.release()
-                else:  # Nếu không tìm thấy camera nào
-                    print("Không thể kết nối với camera")
-                    return
-            else:
-                # Thêm các flag để xử lý video tốt hơn
-                cap = cv2.VideoCapture(self.input_source, cv2.CAP_FFMPEG)
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)
-
-            if not cap.isOpened():
-                print(f"Không thể mở nguồn video: {self.input_source}")
-                return
-
-            self.cap = cap
-
-            # Lấy thông tin video/camera
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_delay = int(1000 / fps) if fps > 0 else 30
+            while self.running:
+                kind, target = self.seeker.poll()
+                if kind is not None:
+                    self.handle_seek(cap, kind, target)
+                    continue
 
-            while self.running and cap.isOpened():
                 if self.paused:
-                    self.msleep(100)
+                    time.sleep(0.1)
                     continue
 
-                ret, frame = cap.read()
+                with self.cap_lock:
+                    if not cap.isOpened():
+                        break
+                    generation = self.seek_generation
+                    # Chậm hơn thời gian thực: chỉ grab (không giải mã ra ảnh) để đuổi kịp đồng hồ
+                    skip = not self.is_live and self.pacer.is_late(int(cap.get(cv2.CAP_PROP_POS_FRAMES)))
+                    if skip:
+                        ret, frame = cap.grab(), None
+                    else:
+                        with timings.measure("decode"):
+                            ret, frame = cap.read()
+                    # Camera không có concept về frame position; video dùng chỉ số frame vừa đọc
+                    position = 0 if self.is_live else int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+
                 if not ret:
-                    if self.input_source == "Camera":  # Nếu là camera, thử đọc frame tiếp
+                    if self.is_live:  # Nếu là camera, thử đọc frame tiếp
                         continue
-                    else:  # Nếu là video, dừng lại
+                    break  # Nếu là video, dừng lại
+                if skip:
+                    self.pacer.frame_dropped()
+                    continue
+
+                # Video: chờ khi hàng đợi đầy; camera: hàng đợi tự bỏ frame cũ nhất
+                while self.running and not self.decode_queue.put((generation, position, frame), timeout=0.1):
+                    if self.decode_queue.closed:
+                        return
+        except Exception as e:
+            self.log.error(f"Lỗi đọc frame: {str(e)}", key="read_frame")
+        finally:
+            self.decode_queue.close()
+
+    def next_batch(self, batch_size):
+        """Lấy tối đa batch_size frame từ decode_queue"""
+        batch = []
+        while self.running and len(batch) < batch_size:
+            item = self.decode_queue.get(timeout=0.1)
+            if item is None:
+                if self.decode_queue.finished:
+                    break
+                if batch and self.is_live:  # Không giữ frame camera chờ đủ batch
+                    break
+                continue
+            batch.append(item)
+        return batch
+
+    def inference_loop(self):
+        """Stage 2: chạy detect_batch cho các frame từ decode_queue"""
+        # Camera xử lý từng frame để giảm độ trễ, video thì gom theo batch
+        batch_size = 1 if self.is_live else self.detector.batch_size
+        try:
+            while self.running:
+                batch = self.next_batch(batch_size)
+                if not self.is_live:
+                    batch = self.drop_late(batch)
+                if not batch:
+                    if self.decode_queue.finished:
                         break
+                    continue
 
+                generations = [generation for generation, _, _ in batch]
+                positions = [position for _, position, _ in batch]
+                frames = [frame for _, _, frame in batch]
                 try:
-                    if self.input_source != "Camera":
-                        current_pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
-                    else:
-                        current_pos = 0  # Camera không có concept về frame position
-
-                    detections = self.detector.detect(frame, self.target_objects)
-                    frame = draw_detections(frame, detections, self.object_colors)
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    batch_detections = self.gated_detect(positions, frames)
+                except Exception as e:
+                    self.log.error(f"Lỗi xử lý frame: {str(e)}", key="process_frame")
+                    continue
 
-                    if self.input_source != "Camera":  # Chỉ cache cho video
-                        self.frame_cache[current_pos] = (frame.copy(), detections)
-                        if len(self.frame_cache) > self.cache_size:
-                            oldest_frame = min(self.frame_cache.keys())
-                            del self.frame_cache[oldest_frame]
+                for item in zip(generations, positions, frames, batch_detections):
+                    while self.running and not self.render_queue.put(item, timeout=0.1):
+                        if self.render_queue.closed:
+                            return
+        finally:
+            self.render_queue.close()
+
+    def report_latency(self, seconds):
+        """Độ trễ forward của một frame: dùng cho N của tracker và bộ chỉnh kích thước input"""
+        if self.interval is not None:
+            self.interval.report_latency(seconds)
+        if self.resolution is not None:
+            level = self.resolution.report(seconds)
+            if level is not None:
+                self.apply_level(*level)
+
+    def apply_level(self, model_name, size):
+        """Đổi kích thước input (và model nếu cần) khi bộ điều khiển yêu cầu
+
+        Detector trong registry dùng chung giữa các thread nên không đổi kích thước tại chỗ:
+        mỗi mức (model, kích thước) là một detector riêng trong registry.
+        """
+        from model_registry import registry
+
+        detector = registry.get(model_name, backend=self.detector.backend, input_size=size)
+        with self.detect_lock:
+            self.detector = detector
+            self.model_name = model_name
+
+        # Kết quả ở kích thước mới khác kết quả cũ
+        self.frame_cache.clear()
+        self.open_store_run()
+        self.log.info(f"Chuyển sang {model_name} với input {size}x{size}")
+
+    def drop_late(self, batch):
+        """Bỏ các frame đã trễ hạn trước khi chạy mạng, trừ khi không còn frame nào mới hơn"""
+        keep = [item for item in batch if not self.pacer.is_late(item[1])]
+        if not keep and batch and self.decode_queue.depth() == 0:
+            keep = batch[-1:]
+        self.pacer.frame_dropped(len(batch) - len(keep))
+        return keep
+
+    def run_network(self, frames):
+        """Chạy mạng theo chế độ hiện tại: ROI, chia ô hoặc toàn frame"""
+        regions = self.regions
+        if regions:
+            return [self.detector.detect_regions(frame, regions, self.target_objects) for frame in frames]
+        if self.tiling:
+            return [self.detector.detect_tiled(frame, self.target_objects, **self.tiling) for frame in frames]
+        return self.detector.detect_batch(frames, self.target_objects)
+
+    def set_regions(self, regions):
+        """Đổi các vùng ROI (gọi từ giao diện), bỏ cache vì kết quả cũ không còn đúng"""
+        self.regions = list(regions)
+        self.frame_cache.clear()
+
+    def render_image(self, frame, detections, scale=1.0):
+        """Vẽ overlay, thu nhỏ về kích thước hiển thị và tạo QImage ngay trong worker
+
+        Qt đọc trực tiếp dữ liệu BGR nên không cần cvtColor; copy() để QImage sở hữu dữ liệu
+        vì buffer vẽ được dùng lại cho frame sau.
+        """
+        with timings.measure("draw"):
+            frame = draw_detections(frame, detections, self.object_colors, scale, self.display_size)
+        with timings.measure("convert"):
+            height, width = frame.shape[:2]
+            return QImage(frame.data, width, height, frame.strides[0], QImage.Format.Format_BGR888).copy()
+
+    def publish(self, image, detections, force_stats=False):
+        """Gửi ảnh lên giao diện và cập nhật thống kê (chỉ gửi thống kê khi tới lượt làm mới)"""
+        self.update_frame.emit(image, detections)
+        self.object_counter.update(detections)
+        if self.object_counter.due() or force_stats:
+            unique_counts = self.tracker.counts() if self.tracker is not None else None
+            self.object_stats.emit(self.object_counter.snapshot(unique_counts))
+
+    def set_display_size(self, width, height):
+        """Kích thước khung hiển thị, None để vẽ ở độ phân giải gốc"""
+        self.display_size = (width, height) if width > 0 and height > 0 else None
+
+    def set_tiling(self, tiling):
+        self.tiling = tiling
+        self.frame_cache.clear()
+
+    def gated_detect(self, positions, frames):
+        """Chỉ chạy mạng cho frame cần thiết (motion gate, lịch detect mỗi N frame của tracker)"""
+        if self.motion_gate is None and self.tracker is None:
+            return self.detect_frames(positions, frames)
+
+        run_indices = []
+        for i, frame in enumerate(frames):
+            due = self.interval is None or self.interval.due()
+            if due and (self.motion_gate is None or self.motion_gate.check(frame)):
+                run_indices.append(i)
+
+        detected = {}
+        if run_indices:
+            results = self.detect_frames([positions[i] for i in run_indices], [frames[i] for i in run_indices])
+            detected = dict(zip(run_indices, results))
+
+        # Cập nhật theo đúng thứ tự frame: tracker dự đoán box cho frame không chạy mạng
+        batch_detections = []
+        for i in range(len(frames)):
+            if self.tracker is not None:
+                detections = self.tracker.update(detected[i]) if i in detected else self.tracker.predict()
+            else:
+                detections = detected.get(i, self.last_detections)
+            self.last_detections = detections
+            batch_detections.append(detections)
+        return batch_detections
+
+    def open_store_run(self):
+        """Tìm (hoặc tạo) lần chạy trong store cho video + model + ngưỡng hiện tại
+
+        Hash video đọc cả file nên chạy trong thread nền; trong lúc chờ, detect như không có store.
+        """
+        self.store_run = None
+        self.store_generation += 1
+        if self.store is None or self.is_live or not self.model_name:
+            return
+
+        generation = self.store_generation
+        key = (
+            self.input_source,
+            self.model_name,
+            self.detector.input_size,
+            self.detector.conf_threshold,
+            self.detector.nms_threshold,
+            self.target_objects,
+            # cv2.dnn, ONNX FP32 và INT8 cho kết quả khác nhau nên không dùng chung lần chạy
+            f"{self.detector.engine.name}:{self.detector.engine.model_path}"
+        )
+
+        def open_run():
+            try:
+                run = self.store.open_run(*key)
+            except Exception as e:
+                self.log.error(f"Không dùng được detection store: {str(e)}")
+                return
+            if generation == self.store_generation:
+                self.store_run = run
+
+        threading.Thread(target=open_run, daemon=True).start()
+
+    def detect_frames(self, positions, frames):
+        """Lấy detections từ store nếu có, chỉ chạy mạng cho các frame chưa có"""
+        # Kết quả ROI/chia ô khác với detect toàn frame nên không dùng store
+        # Giữ run cục bộ: thread nền có thể mở xong run, hoặc apply_level đổi run, giữa chừng
+        run = self.store_run
+        use_store = run is not None and not self.regions and not self.tiling
+
+        results = {}
+        if use_store:
+            results = self.store.get_many(run, positions, self.detector.classes)
+
+        missing = [i for i, position in enumerate(positions) if position not in results]
+        if missing:
+            started = time.perf_counter()
+            with self.detect_lock:
+                detected = self.run_network([frames[i] for i in missing])
+            latency = (time.perf_counter() - started) / len(missing)
+            timings.record("inference", latency)
+            self.report_latency(latency)
+            new_items = [(positions[i], detections) for i, detections in zip(missing, detected)]
+            results.update(new_items)
+
+            if use_store:
+                self.store.put_many(run, new_items, self.detector.classes)
+
+        self.store_hits += len(positions) - len(missing)
+        self.store_misses += len(missing)
+        return [results[position] for position in positions]
+
+    def render_loop(self):
+        """Stage 3: vẽ kết quả, đổi màu, cache và gửi frame lên giao diện đúng hạn chót của frame"""
+        last_stats = time.monotonic()
+        while self.running:
+            if self.paused:
+                self.msleep(100)
+                continue
+
+            item = self.render_queue.get(timeout=0.1)
+            now = time.monotonic()
+            if now - last_stats >= self.stats_interval:
+                self.queue_stats.emit(self.get_queue_stats())
+                last_stats = now
+
+            if item is None:
+                if self.render_queue.finished:
+                    break
+                continue
+
+            generation, current_pos, frame, detections = item
+            if generation != self.seek_generation:  # Frame trước lần tua gần nhất
+                continue
+
+            try:
+                if self.exporter is not None:  # Ghi cả frame sẽ bị bỏ khi hiển thị
+                    self.export_frame(current_pos, frame, detections)
+
+                if not self.is_live:  # Chỉ cache cho video, lưu trước khi vẽ overlay lên frame
+                    self.frame_cache.put(current_pos, detections, frame)
+
+                # Trễ hạn và đã có frame mới hơn: bỏ frame này để theo kịp thời gian thực
+                if self.pacer.is_late(current_pos) and self.render_queue.depth() > 0:
+                    self.pacer.frame_dropped()
+                    continue
 
-                    self.update_frame.emit(frame, detections)
-                    self.msleep(frame_delay)
+                image = self.render_image(frame, detections)
 
-                except Exception as e:
-                    print(f"Lỗi xử lý frame: {str(e)}")
+                # Chờ tới hạn chót của frame (ngủ từng đoạn ngắn để vẫn dừng/tua kịp)
+                delay = self.pacer.delay(current_pos)
+                while delay > 0 and self.running and generation == self.seek_generation:
+                    time.sleep(min(delay, 0.05))
+                    delay = self.pacer.delay(current_pos)
+                if generation != self.seek_generation:
                     continue
 
-            cap.release()
+                self.publish(image, detections)
+                self.pacer.frame_presented()
+
+            except Exception as e:
+                self.log.error(f"Lỗi xử lý frame: {str(e)}", key="process_frame")
+                continue
+
+    def open_exporter(self, cap):
+        meta = {
+            "video": "camera" if self.is_live else self.input_source,
+            "model": self.model_name,
+            "fps": self.fps,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "conf_threshold": self.detector.conf_threshold,
+            "nms_threshold": self.detector.nms_threshold,
+            "classes": self.detector.classes
+        }
+        try:
+            self.exporter, video_path, sidecar_path = create_exporter(
+                self.export, "camera" if self.is_live else self.input_source, self.fps, meta,
+                self.object_colors, self.export.get('detections_only', False), log=self.log)
+            self.log.info(f"Xuất kết quả: {', '.join(path for path in (video_path, sidecar_path) if path)}")
+        except Exception as e:
+            self.log.error(f"Không thể xuất kết quả: {str(e)}")
+            self.exporter = None
+
+    def export_frame(self, current_pos, frame, detections):
+        """Gửi frame cho exporter (không chặn; exporter tự bỏ frame video khi mã hóa không kịp)"""
+        if self.exporter.detections_only:
+            frame = None
+        else:
+            # Exporter vẽ đè lên frame nhận được, còn frame gốc vẫn dùng cho frame_cache và render_image
+            frame = frame.copy()
+        if self.is_live:
+            self.exporter.submit(frame, detections)
+        else:
+            timestamp = current_pos * 1000.0 / self.fps if self.fps > 0 else None
+            self.exporter.submit(frame, detections, current_pos, timestamp)
+
+    def close_exporter(self):
+        if self.exporter is None:
+            return
+        exporter, self.exporter = self.exporter, None
+        stats = exporter.close()
+        if exporter.error is not None:
+            return
+        if exporter.detections_only:
+            self.log.info("Đã xuất detections")
+        else:
+            self.log.info(f"Đã xuất {stats['export_written']} frame video"
+                          f" (bỏ {stats['export_dropped']}, lặp lại {stats['export_filled']})")
+
+    def load_keyframes(self, fps):
+        self.keyframes = KeyframeIndex.build(self.input_source, fps)
+
+    def get_queue_stats(self):
+        """Độ sâu và số frame bị bỏ của từng hàng đợi trong pipeline"""
+        stats = {}
+        for name, queue in (("decode", self.decode_queue), ("render", self.render_queue)):
+            if queue is not None:
+                stats[name] = queue.depth()
+                stats[f"{name}_max"] = queue.maxsize
+                stats[f"{name}_dropped"] = queue.dropped
+        stats["store_hits"] = self.store_hits
+        stats["store_misses"] = self.store_misses
+        stats.update(self.frame_cache.stats())
+        stats.update(self.seeker.stats())
+        if self.pacer is not None:
+            stats.update(self.pacer.stats())
+        if self.exporter is not None:
+            stats.update(self.exporter.stats())
+        if self.motion_gate is not None:
+            stats.update(self.motion_gate.stats())
+        if self.resolution is not None:
+            model_name, size = self.resolution.current
+            stats["input_size"] = f"{model_name} {size}"
+        if self.tracker is not None:
+            stats["detect_interval"] = self.interval.interval if self.interval is not None else 1
+        return stats
+
+    def run(self):
+        try:
+            cap = self.open_capture()
+            if cap is None:
+                return
+
+            self.cap = cap
+            self.open_store_run()
+            self.source_size.emit(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+            # Lấy thông tin video/camera
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            self.fps = fps
+            if self.export is not None:
+                self.open_exporter(cap)
+            # Camera tự giữ nhịp thời gian thực nên không cần chờ
+            self.pacer = FramePacer(
+                fps, FramePacer.MAX_THROUGHPUT if self.is_live else self.pacing, self.late_tolerance)
+
+            # N thích ứng theo độ trễ inference so với FPS nguồn
+            if self.tracker is not None:
+                self.interval = AdaptiveInterval(fps, self.max_interval)
+
+            if self.adaptive_resolution and self.model_name:
+                config = dict(self.adaptive_resolution)
+                sizes = config.pop("sizes")
+                target_fps = config.pop("target_fps", None) or (fps if fps > 0 else 30)
+                self.resolution = AdaptiveResolution.from_config(
+                    self.model_name, self.detector.input_size[0], sizes, target_fps, **config)
+
+            # Dựng index keyframe trong nền để tua với ít frame phải giải mã nhất
+            if not self.is_live:
+                threading.Thread(target=self.load_keyframes, args=(fps,), daemon=True).start()
+
+            # Backpressure: video thì chặn, camera thì bỏ frame cũ nhất
+            policy = FrameQueue.DROP_OLDEST if self.is_live else FrameQueue.BLOCK
+            self.decode_queue = FrameQueue(self.queue_size, policy)
+            self.render_queue = FrameQueue(self.queue_size, policy)
+
+            decoder = threading.Thread(target=self.decode_loop, args=(cap,), daemon=True)
+            inference = threading.Thread(target=self.inference_loop, daemon=True)
+            decoder.start()
+            inference.start()
+
+            self.render_loop()
+
+            # Dừng các stage còn lại trước khi giải phóng nguồn video
+            self.decode_queue.close()
+            self.render_queue.close()
+            decoder.join()
+            inference.join()
+            self.queue_stats.emit(self.get_queue_stats())
+            if self.store is not None:
+                self.store.flush()
+
+            with self.cap_lock:
+                cap.release()
         except Exception as e:
-            print(f"Lỗi trong detection thread: {str(e)}")
+            self.log.error(f"Lỗi trong detection thread: {str(e)}")
+        finally:
+            self.close_exporter()
 
     def stop(self):
         self.running = False
+        for queue in (self.decode_queue, self.render_queue):
+            if queue is not None:
+                queue.close()
@@ -0,0 +1,124 @@
+"""Engine chạy mạng cho YOLODetector: OpenCV DNN (mặc định) hoặc ONNX Runtime
+
+Mỗi engine nhận blob N x 3 x H x W và trả về list output theo định dạng của lớp region/yolo
+của OpenCV: mỗi dòng (cx, cy, w, h, objectness, xác suất từng lớp) với tọa độ tương đối.
+Chọn engine bằng khóa "engine" của từng model trong YOLO_CONFIGS.
+"""
+import os
+
+import cv2
+
+# Tên hằng số trong cv2.dnn; lấy bằng getattr vì không phải bản OpenCV nào cũng có đủ
+DNN_BACKENDS = {
+    "default": "DNN_BACKEND_DEFAULT",
+    "opencv": "DNN_BACKEND_OPENCV",
+    "openvino": "DNN_BACKEND_INFERENCE_ENGINE",
+    "cuda": "DNN_BACKEND_CUDA"
+}
+DNN_TARGETS = {
+    "cpu": "DNN_TARGET_CPU",
+    "opencl": "DNN_TARGET_OPENCL",
+    "opencl_fp16": "DNN_TARGET_OPENCL_FP16",
+    "cuda": "DNN_TARGET_CUDA",
+    "cuda_fp16": "DNN_TARGET_CUDA_FP16"
+}
+
+
+def cuda_device_count():
+    """Số GPU CUDA mà bản OpenCV này dùng được (0 nếu OpenCV build không có CUDA)"""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount()
+    except (AttributeError, cv2.error):
+        return 0
+
+
+def cuda_device_name(index=0):
+    try:
+        return cv2.cuda.DeviceInfo(index).name()
+    except (AttributeError, cv2.error):
+        return f"CUDA device {index}"
+
+
+def dnn_constant(table, name):
+    if name not in table:
+        raise ValueError(f"Không hỗ trợ '{name}', chọn một trong: {', '.join(table)}")
+    value = getattr(cv2.dnn, table[name], None)
+    if value is None:
+        raise ValueError(f"Bản OpenCV này không có {table[name]}")
+    return value
+
+
+class OpenCVEngine:
+    """cv2.dnn đọc trực tiếp cfg/weights Darknet; chọn được backend, target và số luồng"""
+
+    name = "opencv"
+    fixed_input_size = None  # Mạng Darknet tự reshape theo kích thước blob
+
+    def __init__(self, weights_path, config_path, device="auto", dnn_backend=None, target=None, threads=None):
+        # Kiểm tra CUDA ("auto" dùng GPU nếu có và không chỉ định backend, "cpu" luôn chạy trên CPU)
+        use_cuda = device != "cpu" and dnn_backend is None and cuda_device_count() > 0
+        if use_cuda:
+            print(f"Đang sử dụng GPU: {cuda_device_name(0)}")
+        elif device == "cpu":
+            print("Sử dụng CPU")
+        elif dnn_backend is None:
+            print("Không tìm thấy GPU, sử dụng CPU")
+
+        # setNumThreads áp dụng cho cả process (mọi mạng cv2.dnn và các hàm OpenCV khác)
+        if threads:
+            cv2.setNumThreads(int(threads))
+
+        self.net = cv2.dnn.readNet(weights_path, config_path)
+        self.model_path = os.path.abspath(weights_path)
+        if use_cuda:
+            dnn_backend, target = "cuda", "cuda"
+        if dnn_backend is not None:
+            self.net.setPreferableBackend(dnn_constant(DNN_BACKENDS, dnn_backend))
+        if target is not None:
+            self.net.setPreferableTarget(dnn_constant(DNN_TARGETS, target))
+        self.device = "cuda" if dnn_backend == "cuda" else "cpu"
+
+        self.output_layers = [self.net.getLayerNames()[i - 1] for i in self.net.getUnconnectedOutLayers()]
+
+    def forward(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward(self.output_layers)
+
+
+class OnnxRuntimeEngine:
+    """ONNX Runtime chạy model đã chuyển bằng darknet_onnx.py (có thể là model INT8)"""
+
+    name = "onnxruntime"
+
+    def __init__(self, model, threads=None, providers=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = int(threads)
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model, options, providers=providers or ["CPUExecutionProvider"])
+        self.model_path = os.path.abspath(model)
+        self.device = "cuda" if "CUDAExecutionProvider" in self.session.get_providers() else "cpu"
+        print(f"ONNX Runtime: {model} ({', '.join(self.session.get_providers())})")
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Lưới decode được xuất cố định nên chỉ chạy được ở đúng kích thước lúc chuyển đổi
+        _, _, height, width = model_input.shape
+        self.fixed_input_size = (width, height) if isinstance(width, int) and isinstance(height, int) else None
+
+    def forward(self, blob):
+        return self.session.run(None, {self.input_name: blob})
+
+
+def create_engine(weights_path, config_path, options=None, device="auto"):
+    """Tạo engine theo dict cấu hình {"type": "opencv" | "onnxruntime", ...tham số của engine}"""
+    options = dict(options or {})
+    kind = options.pop("type", "opencv")
+    if kind == "onnxruntime":
+        return OnnxRuntimeEngine(**options)
+    if kind == "opencv":
+        return OpenCVEngine(weights_path, config_path, device, **options)
+    raise ValueError(f"Không hỗ trợ engine: {kind}")
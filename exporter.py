@@ -0,0 +1,235 @@
+"""Xuất video đã vẽ kết quả và file detections đi kèm mà không làm chậm inference
+
+Vẽ và mã hóa chạy trong thread riêng sau một hàng đợi có giới hạn (cv2.VideoWriter, hoặc pipe
+vào process ffmpeg). Khi hàng đợi đầy, frame video bị bỏ thay vì chặn pipeline (trừ khi
+block=True, dùng cho xử lý hàng loạt); frame thiếu được lặp lại từ frame trước để video giữ
+đúng thời lượng. Detections của mọi frame luôn được ghi vào file đi kèm.
+"""
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from pipeline import FrameQueue
+from timing import timings
+from utils import draw_detections
+
+
+class OpenCVVideoSink:
+    def __init__(self, path, fps, size, codec="mp4v", **_):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, size)
+        if not self.writer.isOpened():
+            raise IOError(f"Không thể tạo file video: {path}")
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+
+class FFmpegVideoSink:
+    """Đẩy frame BGR thô qua pipe, ffmpeg mã hóa trong process riêng (dùng được nhiều core)"""
+
+    def __init__(self, path, fps, size, ffmpeg_args=None, **_):
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("Không tìm thấy ffmpeg")
+        command = [
+            "ffmpeg", "-v", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{size[0]}x{size[1]}", "-r", f"{fps:.3f}",
+            "-i", "-"
+        ] + list(ffmpeg_args or ["-c:v", "libx264", "-pix_fmt", "yuv420p"]) + [path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame.tobytes())
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg kết thúc với mã lỗi {self.process.returncode}")
+
+
+VIDEO_SINKS = {'opencv': OpenCVVideoSink, 'ffmpeg': FFmpegVideoSink}
+
+
+class DetectionExporter:
+    """Ghi video (tùy chọn) và detections từng frame trong một thread nền
+
+    sidecar: writer có write(frame_index, timestamp, detections) và close() (JsonlWriter, NpzWriter)
+    hoặc None; video_path None là chế độ chỉ ghi detections (không mã hóa lại video).
+    Frame truyền vào submit thuộc về exporter (sẽ bị vẽ đè), không dùng lại sau khi gửi.
+    """
+
+    def __init__(self, video_path=None, sidecar=None, fps=30.0, object_colors=None, video_writer="opencv",
+                 codec="mp4v", ffmpeg_args=None, queue_size=32, block=False, max_gap_fill=60, log=None):
+        if video_writer not in VIDEO_SINKS:
+            raise ValueError(f"Không hỗ trợ video_writer: {video_writer}")
+        self.video_path = video_path
+        self.sidecar = sidecar
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.object_colors = object_colors or {}
+        self.video_writer = video_writer
+        self.sink_options = {"codec": codec, "ffmpeg_args": ffmpeg_args}
+        self.block = block
+        self.max_gap_fill = max_gap_fill
+        self.log = log
+
+        self.frames = FrameQueue(queue_size, FrameQueue.BLOCK)
+        self.records = deque()  # (frame_index, timestamp, detections): nhỏ nên không giới hạn
+        self.sink = None
+        self.error = None
+        self.started = time.monotonic()
+        self.next_index = 0
+        self.last_frame = None
+        self.last_encoded = None
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.frames_filled = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @property
+    def detections_only(self):
+        return self.video_path is None
+
+    def submit(self, frame, detections, frame_index=None, timestamp=None):
+        """Gửi một frame (không chặn trừ khi block=True); trả về False nếu frame video bị bỏ
+
+        frame_index None: đánh số liên tiếp (camera); timestamp None: ms từ lúc bắt đầu xuất.
+        Frame có chỉ số không tăng (tua lùi) bị bỏ qua để file không bị lặp đoạn.
+        """
+        if frame_index is None:
+            frame_index = self.next_index
+        if frame_index < self.next_index:
+            return False
+        self.next_index = frame_index + 1
+        if timestamp is None:
+            timestamp = (time.monotonic() - self.started) * 1000.0
+
+        if self.sidecar is not None:
+            self.records.append((frame_index, timestamp, detections))
+        if self.detections_only or frame is None or self.error is not None:
+            return True
+
+        if self.frames.put((frame_index, frame, detections), timeout=None if self.block else 0):
+            return True
+        self.frames_dropped += 1
+        return False
+
+    def run(self):
+        while True:
+            item = self.frames.get(timeout=0.1)
+            self.write_records()
+            if item is None:
+                if self.frames.finished:
+                    break
+                continue
+            self.encode(*item)
+
+        self.write_records()
+        try:
+            if self.sink is not None:
+                self.sink.close()
+        except Exception as e:
+            self.fail(f"Lỗi khi đóng file video: {str(e)}")
+        try:
+            if self.sidecar is not None:
+                self.sidecar.close()
+        except Exception as e:
+            self.fail(f"Lỗi khi ghi file detections: {str(e)}")
+
+    def write_records(self):
+        if self.sidecar is None:
+            return
+        while self.records:
+            try:
+                self.sidecar.write(*self.records.popleft())
+            except Exception as e:
+                self.fail(f"Lỗi khi ghi file detections: {str(e)}")
+                self.sidecar = None
+                self.records.clear()
+                return
+
+    def encode(self, frame_index, frame, detections):
+        if self.error is not None:
+            return
+        try:
+            with timings.measure("encode"):
+                frame = draw_detections(frame, detections, self.object_colors)
+                if self.sink is None:
+                    height, width = frame.shape[:2]
+                    self.sink = VIDEO_SINKS[self.video_writer](
+                        self.video_path, self.fps, (width, height), **self.sink_options)
+
+                # Lặp lại frame trước cho các frame bị bỏ để video giữ đúng nhịp
+                if self.last_frame is not None:
+                    gap = min(frame_index - self.last_encoded - 1, self.max_gap_fill)
+                    for _ in range(max(0, gap)):
+                        self.sink.write(self.last_frame)
+                        self.frames_filled += 1
+
+                self.sink.write(frame)
+            self.last_frame = frame
+            self.last_encoded = frame_index
+            self.frames_written += 1
+        except Exception as e:
+            self.fail(f"Lỗi khi ghi video: {str(e)}")
+            self.frames.clear()
+
+    def fail(self, message):
+        self.error = message
+        if self.log is not None:
+            self.log.error(message, key="export")
+        else:
+            print(message)
+
+    def stats(self):
+        return {
+            "export_queue": self.frames.depth(),
+            "export_written": self.frames_written,
+            "export_dropped": self.frames_dropped,
+            "export_filled": self.frames_filled
+        }
+
+    def close(self):
+        """Chờ ghi hết các frame còn trong hàng đợi rồi đóng file"""
+        self.frames.close()
+        self.thread.join()
+        return self.stats()
+
+
+def export_paths(directory, source, extension=".mp4", sidecar_format="jsonl"):
+    """(đường dẫn video, đường dẫn detections) trong directory, đặt tên theo nguồn và thời điểm"""
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.splitext(os.path.basename(str(source)))[0] or "camera"
+    stem = os.path.join(directory, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}")
+    return stem + extension, f"{stem}.{sidecar_format}"
+
+
+def create_exporter(config, source, fps, meta, object_colors, detections_only=False, block=False, log=None):
+    """Tạo exporter theo dict cấu hình EXPORT; file detections dùng writer của batch_process"""
+    from batch_process import WRITERS
+
+    video_path, sidecar_path = export_paths(
+        config['directory'], source, config.get('extension', ".mp4"), config.get('sidecar_format', "jsonl"))
+    sidecar = WRITERS[config.get('sidecar_format', "jsonl")](sidecar_path, meta)
+    exporter = DetectionExporter(
+        None if detections_only else video_path,
+        sidecar,
+        fps,
+        object_colors,
+        config.get('video_writer', "opencv"),
+        config.get('codec', "mp4v"),
+        config.get('ffmpeg_args'),
+        config.get('queue_size', 32),
+        block,
+        config.get('max_gap_fill', 60),
+        log
+    )
+    return exporter, (None if detections_only else video_path), sidecar_path
@@ -0,0 +1,87 @@
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+import cv2
+
+# detections: list (class_name, conf, box) theo tọa độ frame gốc
+# frame: frame BGR đã thu nhỏ (hoặc None), scale: tỉ lệ frame thu nhỏ / frame gốc
+CacheEntry = namedtuple("CacheEntry", ["detections", "frame", "scale", "nbytes"])
+
+DETECTION_BYTES = 160  # Ước lượng bộ nhớ cho một tuple detection trong Python
+
+
+class FrameCache:
+    """Cache LRU giới hạn theo số byte, lưu detections thay vì frame đã vẽ"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, store_frames=True, max_frame_width=640):
+        self.max_bytes = max_bytes
+        self.store_frames = store_frames
+        self.max_frame_width = max_frame_width
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()  # Dùng chung giữa thread render và thread giao diện
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, frame_number, detections, frame=None):
+        """Lưu detections của một frame, kèm frame hiển thị thu nhỏ nếu được bật"""
+        small_frame = None
+        scale = 1.0
+        if self.store_frames and frame is not None:
+            height, width = frame.shape[:2]
+            if width > self.max_frame_width:
+                scale = self.max_frame_width / width
+                small_frame = cv2.resize(frame, (self.max_frame_width, max(1, int(height * scale))),
+                                         interpolation=cv2.INTER_AREA)
+            else:
+                small_frame = frame.copy()
+
+        nbytes = sys.getsizeof(detections) + DETECTION_BYTES * len(detections)
+        if small_frame is not None:
+            nbytes += small_frame.nbytes
+
+        with self.lock:
+            if frame_number in self.entries:
+                self.total_bytes -= self.entries.pop(frame_number).nbytes
+
+            self.entries[frame_number] = CacheEntry(detections, small_frame, scale, nbytes)
+            self.total_bytes += nbytes
+            self.evict()
+
+    def get(self, frame_number):
+        """Trả về CacheEntry (và đánh dấu vừa dùng) hoặc None nếu không có"""
+        with self.lock:
+            entry = self.entries.get(frame_number)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(frame_number)
+            self.hits += 1
+            return entry
+
+    def evict(self):
+        """Bỏ các frame ít được dùng nhất cho tới khi nằm trong giới hạn byte"""
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def __contains__(self, frame_number):
+        return frame_number in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_frames": len(self.entries),
+            "cache_bytes": self.total_bytes
+        }
@@ -1,16 +1,19 @@
 import sys
-import cv2
-import numpy as np
+import random
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QComboBox, QPushButton, QFileDialog, QListWidget,
-                             QFrame, QSplitter, QScrollArea, QStyleFactory, QListWidgetItem, QSlider)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from PyQt6.QtGui import QImage, QPixmap, QPalette, QColor, QFont
-from config import YOLO_CONFIGS, CLASSES
-from detector import YOLODetector, DetectionThread
-from utils import draw_detections
+                             QFrame, QSplitter, QScrollArea, QStyleFactory, QListWidgetItem, QSlider,
+                             QCheckBox, QSizePolicy, QListView, QInputDialog, QLineEdit)
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QRectF, QAbstractListModel, QModelIndex
+from PyQt6.QtGui import QPixmap, QPalette, QColor, QFont, QPainter, QPen
+from config import YOLO_CONFIGS, CLASSES, MOTION_GATE, TRACKER, TILING, ADAPTIVE_RESOLUTION, STATS, LOG, PLAYBACK, MULTI_STREAM, EXPORT
+from detection_log import DetectionLog
+from timing import timings
 import os
 
+# detector, model_registry, detection_store, multi_stream, motion_gate và tracker kéo theo cv2/numpy
+# nên chỉ được import khi dùng lần đầu để cửa sổ hiện ra ngay (xem check_startup.py)
+
 
 class ModernButton(QPushButton):
     def __init__(self, text, color="#2196F3"):
@@ -41,7 +44,141 @@ class ModernButton(QPushButton):
         return f"#{r:02x}{g:02x}{b:02x}"
 
 
+class RoiLabel(QLabel):
+    """Khung hiển thị video, kéo chuột trái để vẽ các vùng ROI cần detect"""
+    regions_changed = pyqtSignal(list)
+    resized = pyqtSignal(int, int)
+
+    def __init__(self):
+        super().__init__()
+        self.frame_size = None  # (width, height) của frame gốc
+        self.regions = []  # Các ROI theo tọa độ frame gốc (x, y, w, h)
+        self.drag_start = None
+        self.drag_end = None
+
+    def pixmap_rect(self):
+        """Vị trí và kích thước ảnh đang hiển thị (căn giữa, giữ tỉ lệ) trong label"""
+        pixmap = self.pixmap()
+        if pixmap is None or pixmap.isNull() or not self.frame_size:
+            return None
+        x = (self.width() - pixmap.width()) / 2
+        y = (self.height() - pixmap.height()) / 2
+        return x, y, pixmap.width(), pixmap.height()
+
+    def to_frame(self, point):
+        """Đổi tọa độ chuột trên label sang tọa độ frame gốc"""
+        x, y, w, h = self.pixmap_rect()
+        scale = self.frame_size[0] / w
+        fx = min(max(point.x() - x, 0), w) * scale
+        fy = min(max(point.y() - y, 0), h) * scale
+        return fx, fy
+
+    def to_label(self, region):
+        x, y, w, h = self.pixmap_rect()
+        scale = w / self.frame_size[0]
+        rx, ry, rw, rh = region
+        return QRectF(x + rx * scale, y + ry * scale, rw * scale, rh * scale)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton and self.pixmap_rect() is not None:
+            self.drag_start = self.to_frame(event.position())
+            self.drag_end = self.drag_start
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.drag_start is not None:
+            self.drag_end = self.to_frame(event.position())
+            self.update()
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        if self.drag_start is not None:
+            (x1, y1), (x2, y2) = self.drag_start, self.to_frame(event.position())
+            self.drag_start = None
+            self.drag_end = None
+            region = (int(min(x1, x2)), int(min(y1, y2)), int(abs(x2 - x1)), int(abs(y2 - y1)))
+            if region[2] >= 16 and region[3] >= 16:  # Bỏ qua click nhầm
+                self.regions.append(region)
+                self.regions_changed.emit(list(self.regions))
+            self.update()
+        super().mouseReleaseEvent(event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resized.emit(self.width(), self.height())
+
+    def clear_regions(self):
+        self.regions = []
+        self.regions_changed.emit([])
+        self.update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.pixmap_rect() is None:
+            return
+
+        painter = QPainter(self)
+        painter.setPen(QPen(QColor("#FFC107"), 2, Qt.PenStyle.DashLine))
+        for region in self.regions:
+            painter.drawRect(self.to_label(region))
+        if self.drag_start is not None:
+            (x1, y1), (x2, y2) = self.drag_start, self.drag_end
+            painter.drawRect(self.to_label((min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1))))
+        painter.end()
+
+
+class ObjectCountModel(QAbstractListModel):
+    """Model cho bảng Objects Count: cập nhật tại chỗ, chỉ báo các dòng thay đổi"""
+
+    def __init__(self, object_colors, show_average=True, show_peak=True):
+        super().__init__()
+        self.object_colors = object_colors
+        self.show_average = show_average
+        self.show_peak = show_peak
+        self.rows = []  # (class_name, count, average, peak, unique)
+
+    def rowCount(self, parent=QModelIndex()):
+        return len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        name, count, average, peak, unique = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            text = f"{name}: {count}"
+            if self.show_average:
+                text += f" | TB {average:.1f}"
+            if self.show_peak:
+                text += f" | max {peak}"
+            if unique is not None:  # Có tracker: số đối tượng khác nhau đã thấy
+                text += f" | tổng {unique}"
+            return text
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return QColor(self.object_colors.get(name, {'hex': '#FFFFFF'})['hex'])
+        return None
+
+    def set_rows(self, rows):
+        """Thay số liệu; giữ nguyên các dòng, chỉ phát dataChanged cho dòng có thay đổi"""
+        if [row[0] for row in rows] != [row[0] for row in self.rows]:
+            self.beginResetModel()
+            self.rows = list(rows)
+            self.endResetModel()
+            return
+
+        for i, row in enumerate(rows):
+            if row != self.rows[i]:
+                self.rows[i] = row
+                index = self.index(i)
+                self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+
+    def clear(self):
+        self.set_rows([])
+
+
 class MainWindow(QMainWindow):
+    model_ready = pyqtSignal(str, str)  # Tên model, lỗi (rỗng nếu nạp thành công)
+    log_pending = pyqtSignal()  # Có dòng log mới (phát từ bất kỳ thread nào)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("YOLO Object Detection System")
@@ -50,20 +187,40 @@ class MainWindow(QMainWindow):
         # Khởi tạo dict màu cho các đối tượng ngay từ đầu
         self.object_colors = {}
         for class_name in CLASSES:
-            r = np.random.randint(100, 256)
-            g = np.random.randint(100, 256)
-            b = np.random.randint(100, 256)
+            r = random.randint(100, 255)
+            g = random.randint(100, 255)
+            b = random.randint(100, 255)
             self.object_colors[class_name.lower()] = {
                 'rgb': (r, g, b),
                 'hex': f"#{r:02x}{g:02x}{b:02x}"
             }
 
+        # Log dùng chung: worker chỉ ghi vào buffer, giao diện lấy theo lô
+        self.log = DetectionLog(
+            LOG['max_entries'],
+            LOG['rate_limit'],
+            LOG['rate_period'],
+            LOG['file'],
+            LOG['max_file_bytes'],
+            LOG['backup_count']
+        )
+        self.log_pending.connect(self.schedule_log_flush)
+        self.log.set_notify(self.log_pending.emit)
+
+        # Store lưu detections xuống đĩa, mở khi bắt đầu phát hiện lần đầu
+        self.detection_store = None
+        self.detection_store_opened = False
+
         self.setup_ui()
         self.apply_styles()
 
         # Tự động load videos khi khởi động
         self.auto_load_videos()
 
+        # Nạp sẵn model đang chọn trong nền, sau khi cửa sổ đã hiện
+        self.model_ready.connect(self.on_model_ready)
+        QTimer.singleShot(0, lambda: self.preload_model(self.model_combo.currentText()))
+
     def setup_ui(self):
         # Tạo widget chính
         main_widget = QWidget()
@@ -106,6 +263,7 @@ class MainWindow(QMainWindow):
         self.model_combo = QComboBox()
         self.model_combo.addItems(["YOLOv2", "YOLOv3", "YOLOv4", "YOLOv5"])
         self.model_combo.setStyleSheet("QComboBox { padding: 5px; }")
+        self.model_combo.currentTextChanged.connect(self.preload_model)
         layout.addWidget(self.model_combo)
 
         # Input source
@@ -125,6 +283,51 @@ class MainWindow(QMainWindow):
         self.object_list.setSelectionMode(QListWidget.SelectionMode.MultiSelection)
         layout.addWidget(self.object_list)
 
+        # Bỏ qua inference cho các frame tĩnh
+        self.motion_gate_check = QCheckBox("Bỏ qua frame tĩnh (motion gate)")
+        layout.addWidget(self.motion_gate_check)
+
+        # Detect mỗi N frame, tracker nội suy box và đếm số đối tượng khác nhau
+        self.tracker_check = QCheckBox("Tracking (detect mỗi N frame)")
+        layout.addWidget(self.tracker_check)
+
+        # Chia frame thành ô cho video độ phân giải cao
+        self.tiling_check = QCheckBox("Chia ô (video độ phân giải cao)")
+        self.tiling_check.toggled.connect(self.on_tiling_toggled)
+        layout.addWidget(self.tiling_check)
+
+        # Tự động chỉnh kích thước input để đạt FPS mục tiêu
+        self.resolution_check = QCheckBox("Tự động chỉnh độ phân giải input")
+        layout.addWidget(self.resolution_check)
+
+        # Chạy nhanh nhất có thể thay vì phát theo thời gian thực (phân tích offline)
+        self.max_speed_check = QCheckBox("Tốc độ tối đa (không đồng bộ thời gian thực)")
+        self.max_speed_check.setChecked(PLAYBACK['mode'] == "max")
+        self.max_speed_check.toggled.connect(self.on_pacing_toggled)
+        layout.addWidget(self.max_speed_check)
+
+        # Lưu video đã vẽ kết quả và file detections vào thư mục exports khi chạy
+        self.export_check = QCheckBox("Xuất video + detections")
+        layout.addWidget(self.export_check)
+        self.detections_only_check = QCheckBox("Chỉ xuất detections (không mã hóa video)")
+        self.detections_only_check.setEnabled(False)
+        self.export_check.toggled.connect(self.detections_only_check.setEnabled)
+        layout.addWidget(self.detections_only_check)
+
+        # Bảng độ trễ từng stage (decode, blob, forward, ... , paint)
+        self.timing_check = QCheckBox("Hiện độ trễ từng stage")
+        self.timing_check.toggled.connect(self.on_timing_toggled)
+        layout.addWidget(self.timing_check)
+
+        self.export_timing_button = ModernButton("Xuất timing", "#607D8B")
+        self.export_timing_button.clicked.connect(self.export_timings)
+        layout.addWidget(self.export_timing_button)
+
+        # Xóa các vùng ROI đã vẽ trên khung hiển thị
+        self.clear_roi_button = ModernButton("Xóa ROI", "#607D8B")
+        self.clear_roi_button.clicked.connect(lambda: self.display_label.clear_regions())
+        layout.addWidget(self.clear_roi_button)
+
         # Control buttons
         self.start_button = ModernButton("Start Detection", "#4CAF50")
         self.stop_button = ModernButton("Stop Detection", "#f44336")
@@ -139,6 +342,11 @@ class MainWindow(QMainWindow):
         self.camera_button.clicked.connect(self.start_camera_detection)
         layout.addWidget(self.camera_button)
 
+        # Nhiều nguồn cùng lúc, dùng chung một model
+        self.multi_stream_button = ModernButton("Multi-stream", "#FF9800")
+        self.multi_stream_button.clicked.connect(self.start_multi_stream)
+        layout.addWidget(self.multi_stream_button)
+
         layout.addStretch()
         panel.setLayout(layout)
         return panel
@@ -155,9 +363,13 @@ class MainWindow(QMainWindow):
         layout.addWidget(title)
 
         # Khu vực hiển thị
-        self.display_label = QLabel()
+        self.display_label = RoiLabel()
+        self.display_label.regions_changed.connect(self.on_regions_changed)
         self.display_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.display_label.setMinimumSize(640, 480)
+        # Ảnh đã được worker thu nhỏ đúng kích thước: không để pixmap làm label to ra
+        self.display_label.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
+        self.display_label.resized.connect(self.on_display_resized)
         self.display_label.setStyleSheet("QLabel { background-color: #1e1e1e; }")
 
         scroll_area = QScrollArea()
@@ -185,6 +397,18 @@ class MainWindow(QMainWindow):
         self.video_slider.valueChanged.connect(self.on_slider_changed)
         layout.addWidget(self.video_slider)
 
+        # Độ sâu hàng đợi của pipeline decode -> inference -> render
+        self.pipeline_label = QLabel("Pipeline: -")
+        self.pipeline_label.setStyleSheet("QLabel { color: #aaaaaa; font-size: 11px; border: none; }")
+        layout.addWidget(self.pipeline_label)
+
+        # p50/p95/p99 và throughput của từng stage, chỉ hiện khi bật
+        self.timing_label = QLabel()
+        self.timing_label.setFont(QFont("Courier New", 10))
+        self.timing_label.setStyleSheet("QLabel { color: #aaaaaa; border: none; }")
+        self.timing_label.setVisible(False)
+        layout.addWidget(self.timing_label)
+
         # Thêm các nút điều khiển video
         video_controls = QHBoxLayout()
         self.play_button = ModernButton("Play", "#4CAF50")
@@ -231,19 +455,39 @@ class MainWindow(QMainWindow):
         """)
         self.video_list.itemClicked.connect(self.on_video_selected)
         video_layout.addWidget(self.video_list)
+
+        # Tìm đoạn video trong index (video_index.py), bấm kết quả để nhảy tới frame
+        search_layout = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("person>=3 and truck")
+        self.search_edit.returnPressed.connect(self.search_index)
+        self.search_button = ModernButton("Tìm", "#607D8B")
+        self.search_button.clicked.connect(self.search_index)
+        search_layout.addWidget(self.search_edit, 1)
+        search_layout.addWidget(self.search_button)
+        video_layout.addLayout(search_layout)
+
+        self.search_results = QListWidget()
+        self.search_results.setStyleSheet(self.video_list.styleSheet())
+        self.search_results.setVisible(False)
+        self.search_results.itemClicked.connect(self.on_search_result_selected)
+        video_layout.addWidget(self.search_results)
         video_container.setLayout(video_layout)
 
         # Phần hiển thị số lượng đối tượng (2/3 panel phía trên)
-        self.stats_list = QListWidget()
+        self.stats_model = ObjectCountModel(self.object_colors, STATS['show_average'], STATS['show_peak'])
+        self.stats_list = QListView()
+        self.stats_list.setModel(self.stats_model)
+        self.stats_list.setUniformItemSizes(True)
         self.stats_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 background-color: #2d2d2d;
                 border: 1px solid #3d3d3d;
                 border-radius: 4px;
                 padding: 5px;
                 font-size: 14px;
             }
-            QListWidget::item {
+            QListView::item {
                 padding: 8px;
                 border-bottom: 1px solid #3d3d3d;
             }
@@ -334,6 +578,47 @@ class MainWindow(QMainWindow):
             }
         """)
 
+    def schedule_log_flush(self):
+        """Hẹn một lần cập nhật Detection Log cho cả lô dòng mới"""
+        QTimer.singleShot(LOG['flush_ms'], self.flush_log)
+
+    def flush_log(self):
+        """Thêm các dòng log mới vào danh sách, chỉ giữ lại max_entries dòng gần nhất"""
+        batch = self.log.drain()
+        if not batch:
+            return
+        self.info_list.addItems(batch)
+        overflow = self.info_list.count() - LOG['max_entries']
+        for _ in range(max(0, overflow)):
+            self.info_list.takeItem(0)
+        self.info_list.scrollToBottom()
+
+    def get_detection_store(self):
+        """Store lưu detections để không phải chạy lại model cho video đã xử lý (None nếu không mở được)"""
+        if not self.detection_store_opened:
+            self.detection_store_opened = True
+            try:
+                from detection_store import DetectionStore
+                self.detection_store = DetectionStore()
+            except Exception as e:
+                self.log.error(f"Không mở được detection store: {str(e)}")
+        return self.detection_store
+
+    def preload_model(self, model):
+        """Nạp và warm-up model trong nền ngay khi được chọn"""
+        from model_registry import registry
+
+        if model not in YOLO_CONFIGS or registry.is_loaded(model):
+            return
+        self.log.info(f"Đang nạp trước model {model}...")
+        registry.preload(model, callback=lambda name, error: self.model_ready.emit(name, error or ""))
+
+    def on_model_ready(self, model, error):
+        if error:
+            self.log.error(f"Lỗi khởi tạo model {model}: {error}")
+        else:
+            self.log.info(f"Model {model} đã sẵn sàng")
+
     def browse_input(self):
         input_type = self.input_combo.currentText()
         if input_type == "Video":
@@ -351,7 +636,7 @@ class MainWindow(QMainWindow):
                 for file_name in file_names:
                     item = QListWidgetItem(file_name)
                     self.video_list.addItem(item)
-                    self.info_list.addItem(f"Đã thêm video: {file_name}")
+                    self.log.info(f"Đã thêm video: {file_name}")
 
                 # Tự động chọn video đầu tiên
                 self.video_list.setCurrentRow(0)
@@ -361,32 +646,33 @@ class MainWindow(QMainWindow):
         try:
             if hasattr(self, 'detection_thread') and self.detection_thread.isRunning():
                 return
+            self.stop_multi_stream()  # Các chế độ dùng chung model trong registry
 
             selected_objects = [item.text().lower() for item in self.object_list.selectedItems()]
             if not selected_objects:
-                self.info_list.addItem("Vui lòng chọn ít nhất một đối tượng để phát hiện!")
+                self.log.warning("Vui lòng chọn ít nhất một đối tượng để phát hiện!")
                 return
 
             if not hasattr(self, 'input_source') and self.input_combo.currentText() != "Camera":
-                self.info_list.addItem("Vui lòng chọn nguồn đầu vào!")
+                self.log.warning("Vui lòng chọn nguồn đầu vào!")
                 return
 
             # Khởi tạo detector
             model = self.model_combo.currentText()
             if model not in YOLO_CONFIGS:
-                self.info_list.addItem("Model không hợp lệ!")
+                self.log.warning("Model không hợp lệ!")
                 return
 
-            config = YOLO_CONFIGS[model]
             try:
-                self.detector = YOLODetector(
-                    config['weights'],
-                    config['config'],
-                    config['conf_threshold'],
-                    config['nms_threshold']
-                )
+                from model_registry import registry
+                from detector import DetectionThread
+
+                # Dùng lại model đã nạp (hoặc đang nạp nền) thay vì đọc lại weights
+                if not registry.is_loaded(model):
+                    self.log.info(f"Đang nạp model {model}...")
+                self.detector = registry.get(model)
             except Exception as e:
-                self.info_list.addItem(f"Lỗi khởi tạo model: {str(e)}")
+                self.log.error(f"Lỗi khởi tạo model: {str(e)}")
                 return
 
             # Khởi tạo và start detection thread
@@ -395,63 +681,151 @@ class MainWindow(QMainWindow):
                 self.input_source if hasattr(self, 'input_source') else "Camera",
                 selected_objects,
                 self.object_colors,
-                self.info_list
+                self.log,
+                store=self.get_detection_store(),
+                model_name=model,
+                motion_gate=self.create_motion_gate(),
+                tracker=self.create_tracker(),
+                max_interval=TRACKER['max_interval'],
+                regions=self.display_label.regions,
+                tiling=TILING if self.tiling_check.isChecked() else None,
+                adaptive_resolution=ADAPTIVE_RESOLUTION if self.resolution_check.isChecked() else None,
+                display_size=(self.display_label.width(), self.display_label.height()),
+                stats_window=STATS['window'],
+                stats_refresh_hz=STATS['refresh_hz'],
+                pacing=self.pacing_mode(),
+                late_tolerance=PLAYBACK['late_tolerance'],
+                export=self.export_config()
             )
+            self.stats_model.clear()
+            timings.reset()
             self.detection_thread.update_frame.connect(self.update_display)
+            self.detection_thread.source_size.connect(self.on_source_size)
+            self.detection_thread.object_stats.connect(self.update_object_stats)
+            self.detection_thread.queue_stats.connect(self.update_pipeline_stats)
             self.detection_thread.start()
 
-            self.info_list.addItem("Bắt đầu phát hiện ��ối tượng...")
+            self.log.info("Bắt đầu phát hiện ��ối tượng...")
         except Exception as e:
-            self.info_list.addItem(f"Lỗi khi bắt đầu phát hiện: {str(e)}")
+            self.log.error(f"Lỗi khi bắt đầu phát hiện: {str(e)}")
+
+    def create_motion_gate(self):
+        """Tạo motion gate nếu người dùng bật tùy chọn"""
+        if not self.motion_gate_check.isChecked():
+            return None
+        from motion_gate import MotionGate
+        return MotionGate(**MOTION_GATE)
+
+    def create_tracker(self):
+        """Tạo tracker nếu người dùng bật tùy chọn"""
+        if not self.tracker_check.isChecked():
+            return None
+        from tracker import Tracker
+        return Tracker(TRACKER['iou_threshold'], TRACKER['max_age'], TRACKER['min_hits'])
+
+    def on_regions_changed(self, regions):
+        """Áp dụng ROI mới cho detection đang chạy"""
+        if hasattr(self, 'detection_thread') and self.detection_thread.isRunning():
+            self.detection_thread.set_regions(regions)
+        if regions:
+            self.log.info(f"Chỉ detect trong {len(regions)} vùng ROI")
+        else:
+            self.log.info("Detect trên toàn bộ frame")
+
+    def on_tiling_toggled(self, checked):
+        if hasattr(self, 'detection_thread') and self.detection_thread.isRunning():
+            self.detection_thread.set_tiling(TILING if checked else None)
 
     def stop_detection(self):
         if hasattr(self, 'detection_thread') and self.detection_thread.isRunning():
-            self.detection_thread.running = False
+            self.detection_thread.stop()
             self.detection_thread.wait()
-            self.info_list.addItem("Đã dừng phát hiện đối tượng")
+            self.log.info("Đã dừng phát hiện đối tượng")
 
-    def update_display(self, frame, detections):
-        if frame is None:
+    def update_display(self, image, detections):
+        """Chỉ gắn ảnh đã được worker thu nhỏ và vẽ sẵn vào khung hiển thị"""
+        if image is None or image.isNull():
             return
 
-        h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        pixmap = QPixmap.fromImage(qt_image)
-        scaled_pixmap = pixmap.scaled(
-            self.display_label.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        )
-        self.display_label.setPixmap(scaled_pixmap)
+        with timings.measure("paint"):
+            self.display_label.setPixmap(QPixmap.fromImage(image))
 
-        # Cập nhật số lượng đối tượng
-        self.update_object_stats(detections)
+    def on_source_size(self, width, height):
+        self.display_label.frame_size = (width, height)
 
-    def update_object_stats(self, detections):
-        """Cập nhật số lượng đối tượng được phát hiện"""
-        self.stats_list.clear()
+    def on_display_resized(self, width, height):
+        """Worker thu nhỏ frame theo kích thước mới của khung hiển thị"""
+        if hasattr(self, 'detection_thread') and self.detection_thread.isRunning():
+            self.detection_thread.set_display_size(width, height)
 
-        # Lấy danh sách các đối tượng được chọn
-        selected_objects = [item.text().lower() for item in self.object_list.selectedItems()]
+    def update_pipeline_stats(self, stats):
+        """Hiển thị độ sâu hàng đợi để biết stage nào đang nghẽn"""
+        if not stats:
+            return
+        self.pipeline_label.setText(
+            f"Pipeline: decode {stats.get('decode', 0)}/{stats.get('decode_max', 0)}"
+            f" | render {stats.get('render', 0)}/{stats.get('render_max', 0)}"
+            f" | dropped {stats.get('decode_dropped', 0) + stats.get('render_dropped', 0)}"
+            f" | store {stats.get('store_hits', 0)} hit / {stats.get('store_misses', 0)} miss"
+            f" | cache {stats.get('cache_hits', 0)} hit / {stats.get('cache_misses', 0)} miss"
+            f" ({stats.get('cache_bytes', 0) / (1024 * 1024):.0f} MB)"
+            f" | seek {stats.get('seek_served', 0)}/{stats.get('seek_requests', 0)}"
+        )
+        if 'fps' in stats:
+            self.pipeline_label.setText(
+                self.pipeline_label.text()
+                + f" | {stats['fps']:.1f} FPS, bỏ {stats['drop_fps']:.1f} frame/s ({stats['frames_dropped']})"
+            )
+        if 'export_written' in stats:
+            self.pipeline_label.setText(
+                self.pipeline_label.text()
+                + f" | export {stats['export_queue']} chờ, {stats['export_written']} ghi, bỏ {stats['export_dropped']}"
+            )
+        if 'input_size' in stats:
+            self.pipeline_label.setText(self.pipeline_label.text() + f" | input {stats['input_size']}")
+        if 'detect_interval' in stats:
+            self.pipeline_label.setText(self.pipeline_label.text() + f" | N={stats['detect_interval']}")
+        if 'gate_skipped' in stats:
+            self.pipeline_label.setText(
+                self.pipeline_label.text()
+                + f" | gate bỏ qua {stats['gate_skipped']}/{stats['gate_skipped'] + stats['gate_inferences']}"
+            )
+        if self.timing_label.isVisible():
+            self.timing_label.setText(timings.format_table())
 
-        # Đếm số lượng mỗi loại đối tượng từ detections
-        object_counts = {}
-        for detection in detections:
-            class_name = detection[0]
-            object_counts[class_name] = object_counts.get(class_name, 0) + 1
+    def export_config(self):
+        """Cấu hình xuất kết quả cho detection thread, None nếu không bật"""
+        if not self.export_check.isChecked():
+            return None
+        return dict(EXPORT, detections_only=self.detections_only_check.isChecked())
 
-        # Hiển thị kết quả cho tất cả các đối tượng được chọn
-        for obj_name in selected_objects:
-            count = object_counts.get(obj_name, 0)  # Lấy số lượng, mặc định là 0
-            item = QListWidgetItem(f"{obj_name}: {count}")
-            item.setTextAlignment(Qt.AlignmentFlag.AlignLeft)
+    def pacing_mode(self):
+        return "max" if self.max_speed_check.isChecked() else "realtime"
 
-            # Tạo màu khác nhau cho các đối tượng khác nhau
-            color = self.get_object_color(obj_name)
-            item.setForeground(QColor(color))
+    def on_pacing_toggled(self, checked):
+        if hasattr(self, 'detection_thread') and self.detection_thread.isRunning():
+            self.detection_thread.set_pacing(self.pacing_mode())
+
+    def on_timing_toggled(self, checked):
+        self.timing_label.setVisible(checked)
+        if checked:
+            self.timing_label.setText(timings.format_table())
+
+    def export_timings(self):
+        """Lưu số liệu độ trễ ra file CSV hoặc định dạng Prometheus"""
+        file_name, _ = QFileDialog.getSaveFileName(
+            self, "Xuất timing", "timings.csv", "CSV (*.csv);;Prometheus (*.prom)")
+        if not file_name:
+            return
+        try:
+            timings.export(file_name)
+            self.log.info(f"Đã xuất timing: {file_name}")
+        except Exception as e:
+            self.log.error(f"Lỗi khi xuất timing: {str(e)}")
 
-            self.stats_list.addItem(item)
+    def update_object_stats(self, rows):
+        """Cập nhật bảng số lượng đối tượng từ thống kê do worker tính sẵn"""
+        self.stats_model.set_rows(rows)
 
     def get_object_color(self, object_name):
         """Trả về màu cố định cho mỗi loại đối tượng"""
@@ -473,14 +847,76 @@ class MainWindow(QMainWindow):
             # Tự động bắt đầu phát hiện
             self.start_detection()
         except Exception as e:
-            self.info_list.addItem(f"Lỗi khi chọn video: {str(e)}")
+            self.log.error(f"Lỗi khi chọn video: {str(e)}")
+
+    def load_video_index(self):
+        """Index tìm kiếm, chỉ đọc lại khi file index thay đổi"""
+        from config import VIDEO_INDEX
+        from video_index import VideoIndex
+
+        path = VIDEO_INDEX['path']
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if getattr(self, 'video_index', None) is None or mtime != self.video_index_mtime:
+            self.video_index = VideoIndex.load(path)
+            self.video_index_mtime = mtime
+        return self.video_index
+
+    def search_index(self):
+        """Tìm các đoạn video thỏa mãn biểu thức trong index"""
+        from video_index import format_range
+
+        expression = self.search_edit.text().strip()
+        if not expression:
+            self.search_results.setVisible(False)
+            return
+        try:
+            index = self.load_video_index()
+            results = index.query(expression)
+        except Exception as e:
+            self.log.error(f"Lỗi tìm kiếm: {str(e)}")
+            return
+
+        self.search_results.clear()
+        for video, fps, ranges in results:
+            for start, end in ranges:
+                item = QListWidgetItem(f"{os.path.basename(video)}  {format_range(start, end, fps)}")
+                item.setData(Qt.ItemDataRole.UserRole, (video, start))
+                self.search_results.addItem(item)
+        self.search_results.setVisible(True)
+        count = self.search_results.count()
+        self.log.info(f"Tìm thấy {count} đoạn trong {len(results)}/{len(index.videos)} video")
+
+    def on_search_result_selected(self, item):
+        """Mở video của kết quả (nếu chưa mở) và nhảy tới frame đầu đoạn"""
+        video, frame = item.data(Qt.ItemDataRole.UserRole)
+        if not os.path.exists(video):
+            self.log.error(f"Không tìm thấy video: {video}")
+            return
+
+        running = hasattr(self, 'detection_thread') and self.detection_thread.isRunning()
+        current = getattr(self, 'input_source', None)
+        if not running or current is None or os.path.normpath(current) != os.path.normpath(video):
+            if running:
+                self.detection_thread.stop()
+                self.detection_thread.wait()
+            self.input_source = video
+            self.load_video(video)
+            self.start_detection()
+
+        # Tua cả khi slider đã ở đúng vị trí (setValue khi đó không phát valueChanged)
+        self.video_slider.blockSignals(True)
+        self.video_slider.setValue(frame)
+        self.video_slider.blockSignals(False)
+        self.on_slider_changed(frame)
 
     def load_video(self, file_path):
         """Tải video và cập nhật slider"""
         try:
+            import cv2
+
             cap = cv2.VideoCapture(file_path)
             if not cap.isOpened():
-                self.info_list.addItem("Không thể mở file video!")
+                self.log.error("Không thể mở file video!")
                 return
 
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -488,11 +924,12 @@ class MainWindow(QMainWindow):
             self.video_slider.setValue(0)
             cap.release()
         except Exception as e:
-            self.info_list.addItem(f"Lỗi khi tải video: {str(e)}")
+            self.log.error(f"Lỗi khi tải video: {str(e)}")
 
     def on_slider_changed(self, value):
         """Xử lý khi kéo thanh slider"""
         if hasattr(self, 'detection_thread') and self.detection_thread.isRunning():
+            # Chỉ ghi nhận vị trí; worker gộp các lần kéo liên tiếp và tự tua
             self.detection_thread.set_frame_position(value)
 
     def play_video(self):
@@ -512,7 +949,7 @@ class MainWindow(QMainWindow):
         # Tạo thư mục nếu chưa tồn tại
         if not os.path.exists(video_dir):
             os.makedirs(video_dir)
-            self.info_list.addItem("Đã tạo thư mục videos")
+            self.log.info("Đã tạo thư mục videos")
             return
 
         # Lấy danh sách các file video
@@ -530,9 +967,9 @@ class MainWindow(QMainWindow):
             self.video_list.addItem(item)
 
         if video_files:
-            self.info_list.addItem(f"Đã tải {len(video_files)} video từ thư mục videos")
+            self.log.info(f"Đã tải {len(video_files)} video từ thư mục videos")
         else:
-            self.info_list.addItem("Không tìm thấy video trong thư mục videos")
+            self.log.error("Không tìm thấy video trong thư mục videos")
 
     def start_camera_detection(self):
         try:
@@ -540,28 +977,29 @@ class MainWindow(QMainWindow):
             if hasattr(self, 'detection_thread') and self.detection_thread.isRunning():
                 self.detection_thread.stop()
                 self.detection_thread.wait()
+            self.stop_multi_stream()
 
             selected_objects = [item.text().lower() for item in self.object_list.selectedItems()]
             if not selected_objects:
-                self.info_list.addItem("Vui lòng chọn ít nhất một đối tượng để phát hiện!")
+                self.log.warning("Vui lòng chọn ít nhất một đối tượng để phát hiện!")
                 return
 
             # Khởi tạo detector
             model = self.model_combo.currentText()
             if model not in YOLO_CONFIGS:
-                self.info_list.addItem("Model không hợp lệ!")
+                self.log.warning("Model không hợp lệ!")
                 return
 
-            config = YOLO_CONFIGS[model]
             try:
-                self.detector = YOLODetector(
-                    config['weights'],
-                    config['config'],
-                    config['conf_threshold'],
-                    config['nms_threshold']
-                )
+                from model_registry import registry
+                from detector import DetectionThread
+
+                # Dùng lại model đã nạp (hoặc đang nạp nền) thay vì đọc lại weights
+                if not registry.is_loaded(model):
+                    self.log.info(f"Đang nạp model {model}...")
+                self.detector = registry.get(model)
             except Exception as e:
-                self.info_list.addItem(f"Lỗi khởi tạo model: {str(e)}")
+                self.log.error(f"Lỗi khởi tạo model: {str(e)}")
                 return
 
             # Khởi tạo detection thread với nguồn là camera
@@ -570,14 +1008,95 @@ class MainWindow(QMainWindow):
                 "Camera",
                 selected_objects,
                 self.object_colors,
-                self.info_list
+                self.log,
+                model_name=model,
+                motion_gate=self.create_motion_gate(),
+                tracker=self.create_tracker(),
+                max_interval=TRACKER['max_interval'],
+                regions=self.display_label.regions,
+                tiling=TILING if self.tiling_check.isChecked() else None,
+                adaptive_resolution=ADAPTIVE_RESOLUTION if self.resolution_check.isChecked() else None,
+                display_size=(self.display_label.width(), self.display_label.height()),
+                stats_window=STATS['window'],
+                stats_refresh_hz=STATS['refresh_hz'],
+                pacing=self.pacing_mode(),
+                late_tolerance=PLAYBACK['late_tolerance'],
+                export=self.export_config()
             )
+            self.stats_model.clear()
+            timings.reset()
             self.detection_thread.update_frame.connect(self.update_display)
+            self.detection_thread.source_size.connect(self.on_source_size)
+            self.detection_thread.object_stats.connect(self.update_object_stats)
+            self.detection_thread.queue_stats.connect(self.update_pipeline_stats)
             self.detection_thread.start()
 
-            self.info_list.addItem("Bắt đầu nhận diện qua camera...")
+            self.log.info("Bắt đầu nhận diện qua camera...")
+        except Exception as e:
+            self.log.error(f"Lỗi khi khởi động camera: {str(e)}")
+
+    def start_multi_stream(self):
+        """Mở cửa sổ lưới cho nhiều nguồn, tất cả dùng chung một detector"""
+        from model_registry import registry
+        from multi_stream import MultiStreamWindow, parse_source
+
+        selected_objects = [item.text().lower() for item in self.object_list.selectedItems()]
+        if not selected_objects:
+            self.log.warning("Vui lòng chọn ít nhất một đối tượng để phát hiện!")
+            return
+
+        model = self.model_combo.currentText()
+        if model not in YOLO_CONFIGS:
+            self.log.warning("Model không hợp lệ!")
+            return
+
+        text, ok = QInputDialog.getMultiLineText(
+            self, "Multi-stream", 'Mỗi dòng một nguồn (camera, file, RTSP), thêm " @ fps" để giới hạn FPS:',
+            "\n".join(MULTI_STREAM['sources']))
+        if not ok:
+            return
+        sources = [parse_source(line, MULTI_STREAM['fps_cap']) for line in text.splitlines() if line.strip()]
+        if not sources:
+            self.log.warning("Vui lòng nhập ít nhất một nguồn!")
+            return
+
+        self.stop_detection()
+        self.stop_multi_stream()
+        try:
+            if not registry.is_loaded(model):
+                self.log.info(f"Đang nạp model {model}...")
+            detector = registry.get(model)
         except Exception as e:
-            self.info_list.addItem(f"Lỗi khi khởi động camera: {str(e)}")
+            self.log.error(f"Lỗi khởi tạo model: {str(e)}")
+            return
+
+        self.multi_stream_window = MultiStreamWindow(
+            detector,
+            sources,
+            selected_objects,
+            self.object_colors,
+            MULTI_STREAM['batch_size'],
+            MULTI_STREAM['loop_files'],
+            self.log
+        )
+        self.multi_stream_window.show()
+        self.multi_stream_window.start()
+        self.log.info(f"Bắt đầu multi-stream với {len(sources)} nguồn")
+
+    def stop_multi_stream(self):
+        if getattr(self, 'multi_stream_window', None) is not None:
+            self.multi_stream_window.stop()
+            self.multi_stream_window.close()
+            self.multi_stream_window = None
+
+    def closeEvent(self, event):
+        """Dừng detection và ghi nốt dữ liệu store trước khi thoát"""
+        self.stop_detection()
+        self.stop_multi_stream()
+        if self.detection_store is not None:
+            self.detection_store.close()
+        self.log.close()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+import os
+import threading
+from collections import OrderedDict
+
+from config import YOLO_CONFIGS
+from yolo import YOLODetector
+
+
+def model_input_size(model_name, input_size=None):
+    """Kích thước input (width, height): lấy từ YOLO_CONFIGS nếu không chỉ định"""
+    if input_size is None:
+        input_size = YOLO_CONFIGS[model_name].get('input_size', 416)
+    if isinstance(input_size, int):
+        return input_size, input_size
+    return tuple(input_size)
+
+
+def create_detector(model_name, backend="auto", input_size=None, batch_size=None):
+    """Khởi tạo YOLODetector theo tên model trong YOLO_CONFIGS"""
+    config = YOLO_CONFIGS[model_name]
+    return YOLODetector(
+        config['weights'],
+        config['config'],
+        config['conf_threshold'],
+        config['nms_threshold'],
+        batch_size or config.get('batch_size', 1),
+        backend=backend,
+        input_size=model_input_size(model_name, input_size),
+        engine=config.get('engine')
+    )
+
+
+class ModelRegistry:
+    """Cache các model đã nạp theo (model, backend, kích thước input), loại bỏ theo LRU"""
+
+    def __init__(self, max_models=2, max_bytes=1024 ** 3, warmup=True):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.warmup = warmup
+        self.models = OrderedDict()  # key -> (detector, số byte weights)
+        self.loading = {}  # key -> threading.Event của lần nạp đang chạy
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_name, backend="auto", input_size=None):
+        return model_name, backend, model_input_size(model_name, input_size)
+
+    def get(self, model_name, backend="auto", input_size=None):
+        """Trả về detector đã nạp, nạp mới nếu chưa có (chờ nếu thread khác đang nạp)"""
+        key = self.make_key(model_name, backend, input_size)
+        while True:
+            with self.lock:
+                if key in self.models:
+                    self.models.move_to_end(key)
+                    self.hits += 1
+                    return self.models[key][0]
+
+                event = self.loading.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self.loading[key] = event
+                    break
+
+            # Thread khác đang nạp cùng model: chờ rồi kiểm tra lại cache
+            event.wait()
+
+        try:
+            detector = create_detector(model_name, backend, input_size)
+            if self.warmup:
+                detector.warmup()
+        except Exception:
+            with self.lock:
+                del self.loading[key]
+            event.set()
+            raise
+
+        engine = YOLO_CONFIGS[model_name].get('engine') or {}
+        size = os.path.getsize(engine.get('model') or YOLO_CONFIGS[model_name]['weights'])
+        with self.lock:
+            self.misses += 1
+            self.models[key] = (detector, size)
+            del self.loading[key]
+            self.evict()
+        event.set()
+        return detector
+
+    def evict(self):
+        """Bỏ model ít dùng nhất khi vượt quá số lượng hoặc dung lượng cho phép"""
+        # Luôn giữ lại model vừa dùng gần nhất
+        while len(self.models) > 1 and (len(self.models) > self.max_models or self.total_bytes() > self.max_bytes):
+            key, _ = self.models.popitem(last=False)
+            print(f"Giải phóng model {key[0]} khỏi bộ nhớ")
+
+    def total_bytes(self):
+        return sum(size for _, size in self.models.values())
+
+    def is_loaded(self, model_name, backend="auto", input_size=None):
+        with self.lock:
+            return self.make_key(model_name, backend, input_size) in self.models
+
+    def preload(self, model_name, backend="auto", input_size=None, callback=None):
+        """Nạp và warm-up model trong thread nền; callback(model_name, error) khi xong"""
+        def load():
+            error = None
+            try:
+                self.get(model_name, backend, input_size)
+            except Exception as e:
+                error = str(e)
+            if callback is not None:
+                callback(model_name, error)
+
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        return thread
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+
+
+# Registry dùng chung cho toàn process
+registry = ModelRegistry()
@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Chỉ cho chạy mạng khi khung hình thay đổi so với frame đã detect gần nhất"""
+
+    def __init__(self, sensitivity=0.01, pixel_threshold=25, max_reuse=30, width=160):
+        self.sensitivity = sensitivity  # Tỉ lệ pixel thay đổi tối thiểu để coi là có chuyển động
+        self.pixel_threshold = pixel_threshold  # Chênh lệch độ sáng để coi một pixel là thay đổi
+        self.max_reuse = max_reuse  # Số frame tối đa được dùng lại detections cũ
+        self.width = width
+        self.reference = None
+        self.reused = 0
+        self.inferences = 0
+        self.skipped = 0
+
+    def prepare(self, frame):
+        """Thu nhỏ, chuyển xám và làm mờ để so sánh nhanh, ít nhiễu"""
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, int(height * self.width / width))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, frame):
+        """True nếu cần chạy mạng cho frame này, False nếu có thể dùng lại detections trước"""
+        small = self.prepare(frame)
+        if self.reference is not None and self.reused < self.max_reuse and small.shape == self.reference.shape:
+            diff = cv2.absdiff(small, self.reference)
+            changed = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+            if changed < self.sensitivity:
+                self.reused += 1
+                self.skipped += 1
+                return False
+
+        # So sánh các frame sau với frame được detect (chuyển động chậm vẫn được cộng dồn)
+        self.reference = small
+        self.reused = 0
+        self.inferences += 1
+        return True
+
+    def reset(self):
+        """Bắt buộc detect lại ở frame tiếp theo (ví dụ sau khi tua)"""
+        self.reference = None
+        self.reused = 0
+
+    def stats(self):
+        return {"gate_inferences": self.inferences, "gate_skipped": self.skipped}
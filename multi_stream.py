@@ -0,0 +1,333 @@
+"""Nhiều nguồn (camera, file, RTSP) dùng chung một mạng: gom frame theo lượt vào một batch
+
+Chạy riêng để thử với file thay cho camera:
+    python multi_stream.py videos/a.mp4 "videos/b.mp4 @ 5" 0 --model YOLOv3 --classes person car
+"""
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+
+import cv2
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap, QFont
+from PyQt6.QtWidgets import QApplication, QWidget, QGridLayout, QLabel, QVBoxLayout, QSizePolicy
+
+from config import YOLO_CONFIGS, CLASSES, MULTI_STREAM
+from detection_log import DetectionLog
+from pipeline import FrameQueue
+from timing import timings
+from utils import draw_detections
+
+
+def parse_source(text, default_fps=None):
+    """"nguồn @ fps" -> (nguồn, giới hạn FPS); số nguyên là chỉ số camera"""
+    source, fps_cap = text.strip(), default_fps
+    if "@" in source:
+        head, tail = source.rsplit("@", 1)
+        try:
+            # RTSP có thể chứa user@host: chỉ coi là FPS khi phần sau @ là số
+            source, fps_cap = head.strip(), float(tail)
+        except ValueError:
+            pass
+    return source, fps_cap
+
+
+class StreamReader(threading.Thread):
+    """Đọc frame từ một nguồn trong thread riêng, chỉ giữ frame mới nhất
+
+    File được phát theo FPS gốc và lặp lại khi hết (dùng thay camera khi thử nghiệm);
+    camera/RTSP mất kết nối thì tự kết nối lại.
+    """
+
+    def __init__(self, stream_id, source, fps_cap=None, loop=True):
+        super().__init__(daemon=True)
+        self.stream_id = stream_id
+        self.source = source
+        self.fps_cap = fps_cap
+        self.loop = loop
+        self.is_file = os.path.isfile(source)
+        self.queue = FrameQueue(1, FrameQueue.DROP_OLDEST)
+        self.running = True
+        self.connected = False
+        self.frames_read = 0
+        self.size = (0, 0)
+
+    def open(self):
+        if self.source.isdigit():
+            return cv2.VideoCapture(int(self.source))
+        return cv2.VideoCapture(self.source, cv2.CAP_FFMPEG)
+
+    def run(self):
+        while self.running:
+            cap = self.open()
+            if not cap.isOpened():
+                self.connected = False
+                cap.release()
+                time.sleep(1.0)  # Thử kết nối lại
+                continue
+
+            self.connected = True
+            self.size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_time = 1.0 / fps if self.is_file and fps > 0 else 0
+            next_frame = time.monotonic()
+            try:
+                while self.running:
+                    ret, frame = cap.read()
+                    if not ret:
+                        if self.is_file and self.loop:
+                            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                            continue
+                        break
+                    self.frames_read += 1
+                    self.queue.put(frame)
+
+                    # File: giữ nhịp như nguồn trực tiếp
+                    if frame_time:
+                        next_frame += frame_time
+                        delay = next_frame - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                        else:
+                            next_frame = time.monotonic()
+            finally:
+                cap.release()
+                self.connected = False
+
+            if self.is_file and not self.loop:
+                break
+        self.queue.close()
+
+    def stop(self):
+        self.running = False
+        self.queue.close()
+
+
+class InferenceScheduler:
+    """Gom frame mới nhất của các stream vào một batch theo vòng tròn (round-robin)
+
+    Mỗi vòng bắt đầu từ stream ngay sau stream được phục vụ cuối cùng nên khi batch nhỏ hơn
+    số stream, các stream vẫn được chia lượt đều; giới hạn FPS của từng stream được tôn trọng.
+    """
+
+    def __init__(self, detector, readers, target_objects, batch_size=4):
+        self.detector = detector
+        self.readers = readers
+        self.target_objects = target_objects
+        self.batch_size = max(1, batch_size)
+        self.start = 0
+        self.next_due = {reader.stream_id: 0.0 for reader in readers}
+        self.processed = {reader.stream_id: 0 for reader in readers}
+
+    def next_batch(self):
+        """List (reader, frame) lấy theo lượt, tối đa batch_size frame, mỗi stream tối đa một frame"""
+        now = time.monotonic()
+        count = len(self.readers)
+        batch = []
+        last_served = None
+        for k in range(count):
+            if len(batch) >= self.batch_size:
+                break
+            index = (self.start + k) % count
+            reader = self.readers[index]
+            if now < self.next_due[reader.stream_id]:
+                continue
+            frame = reader.queue.get(timeout=0)
+            if frame is None:
+                continue
+            batch.append((reader, frame))
+            last_served = index
+            if reader.fps_cap:
+                interval = 1.0 / reader.fps_cap
+                # Không cộng dồn nợ khi stream bị trễ lâu
+                self.next_due[reader.stream_id] = max(self.next_due[reader.stream_id] + interval, now)
+
+        if last_served is not None:
+            self.start = (last_served + 1) % count
+        return batch
+
+    def step(self):
+        """Chạy mạng một lần cho batch hiện tại; trả về list (stream_id, frame, detections)"""
+        batch = self.next_batch()
+        if not batch:
+            return []
+        frames = [frame for _, frame in batch]
+        results = self.detector.detect_batch(frames, self.target_objects)
+        for reader, _ in batch:
+            self.processed[reader.stream_id] += 1
+        return [(reader.stream_id, frame, detections) for (reader, frame), detections in zip(batch, results)]
+
+
+class MultiStreamThread(QThread):
+    frame_ready = pyqtSignal(int, QImage, int)  # stream_id, ảnh đã vẽ, số đối tượng
+    stream_stats = pyqtSignal(list)  # (stream_id, nguồn, đã kết nối, FPS đọc, FPS xử lý)
+
+    def __init__(self, detector, sources, target_objects, object_colors, batch_size=4, loop_files=True,
+                 log=None):
+        super().__init__()
+        self.detector = detector
+        self.log = log if log is not None else DetectionLog(echo=True)
+        self.readers = [StreamReader(i, source, fps_cap, loop_files) for i, (source, fps_cap) in enumerate(sources)]
+        self.scheduler = InferenceScheduler(detector, self.readers, target_objects, batch_size)
+        self.object_colors = object_colors
+        self.tile_size = None
+        self.running = True
+
+    def set_tile_size(self, width, height):
+        self.tile_size = (width, height) if width > 0 and height > 0 else None
+
+    def render_image(self, frame, detections):
+        with timings.measure("draw"):
+            frame = draw_detections(frame, detections, self.object_colors, display_size=self.tile_size)
+        with timings.measure("convert"):
+            height, width = frame.shape[:2]
+            return QImage(frame.data, width, height, frame.strides[0], QImage.Format.Format_BGR888).copy()
+
+    def collect_stats(self, elapsed, last_read, last_processed):
+        rows = []
+        for reader in self.readers:
+            read = reader.frames_read - last_read.get(reader.stream_id, 0)
+            processed = self.scheduler.processed[reader.stream_id] - last_processed.get(reader.stream_id, 0)
+            rows.append((reader.stream_id, reader.source, reader.connected, read / elapsed, processed / elapsed))
+        return rows
+
+    def run(self):
+        for reader in self.readers:
+            reader.start()
+
+        last_stats = time.monotonic()
+        last_read = {}
+        last_processed = {}
+        try:
+            while self.running:
+                results = self.scheduler.step()
+                if not results:
+                    self.msleep(5)
+                for stream_id, frame, detections in results:
+                    self.frame_ready.emit(stream_id, self.render_image(frame, detections), len(detections))
+
+                now = time.monotonic()
+                if now - last_stats >= 1.0:
+                    self.stream_stats.emit(self.collect_stats(now - last_stats, last_read, last_processed))
+                    last_stats = now
+                    last_read = {reader.stream_id: reader.frames_read for reader in self.readers}
+                    last_processed = dict(self.scheduler.processed)
+        except Exception as e:
+            self.log.error(f"Lỗi trong multi-stream: {str(e)}")
+        finally:
+            for reader in self.readers:
+                reader.stop()
+
+    def stop(self):
+        self.running = False
+        for reader in self.readers:
+            reader.stop()
+
+
+class MultiStreamWindow(QWidget):
+    """Lưới hiển thị kết quả của từng stream"""
+
+    def __init__(self, detector, sources, target_objects, object_colors, batch_size=4, loop_files=True,
+                 log=None):
+        super().__init__()
+        self.setWindowTitle("Multi-stream Detection")
+        self.resize(1280, 800)
+        self.setStyleSheet("QWidget { background-color: #1e1e1e; color: #dddddd; }")
+
+        columns = max(1, math.ceil(math.sqrt(len(sources))))
+        grid = QGridLayout()
+        self.tiles = []
+        self.titles = []
+        for i, (source, fps_cap) in enumerate(sources):
+            title = QLabel(f"[{i}] {source}")
+            title.setFont(QFont("Arial", 10))
+            tile = QLabel("Đang kết nối...")
+            tile.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            tile.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
+            tile.setMinimumSize(160, 120)
+
+            cell = QVBoxLayout()
+            cell.addWidget(title)
+            cell.addWidget(tile, 1)
+            grid.addLayout(cell, i // columns, i % columns)
+            self.tiles.append(tile)
+            self.titles.append(title)
+
+        self.stats_label = QLabel()
+        self.stats_label.setStyleSheet("QLabel { color: #aaaaaa; font-size: 11px; }")
+        layout = QVBoxLayout()
+        layout.addLayout(grid, 1)
+        layout.addWidget(self.stats_label)
+        self.setLayout(layout)
+
+        self.thread = MultiStreamThread(detector, sources, target_objects, object_colors, batch_size, loop_files, log)
+        self.thread.frame_ready.connect(self.update_tile)
+        self.thread.stream_stats.connect(self.update_stats)
+
+    def start(self):
+        self.resize_tiles()
+        self.thread.start()
+
+    def resize_tiles(self):
+        if self.tiles:
+            self.thread.set_tile_size(self.tiles[0].width(), self.tiles[0].height())
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resize_tiles()
+
+    def update_tile(self, stream_id, image, count):
+        with timings.measure("paint"):
+            self.tiles[stream_id].setPixmap(QPixmap.fromImage(image))
+
+    def update_stats(self, rows):
+        parts = []
+        for stream_id, source, connected, read_fps, processed_fps in rows:
+            state = "" if connected else " (mất kết nối)"
+            parts.append(f"[{stream_id}] đọc {read_fps:.1f} / xử lý {processed_fps:.1f} FPS{state}")
+            self.titles[stream_id].setText(f"[{stream_id}] {source}{state}")
+        self.stats_label.setText(" | ".join(parts))
+
+    def stop(self):
+        if self.thread.isRunning():
+            self.thread.stop()
+            self.thread.wait()
+
+    def closeEvent(self, event):
+        self.stop()
+        super().closeEvent(event)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Phát hiện đối tượng trên nhiều nguồn cùng lúc")
+    parser.add_argument("sources", nargs="*", default=MULTI_STREAM['sources'],
+                        help='Chỉ số camera, file hoặc URL RTSP; thêm " @ fps" để giới hạn FPS')
+    parser.add_argument("--model", default="YOLOv3", choices=list(YOLO_CONFIGS.keys()))
+    parser.add_argument("--classes", nargs="+", default=None)
+    parser.add_argument("--batch-size", type=int, default=MULTI_STREAM['batch_size'])
+    parser.add_argument("--fps-cap", type=float, default=MULTI_STREAM['fps_cap'])
+    parser.add_argument("--no-loop", action="store_true", help="Không lặp lại file khi phát hết")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from model_registry import registry
+
+    args = parse_args(argv)
+    target_objects = [name.lower() for name in args.classes] if args.classes else list(CLASSES)
+    sources = [parse_source(text, args.fps_cap) for text in args.sources]
+    colors = {name: {'rgb': (0, 255, 0)} for name in CLASSES}
+
+    app = QApplication(sys.argv)
+    window = MultiStreamWindow(registry.get(args.model), sources, target_objects, colors,
+                               args.batch_size, not args.no_loop)
+    window.show()
+    window.start()
+    return app.exec()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import deque
+
+
+class ObjectStats:
+    """Đếm đối tượng theo lớp trong worker: số hiện tại, trung bình trượt và số lớn nhất"""
+
+    def __init__(self, target_objects, window=30, refresh_hz=5):
+        self.classes = list(target_objects)
+        self.index = {name: i for i, name in enumerate(self.classes)}
+        self.window = deque(maxlen=max(1, window))  # Số đếm của các frame gần nhất
+        self.totals = [0] * len(self.classes)  # Tổng trong cửa sổ, cập nhật tăng dần
+        self.counts = [0] * len(self.classes)
+        self.peaks = [0] * len(self.classes)
+        self.interval = 1.0 / refresh_hz if refresh_hz > 0 else 0
+        self.last_emit = 0.0
+        # Render thread và decoder thread (khi tua) cùng gọi update/snapshot
+        self.lock = threading.Lock()
+
+    def update(self, detections):
+        """Cập nhật với detections của một frame"""
+        with self.lock:
+            counts = [0] * len(self.classes)
+            for class_name, _, _ in detections:
+                i = self.index.get(class_name)
+                if i is not None:
+                    counts[i] += 1
+
+            # Trừ frame sắp rơi khỏi cửa sổ, cộng frame mới
+            if len(self.window) == self.window.maxlen:
+                for i, count in enumerate(self.window[0]):
+                    self.totals[i] -= count
+            self.window.append(counts)
+            for i, count in enumerate(counts):
+                self.totals[i] += count
+                if count > self.peaks[i]:
+                    self.peaks[i] = count
+            self.counts = counts
+
+    def due(self):
+        """True nếu đã tới lúc gửi số liệu lên giao diện (giới hạn tần suất làm mới)"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_emit < self.interval:
+                return False
+            self.last_emit = now
+            return True
+
+    def snapshot(self, unique_counts=None):
+        """List (class_name, số hiện tại, trung bình trượt, lớn nhất, số đối tượng khác nhau hoặc None)"""
+        with self.lock:
+            frames = max(1, len(self.window))
+            return [
+                (name, self.counts[i], self.totals[i] / frames, self.peaks[i],
+                 unique_counts.get(name, 0) if unique_counts is not None else None)
+                for i, name in enumerate(self.classes)
+            ]
@@ -0,0 +1,88 @@
+import threading
+import time
+
+
+class FramePacer:
+    """Đồng bộ hiển thị theo timestamp của nguồn thay vì ngủ một khoảng cố định sau mỗi frame
+
+    REALTIME: mỗi frame có hạn chót = mốc thời gian thực + (pts - pts mốc); frame trễ quá
+    late_tolerance bị bỏ để theo kịp đồng hồ. MAX_THROUGHPUT: không ngủ, xử lý nhanh nhất có thể.
+    """
+
+    REALTIME = "realtime"
+    MAX_THROUGHPUT = "max"
+
+    def __init__(self, fps, mode=REALTIME, late_tolerance=2.0):
+        self.fps = fps if fps > 0 else 30
+        self.mode = mode
+        self.late_tolerance = late_tolerance / self.fps  # Số frame -> giây
+        self.anchor = None  # (thời điểm thực, pts) của frame mốc
+        self.lock = threading.Lock()
+        self.presented = 0
+        self.dropped = 0
+        self.last_stats = (time.monotonic(), 0, 0)
+
+    @property
+    def realtime(self):
+        return self.mode == self.REALTIME
+
+    def set_mode(self, mode):
+        self.mode = mode
+        self.reset()
+
+    def reset(self):
+        """Bỏ mốc thời gian (sau khi tua, tạm dừng hoặc đổi chế độ); frame tiếp theo làm mốc mới"""
+        with self.lock:
+            self.anchor = None
+
+    def pts(self, position):
+        return position / self.fps
+
+    def deadline(self, position):
+        """Thời điểm (monotonic) frame cần được hiển thị, None nếu chưa có mốc"""
+        with self.lock:
+            if self.anchor is None:
+                return None
+            anchor_time, anchor_pts = self.anchor
+        return anchor_time + self.pts(position) - anchor_pts
+
+    def is_late(self, position):
+        """True nếu frame đã trễ quá late_tolerance so với hạn chót (chỉ ở chế độ REALTIME)"""
+        if not self.realtime:
+            return False
+        deadline = self.deadline(position)
+        return deadline is not None and time.monotonic() > deadline + self.late_tolerance
+
+    def delay(self, position):
+        """Số giây cần chờ trước khi hiển thị frame; frame đầu tiên sau reset làm mốc"""
+        if not self.realtime:
+            return 0.0
+        now = time.monotonic()
+        with self.lock:
+            if self.anchor is None:
+                self.anchor = (now, self.pts(position))
+                return 0.0
+            anchor_time, anchor_pts = self.anchor
+        return max(0.0, anchor_time + self.pts(position) - anchor_pts - now)
+
+    def frame_presented(self):
+        with self.lock:
+            self.presented += 1
+
+    def frame_dropped(self, count=1):
+        # Được gọi từ cả decoder, inference và render thread
+        with self.lock:
+            self.dropped += count
+
+    def stats(self):
+        """FPS hiển thị và số frame bị bỏ mỗi giây kể từ lần gọi trước"""
+        now = time.monotonic()
+        last_time, last_presented, last_dropped = self.last_stats
+        elapsed = max(now - last_time, 1e-6)
+        self.last_stats = (now, self.presented, self.dropped)
+        return {
+            "pacing": self.mode,
+            "fps": (self.presented - last_presented) / elapsed,
+            "drop_fps": (self.dropped - last_dropped) / elapsed,
+            "frames_dropped": self.dropped
+        }
@@ -0,0 +1,68 @@
+import threading
+from collections import deque
+
+
+class FrameQueue:
+    """Hàng đợi frame có giới hạn dùng để nối các stage của pipeline"""
+
+    BLOCK = "block"  # Chặn stage phía trước khi đầy (video file, không mất frame)
+    DROP_OLDEST = "drop_oldest"  # Bỏ frame cũ nhất khi đầy (camera/nguồn trực tiếp)
+
+    def __init__(self, maxsize=8, policy=BLOCK):
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item, timeout=None):
+        """Thêm item, trả về False nếu hết thời gian chờ hoặc hàng đợi đã đóng"""
+        with self.cond:
+            if self.policy == self.DROP_OLDEST:
+                while len(self.items) >= self.maxsize:
+                    self.items.popleft()
+                    self.dropped += 1
+            elif not self.cond.wait_for(lambda: self.closed or len(self.items) < self.maxsize, timeout):
+                return False
+
+            if self.closed:
+                return False
+
+            self.items.append(item)
+            self.cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Lấy item, trả về None nếu hết thời gian chờ hoặc hàng đợi đã đóng và rỗng"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.closed or self.items, timeout):
+                return None
+            if not self.items:
+                return None
+
+            item = self.items.popleft()
+            self.cond.notify_all()
+            return item
+
+    def clear(self):
+        """Xóa toàn bộ item đang chờ (dùng khi tua video)"""
+        with self.cond:
+            self.items.clear()
+            self.cond.notify_all()
+
+    def close(self):
+        """Đóng hàng đợi: không nhận thêm item, đánh thức các stage đang chờ"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    @property
+    def finished(self):
+        """Hàng đợi đã đóng và không còn item nào"""
+        with self.cond:
+            return self.closed and not self.items
+
+    def depth(self):
+        with self.cond:
+            return len(self.items)
@@ -0,0 +1,88 @@
+import time
+
+
+class AdaptiveResolution:
+    """Chọn kích thước input (và model) theo độ trễ forward đo được để đạt FPS mục tiêu
+
+    levels: list (model_name, size) xếp từ nhẹ nhất tới nặng nhất. Dùng hysteresis
+    (ngưỡng lên/xuống khác nhau, số lần đo liên tiếp, thời gian chờ) để không đổi qua lại liên tục.
+    """
+
+    def __init__(self, levels, start_level, target_fps, patience=5, cooldown=2.0,
+                 upper=1.0, lower=0.6, smoothing=0.3):
+        self.levels = levels
+        self.level = start_level
+        self.target_fps = target_fps
+        self.patience = patience
+        self.cooldown = cooldown
+        self.upper = upper  # Chậm hơn upper * ngân sách: giảm kích thước
+        self.lower = lower  # Nhanh hơn lower * ngân sách (và dự đoán vẫn kịp): tăng kích thước
+        self.smoothing = smoothing
+        self.latency = None
+        self.slow_count = 0
+        self.fast_count = 0
+        self.changed_at = time.monotonic()
+        self.changes = 0
+
+    @classmethod
+    def from_config(cls, model_name, current_size, sizes, target_fps, models=None, **kwargs):
+        """Dựng các mức từ danh sách kích thước (và model nếu cho phép đổi model), bắt đầu ở mức gần nhất"""
+        models = models or [model_name]
+        if model_name not in models:
+            models = [model_name] + list(models)
+        levels = [(model, size) for model in models for size in sorted(sizes)]
+        start_size = min(sizes, key=lambda size: abs(size - current_size))
+        return cls(levels, levels.index((model_name, start_size)), target_fps, **kwargs)
+
+    @property
+    def current(self):
+        return self.levels[self.level]
+
+    @property
+    def budget(self):
+        return 1.0 / self.target_fps
+
+    def report(self, seconds):
+        """Ghi nhận độ trễ inference của một frame; trả về mức mới (model, size) nếu cần đổi"""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = (1 - self.smoothing) * self.latency + self.smoothing * seconds
+
+        if self.latency > self.budget * self.upper:
+            self.slow_count += 1
+            self.fast_count = 0
+        elif self.latency < self.budget * self.lower and self.fits_next_level():
+            self.fast_count += 1
+            self.slow_count = 0
+        else:
+            self.slow_count = 0
+            self.fast_count = 0
+
+        if time.monotonic() - self.changed_at < self.cooldown:
+            return None
+
+        if self.slow_count >= self.patience and self.level > 0:
+            return self.move(-1)
+        if self.fast_count >= self.patience and self.level < len(self.levels) - 1:
+            return self.move(1)
+        return None
+
+    def fits_next_level(self):
+        """Dự đoán độ trễ ở mức tiếp theo (tỉ lệ với số pixel) vẫn nằm trong ngân sách"""
+        if self.level >= len(self.levels) - 1:
+            return False
+        model, size = self.levels[self.level]
+        next_model, next_size = self.levels[self.level + 1]
+        if next_model != model:
+            return False  # Không ước lượng được độ trễ của model khác: chỉ đổi khi chậm
+        return self.latency * (next_size / size) ** 2 < self.budget * self.upper
+
+    def move(self, step):
+        self.level += step
+        self.slow_count = 0
+        self.fast_count = 0
+        self.latency = None  # Đo lại từ đầu ở mức mới
+        self.changed_at = time.monotonic()
+        self.changes += 1
+        return self.current
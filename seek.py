@@ -0,0 +1,116 @@
+import bisect
+import shutil
+import subprocess
+import threading
+import time
+
+import cv2
+
+
+class KeyframeIndex:
+    """Danh sách chỉ số frame của các keyframe, đọc bằng ffprobe (nếu có)"""
+
+    def __init__(self, keyframes=None):
+        self.keyframes = sorted(keyframes or [])
+
+    @classmethod
+    def build(cls, video_path, fps, timeout=60):
+        """Đọc cờ keyframe của các packet video; trả về index rỗng nếu không có ffprobe"""
+        ffprobe = shutil.which("ffprobe")
+        if ffprobe is None or fps <= 0:
+            return cls()
+
+        command = [
+            ffprobe, "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags",
+            "-of", "csv=p=0",
+            video_path
+        ]
+        try:
+            output = subprocess.run(command, capture_output=True, text=True, timeout=timeout, check=True).stdout
+        except (subprocess.SubprocessError, OSError):
+            return cls()
+
+        keyframes = []
+        for line in output.splitlines():
+            pts_time, _, flags = line.partition(",")
+            if "K" in flags and pts_time not in ("", "N/A"):
+                keyframes.append(int(round(float(pts_time) * fps)))
+        return cls(keyframes)
+
+    def __bool__(self):
+        return bool(self.keyframes)
+
+    def keyframe_before(self, frame_number):
+        """Keyframe gần nhất có chỉ số <= frame_number"""
+        i = bisect.bisect_right(self.keyframes, frame_number)
+        return self.keyframes[i - 1] if i > 0 else 0
+
+
+def seek_capture(cap, target, keyframes=None, max_forward=30):
+    """Đưa cap tới frame target với ít frame phải giải mã nhất, trả về số frame đã bỏ qua"""
+    current = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    distance = target - current
+
+    if keyframes:
+        # Không có keyframe nào giữa vị trí hiện tại và target: đọc tiếp rẻ hơn seek lại
+        forward = 0 <= distance and keyframes.keyframe_before(target) <= current
+    else:
+        forward = 0 <= distance <= max_forward
+
+    if not forward:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        return 0
+
+    for _ in range(distance):
+        if not cap.grab():
+            break
+    return distance
+
+
+class SeekScheduler:
+    """Gộp các yêu cầu tua liên tiếp thành một, phục vụ preview trước rồi mới detect đầy đủ"""
+
+    PREVIEW = "preview"  # Hiển thị nhanh: frame từ cache hoặc chỉ giải mã, không chạy mạng
+    WAIT = "wait"  # Đã preview, chờ slider dừng hẳn
+    FINAL = "final"  # Slider đã dừng: chạy detection đầy đủ
+
+    def __init__(self, settle_time=0.25):
+        self.settle_time = settle_time
+        self.lock = threading.Lock()
+        self.target = None
+        self.requested_at = 0.0
+        self.previewed = None
+        self.requests = 0
+        self.served = 0
+
+    def request(self, frame_number):
+        """Gọi từ thread giao diện: chỉ ghi nhận vị trí mới nhất, không chặn"""
+        with self.lock:
+            self.target = frame_number
+            self.requested_at = time.monotonic()
+            self.requests += 1
+
+    def poll(self):
+        """Gọi từ worker: trả về (trạng thái, frame) hoặc (None, None) nếu không có yêu cầu tua"""
+        with self.lock:
+            if self.target is None:
+                return None, None
+
+            target = self.target
+            if time.monotonic() - self.requested_at >= self.settle_time:
+                self.target = None
+                self.previewed = None
+                self.served += 1
+                return self.FINAL, target
+
+            if self.previewed != target:
+                self.previewed = target
+                return self.PREVIEW, target
+
+            return self.WAIT, target
+
+    def stats(self):
+        with self.lock:
+            return {"seek_requests": self.requests, "seek_served": self.served}
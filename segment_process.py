@@ -0,0 +1,185 @@
+"""Xử lý một video dài song song theo đoạn rồi ghép kết quả về một dòng thời gian
+
+Video được cắt theo keyframe (split_video), mỗi đoạn là một job của batch_process chạy trên
+một process riêng; sau đó kết quả từng đoạn được ghép lại với số frame và timestamp toàn cục.
+
+Ví dụ:
+    python segment_process.py recording.mp4 --model YOLOv3 --classes person car --workers 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from batch_process import OUTPUT_FORMATS, init_worker, output_path_for, run_job
+from config import YOLO_CONFIGS, CLASSES, VIDEO_INDEX
+from split_video import split_video
+
+
+def read_jsonl(path):
+    """List các record frame (bỏ dòng meta đầu tiên)"""
+    with open(path, "r", encoding="utf-8") as f:
+        next(f)
+        return [json.loads(line) for line in f]
+
+
+def stitch_jsonl(parts, output_path, meta):
+    """Ghép các file jsonl theo thứ tự đoạn; trả về tổng số frame"""
+    offset = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        out.write(json.dumps(meta, ensure_ascii=False) + "\n")
+        for segment, path in parts:
+            records = read_jsonl(path)
+            for record in records:
+                record["frame"] += offset
+                record["time"] = round(segment.start_time * 1000.0 + record["time"], 3)
+                out.write(json.dumps(record) + "\n")
+            offset += len(records)
+    return offset
+
+
+def stitch_npz(parts, output_path, meta):
+    """Ghép các file npz theo thứ tự đoạn; trả về tổng số frame"""
+    arrays = {"frame": [], "class_id": [], "confidence": [], "box": [], "frame_time": []}
+    offset = 0
+    for segment, path in parts:
+        with np.load(path) as data:
+            arrays["frame"].append(data["frame"] + offset)
+            arrays["class_id"].append(data["class_id"])
+            arrays["confidence"].append(data["confidence"])
+            arrays["box"].append(data["box"].reshape(-1, 4))
+            arrays["frame_time"].append(segment.start_time * 1000.0 + data["frame_time"])
+            offset += len(data["frame_time"])
+
+    with open(output_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            frame=np.concatenate(arrays["frame"]).astype(np.int32),
+            class_id=np.concatenate(arrays["class_id"]).astype(np.int16),
+            confidence=np.concatenate(arrays["confidence"]).astype(np.float32),
+            box=np.concatenate(arrays["box"]).astype(np.int32).reshape(-1, 4),
+            frame_time=np.concatenate(arrays["frame_time"]).astype(np.float64),
+            meta=np.array(json.dumps(meta, ensure_ascii=False))
+        )
+    return offset
+
+
+STITCHERS = {'jsonl': stitch_jsonl, 'npz': stitch_npz}
+
+
+def read_meta(path, output_format):
+    """Meta ghi ở đầu file kết quả của một đoạn (model, ngưỡng, danh sách lớp...)"""
+    if output_format == "npz":
+        with np.load(path) as data:
+            return json.loads(str(data["meta"]))
+    with open(path, "r", encoding="utf-8") as f:
+        return json.loads(f.readline())
+
+
+def process_segmented(video_path, output_path, model_name, target_objects, output_format="jsonl",
+                      segment_time=60, workers=None, threads=None, batch_size=None, work_dir=None,
+                      keep_segments=False):
+    """Cắt video, chạy detection các đoạn song song rồi ghép kết quả; trả về dict thống kê"""
+    workers = max(1, workers or (os.cpu_count() or 1))
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    work_dir = work_dir or os.path.join("cache", "segments", name)
+
+    started = time.monotonic()
+    segments = split_video(video_path, work_dir, segment_time)
+    split_seconds = time.monotonic() - started
+    print(f"Đã cắt {video_path} thành {len(segments)} đoạn trong {split_seconds:.1f}s")
+
+    jobs = [(segment.path, output_path_for(segment.path, work_dir, output_format), output_format)
+            for segment in segments]
+    initargs = (model_name, target_objects, batch_size, threads)
+
+    failed = []
+    with multiprocessing.Pool(min(workers, len(jobs)), initializer=init_worker, initargs=initargs) as pool:
+        for done, result in enumerate(pool.imap_unordered(run_job, jobs), 1):
+            if "error" in result:
+                failed.append(result)
+                print(f"[{done}/{len(jobs)}] LỖI {result['video']}: {result['error']}")
+            else:
+                print(f"[{done}/{len(jobs)}] {result['video']}: {result['frames']} frame")
+            sys.stdout.flush()
+    if failed:
+        raise RuntimeError(f"{len(failed)} đoạn xử lý lỗi, giữ lại các đoạn trong {work_dir}")
+
+    # Meta lấy từ đoạn đầu (model, ngưỡng, lớp), thông tin video lấy từ file gốc
+    meta = read_meta(jobs[0][1], output_format)
+    cap = cv2.VideoCapture(video_path)
+    meta["video"] = video_path
+    meta["fps"] = cap.get(cv2.CAP_PROP_FPS)
+    meta["frame_count"] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    meta["segments"] = [{"start_time": segment.start_time, "end_time": segment.end_time} for segment in segments]
+
+    temp_path = output_path + ".part"
+    parts = [(segment, job[1]) for segment, job in zip(segments, jobs)]
+    frames = STITCHERS[output_format](parts, temp_path, meta)
+    os.replace(temp_path, output_path)
+
+    if not keep_segments:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {"video": video_path, "frames": frames, "segments": len(segments), "seconds": time.monotonic() - started}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Phát hiện đối tượng trên video dài bằng cách xử lý song song từng đoạn")
+    parser.add_argument("video")
+    parser.add_argument("--model", default="YOLOv3", choices=list(YOLO_CONFIGS.keys()))
+    parser.add_argument("--classes", nargs="+", default=None,
+                        help="Danh sách đối tượng cần phát hiện (mặc định: tất cả)")
+    parser.add_argument("--output", default="results", help="Thư mục lưu kết quả")
+    parser.add_argument("--format", default="jsonl", choices=OUTPUT_FORMATS)
+    parser.add_argument("--segment-time", type=float, default=60, help="Độ dài mỗi đoạn (giây)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Số luồng OpenCV cho mỗi worker (mặc định: số core / số worker)")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--keep-segments", action="store_true", help="Giữ lại các đoạn video và kết quả từng đoạn")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    target_objects = [name.lower() for name in args.classes] if args.classes else list(CLASSES)
+    unknown = [name for name in target_objects if name not in CLASSES]
+    if unknown:
+        print(f"Đối tượng không hợp lệ: {', '.join(unknown)}")
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+    output_path = output_path_for(args.video, args.output, args.format)
+    try:
+        result = process_segmented(
+            args.video, output_path, args.model, target_objects, args.format, args.segment_time,
+            args.workers, args.threads, args.batch_size, keep_segments=args.keep_segments)
+    except Exception as e:
+        print(f"Lỗi: {str(e)}")
+        return 1
+
+    fps = result["frames"] / result["seconds"] if result["seconds"] > 0 else 0
+    print(f"Hoàn thành {result['frames']} frame ({result['segments']} đoạn) trong {result['seconds']:.1f}s"
+          f" ({fps:.1f} fps), kết quả: {output_path}")
+
+    if VIDEO_INDEX['update_after_batch']:
+        from video_index import update_index
+        try:
+            update_index([output_path])
+        except Exception as e:
+            print(f"Không cập nhật được index tìm kiếm: {str(e)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
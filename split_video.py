@@ -1,26 +1,86 @@
+"""Cắt video dài thành các đoạn theo keyframe, không mã hóa lại (ffmpeg -c copy)
+
+Ví dụ:
+    python split_video.py videoplayback.mp4 videos --segment-time 60
+"""
+import argparse
+import csv
 import os
+import shutil
 import subprocess
+import sys
+from collections import namedtuple
+
+# index: thứ tự đoạn; start_time/end_time: giây tính từ đầu video gốc
+Segment = namedtuple("Segment", ["index", "path", "start_time", "end_time"])
+
 
+def split_video(input_file, output_dir, segment_time=60, prefix=None, keep_audio=False):
+    """Cắt input_file thành các đoạn khoảng segment_time giây, trả về list Segment theo thứ tự
 
-def split_video(input_file, output_dir, segment_time="00:01:00"):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    Với -c copy, ffmpeg chỉ cắt được ở keyframe nên mỗi đoạn bắt đầu bằng một keyframe và
+    giải mã độc lập được; timestamp của mỗi đoạn được đặt lại về 0, thời điểm bắt đầu thật
+    lấy từ segment list.
+    """
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("Không tìm thấy ffmpeg")
+    os.makedirs(output_dir, exist_ok=True)
+
+    prefix = prefix or os.path.splitext(os.path.basename(input_file))[0]
+    extension = os.path.splitext(input_file)[1] or ".mp4"
+    list_file = os.path.join(output_dir, f"{prefix}_segments.csv")
 
     command = [
-        "ffmpeg",
+        "ffmpeg", "-v", "error", "-y",
         "-i", input_file,
-        "-c:v", "copy",
-        "-c:a", "aac",
-        "-map", "0",
-        "-segment_time", segment_time,
+        "-map", "0:v:0"
+    ]
+    if keep_audio:
+        command += ["-map", "0:a?"]
+    else:
+        command += ["-an"]
+    command += [
+        "-c", "copy",
         "-f", "segment",
-        os.path.join(output_dir, "vlog_%08d.mp4")
+        "-segment_time", str(segment_time),
+        "-reset_timestamps", "1",
+        "-segment_list", list_file,
+        "-segment_list_type", "csv",
+        os.path.join(output_dir, f"{prefix}_%05d{extension}")
     ]
-
     subprocess.run(command, check=True)
+    return read_segment_list(list_file)
+
+
+def read_segment_list(list_file):
+    """Đọc segment list dạng csv của ffmpeg: tên file, thời điểm bắt đầu, thời điểm kết thúc"""
+    directory = os.path.dirname(list_file)
+    segments = []
+    with open(list_file, "r", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            name, start_time, end_time = row[:3]
+            segments.append(Segment(len(segments), os.path.join(directory, name), float(start_time), float(end_time)))
+    return segments
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cắt video thành các đoạn theo keyframe (không mã hóa lại)")
+    parser.add_argument("input_file", nargs="?", default="videoplayback.mp4")
+    parser.add_argument("output_dir", nargs="?", default="videos")
+    parser.add_argument("--segment-time", type=float, default=60, help="Độ dài mỗi đoạn (giây)")
+    parser.add_argument("--keep-audio", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    segments = split_video(args.input_file, args.output_dir, args.segment_time, keep_audio=args.keep_audio)
+    for segment in segments:
+        print(f"{segment.path}: {segment.start_time:.3f}s - {segment.end_time:.3f}s")
+    return 0
 
 
 if __name__ == "__main__":
-    input_file = "videoplayback.mp4"
-    output_dir = "videos"
-    split_video(input_file, output_dir)
+    sys.exit(main())
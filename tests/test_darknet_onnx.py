@@ -0,0 +1,36 @@
+"""So sánh model ONNX chuyển từ Darknet với cv2.dnn (weights ngẫu nhiên, cùng cfg)"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("yolo")  # parity_detectors dựng YOLODetector cho cả hai engine
+
+from benchmark import bench_weights
+from config import YOLO_CONFIGS
+from darknet_onnx import convert, output_errors, parity_detectors
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOLERANCE = 1e-3
+
+
+@pytest.mark.parametrize("model_name", ["YOLOv2", "YOLOv3", "YOLOv4"])
+def test_onnx_matches_cv2_dnn(model_name, tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    config = YOLO_CONFIGS[model_name]
+    weights_path = bench_weights(model_name)
+    onnx_path = str(tmp_path / f"{model_name}.onnx")
+    convert(config['config'], weights_path, onnx_path, 320)
+
+    reference, candidate = parity_detectors(weights_path, config['config'], onnx_path)
+    assert candidate.input_size == (320, 320)
+
+    frame = cv2.imread("test_image.jpg")
+    box_error, score_error = output_errors(reference, candidate, frame)
+    assert box_error <= TOLERANCE
+    assert score_error <= TOLERANCE
@@ -0,0 +1,34 @@
+"""Giới hạn tần suất của DetectionLog và số key nó giữ lại"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detection_log import DetectionLog
+
+
+def test_rate_limit_per_key():
+    log = DetectionLog(rate_limit=2, rate_period=10.0)
+    assert log.allow("a", 0.0) == (True, 0)
+    assert log.allow("a", 1.0) == (True, 0)
+    assert log.allow("a", 2.0) == (False, 0)
+    assert log.allow("a", 3.0) == (False, 0)
+    # Cửa sổ mới: báo số thông báo đã bỏ qua
+    assert log.allow("a", 10.0) == (True, 2)
+
+
+def test_distinct_messages_keep_rates_bounded():
+    log = DetectionLog(max_entries=100)
+    for frame in range(10000):
+        log.error(f"Lỗi xử lý frame {frame}")
+    assert len(log.rates) <= 100
+    assert len(log.history()) == 100
+
+
+def test_stale_keys_are_pruned():
+    log = DetectionLog(max_entries=1000, rate_period=10.0)
+    for i in range(500):
+        log.allow(f"message {i}", 1.0 + i * 0.01)
+    assert len(log.rates) == 500
+    log.allow("later", 20.0)
+    assert list(log.rates) == ["later"]
@@ -0,0 +1,80 @@
+"""So sánh postprocess (numpy) với vòng lặp từng dòng cũ trên output ngẫu nhiên"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+YOLODetector = pytest.importorskip("yolo").YOLODetector
+
+CLASSES = [f"class_{i}" for i in range(80)]
+
+
+def make_detector(conf_threshold=0.5, nms_threshold=0.4):
+    # Không cần nạp mạng: postprocess chỉ dùng ngưỡng và danh sách lớp
+    detector = YOLODetector.__new__(YOLODetector)
+    detector.conf_threshold = conf_threshold
+    detector.nms_threshold = nms_threshold
+    detector.classes = CLASSES
+    detector._mask_key = None
+    detector._class_mask = None
+    return detector
+
+
+def loop_detections(detector, outputs, width, height, target_objects):
+    """Postprocess trước khi vector hóa, giữ nguyên để so sánh"""
+    class_ids = []
+    confidences = []
+    boxes = []
+
+    for output in outputs:
+        for detection in output:
+            scores = detection[5:]
+            class_id = np.argmax(scores)
+            confidence = scores[class_id]
+            if confidence > detector.conf_threshold and detector.classes[class_id] in target_objects:
+                center_x, center_y, w, h = (detection[0:4] * np.array([width, height, width, height])).astype('int')
+                x = int(center_x - w / 2)
+                y = int(center_y - h / 2)
+                boxes.append([x, y, int(w), int(h)])
+                confidences.append(float(confidence))
+                class_ids.append(class_id)
+
+    indices = cv2.dnn.NMSBoxes(boxes, confidences, detector.conf_threshold, detector.nms_threshold)
+    return [(detector.classes[class_ids[i]], confidences[i], boxes[i]) for i in np.array(indices, dtype=int).flatten()]
+
+
+def random_outputs(rng, rows=(300, 1200, 4800)):
+    """Output giống lớp yolo: box tương đối, xác suất lớp phần lớn nhỏ, một số dòng vượt ngưỡng"""
+    outputs = []
+    for count in rows:
+        output = rng.random((count, 5 + len(CLASSES)), dtype=np.float32)
+        output[:, 2:4] *= 0.3
+        output[:, 5:] *= 0.2
+        hits = rng.random(count) < 0.05
+        output[hits, 5 + rng.integers(0, len(CLASSES), hits.sum())] = rng.uniform(0.3, 1.0, hits.sum())
+        outputs.append(output)
+    return outputs
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_postprocess_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    detector = make_detector()
+    outputs = random_outputs(rng)
+    targets = [CLASSES[i] for i in rng.choice(len(CLASSES), 20, replace=False)]
+
+    expected = loop_detections(detector, outputs, 1280, 720, targets)
+    actual = detector.postprocess(outputs, 1280, 720, targets)
+    assert expected
+    assert actual == expected
+
+
+def test_postprocess_empty():
+    detector = make_detector()
+    outputs = [np.zeros((0, 85), dtype=np.float32)]
+    assert detector.postprocess(outputs, 640, 480, CLASSES) == []
+    assert detector.postprocess(random_outputs(np.random.default_rng(0)), 640, 480, []) == []
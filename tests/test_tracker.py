@@ -0,0 +1,95 @@
+"""Ghép detection với track, xác nhận track và chọn N detect của tracker.py"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("numpy")
+
+from tracker import AdaptiveInterval, Tracker, iou_matrix
+
+
+def ids(tracker):
+    return {class_name: track_id for track_id, class_name, _, _ in tracker.active_tracks()}
+
+
+def test_iou_matrix():
+    ious = iou_matrix([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 10, 10], [20, 20, 5, 5]])
+    assert ious.shape == (1, 3)
+    assert ious[0, 0] == pytest.approx(1.0)
+    assert ious[0, 1] == pytest.approx(50 / 150)
+    assert ious[0, 2] == 0
+
+
+def test_new_tracks_hidden_until_confirmed():
+    tracker = Tracker(min_hits=2)
+    assert tracker.update([("person", 0.9, [0, 0, 10, 20])]) == []
+    assert tracker.update([("person", 0.9, [1, 0, 10, 20])]) == [("person", 0.9, [1, 0, 10, 20])]
+
+
+def test_association_keeps_ids_and_classes():
+    tracker = Tracker(min_hits=1)
+    tracker.update([("person", 0.9, [0, 0, 10, 20]), ("car", 0.8, [100, 100, 40, 20])])
+    first = ids(tracker)
+    # Đổi thứ tự detections và dịch nhẹ: vẫn ghép đúng track
+    tracker.update([("car", 0.8, [102, 100, 40, 20]), ("person", 0.9, [1, 0, 10, 20])])
+    assert ids(tracker) == first
+
+    # Box trùng nhưng khác lớp: không ghép
+    tracker.update([("dog", 0.7, [102, 100, 40, 20])])
+    assert "dog" in ids(tracker)
+    assert ids(tracker)["dog"] not in first.values()
+
+
+def test_ids_persist_across_skipped_frames():
+    tracker = Tracker(min_hits=2)
+    tracker.update([("car", 0.8, [0, 0, 20, 10])])
+    tracker.update([("car", 0.8, [10, 0, 20, 10])])
+    track_id = ids(tracker)["car"]
+
+    # Frame không chạy mạng: box được đẩy theo vận tốc
+    assert tracker.predict() == [("car", 0.8, [20, 0, 20, 10])]
+    assert tracker.update([("car", 0.8, [30, 0, 20, 10])]) == [("car", 0.8, [30, 0, 20, 10])]
+    assert ids(tracker)["car"] == track_id
+
+
+def test_missed_tracks_are_hidden_then_dropped():
+    tracker = Tracker(max_age=1, min_hits=1)
+    tracker.update([("person", 0.9, [0, 0, 10, 20])])
+    assert tracker.update([]) == []
+    assert len(tracker.tracks) == 1
+    tracker.update([])
+    assert tracker.tracks == []
+
+
+def test_unique_counts():
+    tracker = Tracker(min_hits=2)
+    for x in range(5):
+        tracker.update([("person", 0.9, [x, 0, 10, 20]), ("car", 0.8, [200 + x, 0, 40, 20])])
+    # Detection chỉ xuất hiện một lần không được đếm
+    tracker.update([("person", 0.9, [4, 0, 10, 20]), ("car", 0.8, [204, 0, 40, 20]),
+                    ("dog", 0.6, [500, 500, 10, 10])])
+    assert tracker.counts() == {"person": 1, "car": 1}
+
+    # Sau khi tua: track mới nhưng số đếm giữ nguyên và tiếp tục tăng
+    tracker.reset()
+    tracker.update([("person", 0.9, [0, 0, 10, 20])])
+    tracker.update([("person", 0.9, [0, 0, 10, 20])])
+    assert tracker.counts() == {"person": 2, "car": 1}
+
+
+def test_adaptive_interval():
+    interval = AdaptiveInterval(fps=30, max_interval=5, smoothing=1.0)
+    assert [interval.due() for _ in range(3)] == [True, True, True]
+
+    interval.report_latency(0.1)  # 100 ms ở 30 fps: cần bỏ qua 2 frame
+    assert interval.interval == 3
+    # N mới áp dụng từ lần detect kế tiếp
+    assert [interval.due() for _ in range(6)] == [True, False, False, True, False, False]
+
+    interval.report_latency(1.0)
+    assert interval.interval == 5
+    interval.report_latency(0.001)
+    assert interval.interval == 1
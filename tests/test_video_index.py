@@ -0,0 +1,145 @@
+"""Cú pháp truy vấn, phép toán trên đoạn frame và cập nhật index của video_index"""
+import json
+import os
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from video_index import (RunBuilder, VideoIndex, at_least, complement, evaluate, intersect, parse_query,
+                         union)
+
+
+def make_entry(frames, total):
+    """Mục index từ list số đối tượng theo frame: frames[i] là dict lớp -> số"""
+    builder = RunBuilder()
+    for frame, counts in enumerate(frames):
+        builder.add(frame, Counter(counts))
+    builder.last_frame = total - 1
+    return {"frame_count": total, "classes": builder.finish()}
+
+
+# 10 frame: person 1-3 người ở frame 0-5, car ở frame 4-7, truck ở frame 9
+FRAMES = [
+    {"person": 1}, {"person": 1}, {"person": 3}, {"person": 3},
+    {"person": 2, "car": 1}, {"person": 2, "car": 1}, {"car": 2}, {"car": 2}, {}, {"truck": 1}
+]
+ENTRY = make_entry(FRAMES, 10)
+
+
+def test_run_builder_merges_equal_counts():
+    runs = ENTRY["classes"]
+    assert runs["person"] == [0, 2, 1, 2, 4, 3, 4, 6, 2]
+    assert runs["car"] == [4, 6, 1, 6, 8, 2]
+    assert runs["truck"] == [9, 10, 1]
+
+
+def test_run_builder_skipped_frames_split_runs():
+    builder = RunBuilder()
+    builder.add(0, {"person": 1})
+    builder.add(1, {"person": 1})
+    builder.add(5, {"person": 1})
+    assert builder.finish() == {"person": [0, 2, 1, 5, 6, 1]}
+
+
+def test_interval_algebra():
+    assert union([(0, 2), (5, 6)], [(1, 3)]) == [(0, 3), (5, 6)]
+    assert union([(0, 2)], [(2, 4)]) == [(0, 4)]
+    assert intersect([(0, 5), (7, 9)], [(3, 8)]) == [(3, 5), (7, 8)]
+    assert intersect([(0, 2)], [(2, 4)]) == []
+    assert complement([(2, 4), (6, 7)], 10) == [(0, 2), (4, 6), (7, 10)]
+    assert complement([], 3) == [(0, 3)]
+    assert at_least([0, 2, 1, 2, 4, 3, 4, 6, 2], 2, 10) == [(2, 6)]
+    assert at_least([], 0, 4) == [(0, 4)]
+
+
+def test_parse_query_precedence():
+    assert parse_query("person") == ("count", "person", ">=", 1)
+    assert parse_query("person>=3 and not car or truck") == (
+        "or", ("and", ("count", "person", ">=", 3), ("not", ("count", "car", ">=", 1))),
+        ("count", "truck", ">=", 1))
+    assert parse_query("person & (car | truck)") == (
+        "and", ("count", "person", ">=", 1), ("or", ("count", "car", ">=", 1), ("count", "truck", ">=", 1)))
+    assert parse_query('"traffic light" = 2') == ("count", "traffic light", "=", 2)
+    assert parse_query("traffic_light == 2") == ("count", "traffic light", "==", 2)
+
+
+@pytest.mark.parametrize("expression", ["", "person and", "(person", "person)", "dragon", "person >= car",
+                                        "person ^ car"])
+def test_parse_query_errors(expression):
+    with pytest.raises(ValueError):
+        parse_query(expression)
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("person", [(0, 6)]),
+    ("person>=3", [(2, 4)]),
+    ("person>2", [(2, 4)]),
+    ("person=2", [(4, 6)]),
+    ("person!=2", [(0, 4), (6, 10)]),
+    ("person<2", [(0, 2), (6, 10)]),
+    ("person<=1", [(0, 2), (6, 10)]),
+    ("car>=2", [(6, 8)]),
+    ("person and car", [(4, 6)]),
+    ("person or truck", [(0, 6), (9, 10)]),
+    ("not (person or car)", [(8, 10)]),
+    ("(car or truck) and not person", [(6, 8), (9, 10)]),
+    ("bus", []),
+    ("bus<1", [(0, 10)]),
+])
+def test_evaluate(expression, expected):
+    assert evaluate(parse_query(expression), ENTRY) == expected
+
+
+def write_result(path, video, frames):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"video": video, "fps": 25.0, "frame_count": len(frames)}) + "\n")
+        for frame, counts in enumerate(frames):
+            detections = [{"class": name, "confidence": 0.9, "box": [0, 0, 1, 1]}
+                          for name, count in counts.items() for _ in range(count)]
+            f.write(json.dumps({"frame": frame, "time": frame * 40.0, "detections": detections}) + "\n")
+
+
+def test_two_result_files_for_one_video(tmp_path):
+    results, exports = tmp_path / "results", tmp_path / "exports"
+    results.mkdir()
+    exports.mkdir()
+    video = str(tmp_path / "clip.mp4")
+    batch_path, export_path = results / "clip.jsonl", exports / "clip_export.jsonl"
+    write_result(batch_path, video, [{"person": 1}] * 4)
+    write_result(export_path, video, [{"car": 1}] * 4)
+    os.utime(batch_path, (1000, 1000))
+    os.utime(export_path, (2000, 2000))
+
+    index = VideoIndex(str(tmp_path / "index.json.gz"))
+    index.update_from_results([str(results), str(exports)])
+    assert len(index.videos) == 1
+    # Mục của video lấy từ file mới hơn, và lần cập nhật sau không đọc lại file nào
+    assert [video for video, _, _ in index.query("car")] == [os.path.normpath(video)]
+    assert index.update_from_results([str(results), str(exports)]) == (0, 0)
+
+    index.save()
+    index = VideoIndex.load(index.path)
+    assert index.update_from_results([str(results), str(exports)]) == (0, 0)
+
+    # Xóa file mới hơn: video được index lại từ file còn lại
+    os.remove(export_path)
+    assert index.update_from_results([str(results), str(exports)]) == (1, 1)
+    assert index.query("car") == []
+    assert len(index.query("person")) == 1
+
+
+def test_older_result_file_does_not_replace_newer(tmp_path):
+    video = str(tmp_path / "clip.mp4")
+    older, newer = tmp_path / "a_old.jsonl", tmp_path / "b_new.jsonl"
+    write_result(older, video, [{"person": 1}] * 4)
+    write_result(newer, video, [{"car": 1}] * 4)
+    os.utime(older, (1000, 1000))
+    os.utime(newer, (2000, 2000))
+
+    index = VideoIndex()
+    assert index.add_result(str(newer))
+    assert not index.add_result(str(older))
+    assert index.videos[os.path.normpath(video)]["source"] == os.path.normpath(str(newer))
@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import deque
+
+# Thứ tự hiển thị các stage (stage khác được thêm vào sau)
+STAGES = ["decode", "blob", "forward", "postprocess", "nms", "inference", "draw", "convert", "paint", "encode"]
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, q):
+    """Phân vị q (0-100) của list đã sắp xếp, nội suy tuyến tính như numpy.percentile"""
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class _Measure:
+    """Context manager đo thời gian một lần chạy stage"""
+    __slots__ = ("timings", "stage", "started")
+
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.record(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class StageTimings:
+    """Độ trễ theo từng stage: giữ window mẫu gần nhất, tính p50/p95/p99 và throughput khi cần"""
+
+    def __init__(self, window=500, enabled=True):
+        self.window = window
+        self.enabled = enabled
+        self.samples = {}  # stage -> deque[(thời điểm kết thúc, số giây)]
+        self.counts = {}  # stage -> tổng số lần đo từ lúc reset
+        self.totals = {}  # stage -> tổng số giây từ lúc reset (cặp với counts cho _sum của Prometheus)
+        self.lock = threading.Lock()
+
+    def measure(self, stage):
+        return _Measure(self, stage)
+
+    def record(self, stage, seconds):
+        """Ghi một mẫu (giây); thời điểm lấy từ đồng hồ monotonic"""
+        if not self.enabled:
+            return
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+                self.counts[stage] = 0
+                self.totals[stage] = 0.0
+            samples.append((time.perf_counter(), seconds))
+            self.counts[stage] += 1
+            self.totals[stage] += seconds
+
+    def summary(self):
+        """Dict stage -> {count, total_seconds, mean_ms, p50_ms, p95_ms, p99_ms, per_second}"""
+        with self.lock:
+            snapshot = {stage: list(samples) for stage, samples in self.samples.items()}
+            counts = dict(self.counts)
+            totals = dict(self.totals)
+
+        result = {}
+        for stage in sorted(snapshot, key=lambda name: (STAGES.index(name) if name in STAGES else len(STAGES), name)):
+            samples = snapshot[stage]
+            if not samples:
+                continue
+            durations = sorted(seconds * 1000 for _, seconds in samples)
+            p50, p95, p99 = (percentile(durations, q) for q in PERCENTILES)
+            span = samples[-1][0] - samples[0][0]
+            result[stage] = {
+                "count": counts[stage],
+                "total_seconds": totals[stage],
+                "mean_ms": sum(durations) / len(durations),
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                # Số lần chạy mỗi giây trong cửa sổ mẫu
+                "per_second": (len(samples) - 1) / span if span > 0 else 0.0
+            }
+        return result
+
+    def format_table(self):
+        """Bảng văn bản ngắn gọn để hiển thị trên giao diện"""
+        lines = [f"{'stage':<12}{'p50':>8}{'p95':>8}{'p99':>8}{'/s':>8}"]
+        for stage, row in self.summary().items():
+            lines.append(f"{stage:<12}{row['p50_ms']:>8.1f}{row['p95_ms']:>8.1f}"
+                         f"{row['p99_ms']:>8.1f}{row['per_second']:>8.1f}")
+        return "\n".join(lines)
+
+    def to_csv(self):
+        lines = ["stage,count,mean_ms,p50_ms,p95_ms,p99_ms,per_second"]
+        for stage, row in self.summary().items():
+            lines.append(f"{stage},{row['count']},{row['mean_ms']:.3f},{row['p50_ms']:.3f},"
+                         f"{row['p95_ms']:.3f},{row['p99_ms']:.3f},{row['per_second']:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def to_prometheus(self, prefix="yolodetects"):
+        """Định dạng văn bản của Prometheus (summary theo giây + counter + gauge throughput)"""
+        summary = self.summary()
+        lines = [
+            f"# HELP {prefix}_stage_latency_seconds Độ trễ của từng stage (cửa sổ trượt)",
+            f"# TYPE {prefix}_stage_latency_seconds summary"
+        ]
+        for stage, row in summary.items():
+            for q in PERCENTILES:
+                lines.append(f'{prefix}_stage_latency_seconds{{stage="{stage}",quantile="{q / 100}"}} '
+                             f"{row[f'p{q}_ms'] / 1000:.6f}")
+            lines.append(f'{prefix}_stage_latency_seconds_sum{{stage="{stage}"}} {row["total_seconds"]:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds_count{{stage="{stage}"}} {row["count"]}')
+        lines.append(f"# HELP {prefix}_stage_throughput Số lần chạy mỗi giây của từng stage")
+        lines.append(f"# TYPE {prefix}_stage_throughput gauge")
+        for stage, row in summary.items():
+            lines.append(f'{prefix}_stage_throughput{{stage="{stage}"}} {row["per_second"]:.3f}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Ghi ra file: .prom/.txt theo định dạng Prometheus, còn lại là CSV"""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_csv()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.counts.clear()
+            self.totals.clear()
+
+
+# Số liệu dùng chung cho toàn process (detector, các worker và giao diện)
+timings = StageTimings()
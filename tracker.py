@@ -0,0 +1,182 @@
+import math
+import threading
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU giữa từng cặp box (x, y, w, h) của hai mảng, tính cùng lúc bằng numpy"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = inter_w * inter_h
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    """Một đối tượng được theo dõi với mô hình vận tốc không đổi"""
+
+    def __init__(self, track_id, class_name, confidence, box):
+        self.id = track_id
+        self.class_name = class_name
+        self.confidence = confidence
+        self.box = np.array(box, dtype=np.float64)  # (x, y, w, h)
+        self.velocity = np.zeros(4)  # Thay đổi box mỗi frame
+        self.hits = 1
+        self.missed = 0  # Số lần detect liên tiếp không khớp
+        self.frames_since_update = 0
+
+    def predict(self):
+        """Dự đoán vị trí ở frame tiếp theo"""
+        self.box = self.box + self.velocity
+        self.box[2:] = np.maximum(self.box[2:], 1)
+        self.frames_since_update += 1
+
+    def update(self, confidence, box):
+        """Cập nhật bằng detection mới, ước lượng lại vận tốc"""
+        box = np.array(box, dtype=np.float64)
+        frames = max(1, self.frames_since_update)
+        # box hiện tại là giá trị đã dự đoán: quy ngược về box đo được lần trước
+        previous = self.box - self.velocity * self.frames_since_update
+        measured_velocity = (box - previous) / frames
+        self.velocity = measured_velocity if self.hits == 1 else 0.5 * self.velocity + 0.5 * measured_velocity
+
+        self.box = box
+        self.confidence = confidence
+        self.hits += 1
+        self.missed = 0
+        self.frames_since_update = 0
+
+    def as_detection(self):
+        return self.class_name, self.confidence, [int(round(v)) for v in self.box]
+
+
+class Tracker:
+    """Tracker kiểu SORT: ghép detection với track bằng IoU, dự đoán box ở các frame không detect"""
+
+    def __init__(self, iou_threshold=0.3, max_age=3, min_hits=2):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age  # Số lần detect liên tiếp không khớp trước khi xóa track
+        self.min_hits = min_hits  # Số lần khớp để tính là một đối tượng thật
+        self.tracks = []
+        self.next_id = 1
+        self.unique_counts = {}  # Số đối tượng khác nhau đã thấy theo từng lớp
+        # Inference thread cập nhật, decoder thread reset khi tua, render thread đọc số đếm
+        self.lock = threading.Lock()
+
+    def update(self, detections):
+        """Cập nhật với detections của frame vừa chạy mạng, trả về detections đã gán track"""
+        with self.lock:
+            return self.match(detections)
+
+    def match(self, detections):
+        """Phần xử lý của update (gọi khi đã giữ lock)"""
+        for track in self.tracks:
+            track.predict()
+
+        matched_tracks = set()
+        matched_detections = set()
+        if self.tracks and detections:
+            ious = iou_matrix([track.box for track in self.tracks], [box for _, _, box in detections])
+            # Chỉ ghép cùng lớp
+            track_classes = np.array([track.class_name for track in self.tracks])
+            detection_classes = np.array([class_name for class_name, _, _ in detections])
+            ious[track_classes[:, None] != detection_classes[None, :]] = 0
+
+            # Ghép tham lam theo IoU giảm dần
+            for flat in np.argsort(-ious, axis=None):
+                t, d = np.unravel_index(flat, ious.shape)
+                if ious[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_detections:
+                    continue
+                _, confidence, box = detections[d]
+                self.tracks[t].update(confidence, box)
+                self.count_if_confirmed(self.tracks[t])
+                matched_tracks.add(t)
+                matched_detections.add(d)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+
+        for d, (class_name, confidence, box) in enumerate(detections):
+            if d not in matched_detections:
+                track = Track(self.next_id, class_name, confidence, box)
+                self.next_id += 1
+                self.tracks.append(track)
+                self.count_if_confirmed(track)
+
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_age]
+        return self.current_detections()
+
+    def predict(self):
+        """Frame không chạy mạng: đẩy các track theo vận tốc và trả về box dự đoán"""
+        with self.lock:
+            for track in self.tracks:
+                track.predict()
+            return self.current_detections()
+
+    def visible(self, track):
+        # Chỉ hiển thị track đã xác nhận (khớp đủ min_hits lần) và vừa khớp ở lần detect gần nhất:
+        # detection lẻ một lần không làm box nhấp nháy
+        return track.missed == 0 and track.hits >= self.min_hits
+
+    def current_detections(self):
+        return [track.as_detection() for track in self.tracks if self.visible(track)]
+
+    def active_tracks(self):
+        """Danh sách (track_id, class_name, conf, box) của các track đang hiển thị"""
+        with self.lock:
+            return [(track.id, *track.as_detection()) for track in self.tracks if self.visible(track)]
+
+    def counts(self):
+        """Bản sao số đối tượng khác nhau theo lớp (đọc an toàn từ thread khác)"""
+        with self.lock:
+            return dict(self.unique_counts)
+
+    def count_if_confirmed(self, track):
+        if track.hits == self.min_hits:
+            self.unique_counts[track.class_name] = self.unique_counts.get(track.class_name, 0) + 1
+
+    def reset(self):
+        """Bỏ các track hiện tại (ví dụ sau khi tua), giữ nguyên số đếm đối tượng"""
+        with self.lock:
+            self.tracks = []
+
+
+class AdaptiveInterval:
+    """Chọn N (detect mỗi N frame) theo độ trễ inference đo được so với FPS nguồn"""
+
+    def __init__(self, fps, max_interval=5, smoothing=0.2):
+        self.fps = fps if fps > 0 else 30
+        self.max_interval = max(1, max_interval)
+        self.smoothing = smoothing
+        self.latency = None  # Độ trễ inference trung bình cho một frame (giây)
+        self.interval = 1
+        self.countdown = 0
+
+    def due(self):
+        """True nếu frame hiện tại cần chạy mạng"""
+        self.countdown -= 1
+        if self.countdown <= 0:
+            self.countdown = self.interval
+            return True
+        return False
+
+    def report_latency(self, seconds):
+        """Cập nhật độ trễ đo được và tính lại N"""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = (1 - self.smoothing) * self.latency + self.smoothing * seconds
+        needed = math.ceil(self.latency * self.fps)
+        self.interval = min(self.max_interval, max(1, needed))
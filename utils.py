@@ -1,50 +1,110 @@
+import threading
+from collections import OrderedDict
+
 import cv2
 import numpy as np
 
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+class OverlayRenderer:
+    """Vẽ kết quả phát hiện: chỉ trộn màu trong từng box, cache sẵn ảnh nhãn, dùng lại buffer"""
+
+    def __init__(self, alpha=0.3, max_sprites=512):
+        self.alpha = alpha  # Độ mờ (0-1)
+        self.max_sprites = max_sprites
+        self.sprites = OrderedDict()  # (nhãn, màu, font_scale, thickness, padding) -> ảnh nhãn
+        self.local = threading.local()  # Mỗi thread một buffer dùng lại khi vẽ ở độ phân giải hiển thị
+        self.lock = threading.Lock()  # Chỉ bảo vệ cache sprites, vẽ lên frame không cần khóa
+
+    def label_sprite(self, label, color, font_scale, thickness, padding):
+        """Ảnh nhãn (nền màu + chữ trắng) đã render sẵn, cache theo LRU"""
+        key = (label, color, font_scale, thickness, padding)
+        with self.lock:
+            sprite = self.sprites.get(key)
+            if sprite is not None:
+                self.sprites.move_to_end(key)
+                return sprite
+
+        # Render ngoài lock; sprite chỉ đọc sau khi tạo nên các thread dùng chung được
+        (label_w, label_h), _ = cv2.getTextSize(label, FONT, font_scale, thickness)
+        sprite = np.empty((label_h + 2 * padding, label_w + 2 * padding, 3), dtype=np.uint8)
+        sprite[:] = color
+        cv2.putText(sprite, label, (padding, label_h + padding), FONT, font_scale, (255, 255, 255), thickness)
+
+        with self.lock:
+            self.sprites[key] = sprite
+            if len(self.sprites) > self.max_sprites:
+                self.sprites.popitem(last=False)
+        return sprite
+
+    def blend_box(self, frame, x, y, w, h, color):
+        """Trộn màu nền mờ chỉ trong vùng box (không copy cả frame)"""
+        frame_h, frame_w = frame.shape[:2]
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(frame_w, x + w), min(frame_h, y + h)
+        if x2 <= x1 or y2 <= y1:
+            return
+        roi = frame[y1:y2, x1:x2]
+        cv2.addWeighted(roi, 1 - self.alpha, np.full_like(roi, color), self.alpha, 0, dst=roi)
+
+    @staticmethod
+    def paste(frame, sprite, x, y):
+        """Dán sprite vào frame tại góc trên trái (x, y), cắt phần nằm ngoài frame"""
+        frame_h, frame_w = frame.shape[:2]
+        sprite_h, sprite_w = sprite.shape[:2]
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(frame_w, x + sprite_w), min(frame_h, y + sprite_h)
+        if x2 <= x1 or y2 <= y1:
+            return
+        frame[y1:y2, x1:x2] = sprite[y1 - y:y2 - y, x1 - x:x2 - x]
+
+    def draw(self, frame, detections, object_colors, scale=1.0):
+        """Vẽ trực tiếp lên frame; scale là tỉ lệ frame đang vẽ / frame gốc của detections"""
+        font_scale = round(1.5 * scale, 2)  # Tăng kích thước font
+        thickness = max(1, round(3 * scale))  # Tăng độ dày viền và font
+        padding = max(1, round(5 * scale))
+
+        for class_name, confidence, box in detections:
+            x, y, w, h = (int(v * scale) for v in box)
+
+            # Lấy màu từ dict màu đã được định nghĩa
+            color = tuple(object_colors.get(class_name.lower(), {'rgb': (0, 0, 0)})['rgb'])
 
-def draw_detections(frame, detections, object_colors):
-    """Vẽ các kết quả phát hiện với màu nền mờ"""
-    overlay = frame.copy()
+            self.blend_box(frame, x, y, w, h, color)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, thickness)
 
-    for class_name, confidence, box in detections:
-        x, y, w, h = box
+            # Nhãn phía trên box, cùng độ tin cậy làm tròn 2 chữ số như khi hiển thị
+            sprite = self.label_sprite(f"{class_name}: {confidence:.2f}", color, font_scale, thickness, padding)
+            self.paste(frame, sprite, x, y - sprite.shape[0])
 
-        # Lấy màu từ dict màu đã được định nghĩa
-        color = object_colors.get(class_name.lower(), {'rgb': (0, 0, 0)})['rgb']
+        return frame
 
-        # Vẽ hình chữ nhật với màu nền mờ
-        cv2.rectangle(overlay, (x, y), (x + w, y + h), color, -1)
+    def draw_fit(self, frame, detections, object_colors, display_size, scale=1.0):
+        """Thu nhỏ frame vào buffer dùng lại theo kích thước hiển thị (giữ tỉ lệ) rồi vẽ trên đó"""
+        frame_h, frame_w = frame.shape[:2]
+        fit = min(display_size[0] / frame_w, display_size[1] / frame_h, 1.0)
+        size = (max(1, int(frame_w * fit)), max(1, int(frame_h * fit)))
 
-        # Vẽ viền đậm hơn
-        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 3)  # Tăng độ dày viền lên 3
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None or buffer.shape[:2] != (size[1], size[0]):
+            buffer = self.local.buffer = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        cv2.resize(frame, size, dst=buffer, interpolation=cv2.INTER_AREA)
 
-        # Thêm nhãn với font size lớn hơn
-        label = f"{class_name}: {confidence:.2f}"
-        font_scale = 1.5  # Tăng kích thước font
-        font_thickness = 3  # Tăng độ dày font
+        return self.draw(buffer, detections, object_colors, scale * fit)
 
-        # Tính toán kích thước text để vẽ background
-        (label_w, label_h), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)
 
-        # Vẽ background cho text với padding
-        padding = 5
-        cv2.rectangle(frame,
-                      (x, y - label_h - 2 * padding),
-                      (x + label_w + 2 * padding, y),
-                      color,
-                      -1)
+# Renderer dùng chung cho draw_detections
+_renderer = OverlayRenderer()
 
-        # Vẽ text
-        cv2.putText(frame,
-                    label,
-                    (x + padding, y - padding),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    font_scale,
-                    (255, 255, 255),
-                    font_thickness)
 
-    # Kết hợp frame gốc với overlay
-    alpha = 0.3  # Độ mờ (0-1)
-    cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+def draw_detections(frame, detections, object_colors, scale=1.0, display_size=None):
+    """Vẽ các kết quả phát hiện với màu nền mờ
 
-    return frame
+    scale: tỉ lệ giữa frame đang vẽ và frame gốc của detections (khi vẽ lên frame đã thu nhỏ)
+    display_size: (width, height) nếu muốn vẽ ở độ phân giải hiển thị thay vì độ phân giải gốc;
+    khi đó kết quả nằm trong buffer dùng lại của thread, cần copy/chuyển màu trước lần vẽ tiếp theo
+    """
+    if display_size is not None:
+        return _renderer.draw_fit(frame, detections, object_colors, display_size, scale)
+    return _renderer.draw(frame, detections, object_colors, scale)
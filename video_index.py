@@ -0,0 +1,524 @@
+"""Index ngược lớp -> đoạn frame cho cả thư viện video, để tìm kiếm không cần chạy lại video
+
+Mỗi video lưu, cho từng lớp, các đoạn frame liên tiếp có cùng số đối tượng (start, end, count)
+nên vừa trả lời được "có truck" vừa trả lời được "ít nhất 3 person". Index dựng từ file kết quả
+của batch_process/segment_process/exports (.jsonl, .npz) hoặc từ detection store, và chỉ dựng
+lại các video có file kết quả thay đổi.
+
+Ví dụ:
+    python video_index.py update results exports
+    python video_index.py query "person>=3 and truck"
+    python video_index.py query "(car or bus) and not person" --min-frames 30
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from config import VIDEO_INDEX, CLASSES
+
+RESULT_EXTENSIONS = ['.jsonl', '.npz']
+
+
+class RunBuilder:
+    """Gom số đối tượng từng frame (theo thứ tự frame tăng dần) thành các đoạn [start, end, count]"""
+
+    def __init__(self):
+        self.runs = {}  # lớp -> list phẳng start, end, count, start, end, count...
+        self.open = {}  # lớp -> đoạn đang mở [start, end, count]
+        self.last_frame = -1
+
+    def add(self, frame, counts):
+        for name in list(self.open):
+            run = self.open[name]
+            if run[1] == frame and counts.get(name) == run[2]:
+                run[1] = frame + 1
+            else:
+                self.runs.setdefault(name, []).extend(self.open.pop(name))
+        for name, count in counts.items():
+            if count > 0 and name not in self.open:
+                self.open[name] = [frame, frame + 1, count]
+        self.last_frame = max(self.last_frame, frame)
+
+    def finish(self):
+        for name, run in self.open.items():
+            self.runs.setdefault(name, []).extend(run)
+        self.open = {}
+        return self.runs
+
+
+def index_jsonl(path):
+    """(meta, runs) từ file jsonl: dòng đầu là meta, mỗi dòng sau là một frame"""
+    builder = RunBuilder()
+    with open(path, "r", encoding="utf-8") as f:
+        meta = json.loads(f.readline())
+        for line in f:
+            record = json.loads(line)
+            builder.add(record["frame"], Counter(d["class"] for d in record["detections"]))
+    return meta, builder
+
+
+def index_npz(path):
+    import numpy as np
+
+    builder = RunBuilder()
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        classes = meta["classes"]
+        # Đếm theo cặp (frame, lớp) một lần bằng numpy, sau đó duyệt theo thứ tự frame
+        keys = data["frame"].astype(np.int64) * len(classes) + data["class_id"]
+        keys, counts = np.unique(keys, return_counts=True)
+    frame_counts = {}
+    for key, count in zip(keys.tolist(), counts.tolist()):
+        frame, class_id = divmod(key, len(classes))
+        frame_counts.setdefault(frame, {})[classes[class_id]] = count
+    for frame in sorted(frame_counts):
+        builder.add(frame, frame_counts[frame])
+    return meta, builder
+
+
+INDEXERS = {'.jsonl': index_jsonl, '.npz': index_npz}
+
+
+def union(a, b):
+    merged = []
+    for start, end in sorted(a + b):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def intersect(a, b):
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start, end = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if start < end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def complement(ranges, total):
+    result = []
+    position = 0
+    for start, end in ranges:
+        if start > position:
+            result.append((position, start))
+        position = max(position, end)
+    if position < total:
+        result.append((position, total))
+    return result
+
+
+def at_least(runs, count, total):
+    """Các đoạn frame có ít nhất count đối tượng (runs là list phẳng start, end, count)"""
+    if count <= 0:
+        return [(0, total)] if total > 0 else []
+    ranges = []
+    for i in range(0, len(runs), 3):
+        if runs[i + 2] >= count:
+            if ranges and ranges[-1][1] == runs[i]:
+                ranges[-1] = (ranges[-1][0], runs[i + 1])
+            else:
+                ranges.append((runs[i], runs[i + 1]))
+    return ranges
+
+
+TOKEN = re.compile(r'\s*(?:(\()|(\))|(>=|<=|==|!=|>|<|=)|(\d+)|("[^"]*"|\'[^\']*\'|[A-Za-z_][\w-]*)|(&|\||!))')
+KEYWORDS = {"and": "&", "or": "|", "not": "!"}
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Không hiểu biểu thức tại: {expression[position:]}")
+        position = match.end()
+        lparen, rparen, op, number, name, symbol = match.groups()
+        if lparen or rparen:
+            tokens.append(("paren", lparen or rparen))
+        elif op:
+            tokens.append(("op", op))
+        elif number:
+            tokens.append(("number", int(number)))
+        elif symbol:
+            tokens.append(("logic", symbol))
+        elif name.lower() in KEYWORDS:
+            tokens.append(("logic", KEYWORDS[name.lower()]))
+        else:
+            # Tên lớp có dấu cách: viết trong ngoặc kép hoặc dùng "_" (traffic_light)
+            tokens.append(("name", name.strip("\"'").replace("_", " ").lower()))
+    return tokens
+
+
+def parse_query(expression):
+    """Biểu thức -> cây điều kiện
+
+    Cú pháp: lớp [>=|>|=|==|!=|<=|< số], kết hợp bằng and/or/not (hoặc &, |, !) và ngoặc.
+    Chỉ ghi tên lớp nghĩa là có ít nhất một đối tượng (person = person>=1).
+    """
+    tokens = tokenize(expression)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else (None, None)
+
+    def take():
+        nonlocal position
+        token = peek()
+        position += 1
+        return token
+
+    def parse_or():
+        node = parse_and()
+        while peek() == ("logic", "|"):
+            take()
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek() == ("logic", "&"):
+            take()
+            node = ("and", node, parse_not())
+        return node
+
+    def parse_not():
+        if peek() == ("logic", "!"):
+            take()
+            return ("not", parse_not())
+        if peek() == ("paren", "("):
+            take()
+            node = parse_or()
+            if take() != ("paren", ")"):
+                raise ValueError("Thiếu dấu )")
+            return node
+        kind, name = take()
+        if kind != "name":
+            raise ValueError(f"Cần tên lớp, gặp: {name}")
+        if name not in CLASSES:
+            raise ValueError(f"Không có lớp: {name}")
+        if peek()[0] == "op":
+            _, op = take()
+            kind, count = take()
+            if kind != "number":
+                raise ValueError(f"Cần số sau {name} {op}")
+            return ("count", name, op, count)
+        return ("count", name, ">=", 1)
+
+    node = parse_or()
+    if position < len(tokens):
+        raise ValueError(f"Thừa phần cuối biểu thức: {tokens[position][1]}")
+    return node
+
+
+def evaluate(node, entry):
+    """Các đoạn frame [start, end) của một video thỏa mãn cây điều kiện"""
+    total = entry["frame_count"]
+    kind = node[0]
+    if kind == "and":
+        return intersect(evaluate(node[1], entry), evaluate(node[2], entry))
+    if kind == "or":
+        return union(evaluate(node[1], entry), evaluate(node[2], entry))
+    if kind == "not":
+        return complement(evaluate(node[1], entry), total)
+
+    _, name, op, count = node
+    runs = entry["classes"].get(name, [])
+    if op == ">=":
+        return at_least(runs, count, total)
+    if op == ">":
+        return at_least(runs, count + 1, total)
+    if op == "<":
+        return complement(at_least(runs, count, total), total)
+    if op == "<=":
+        return complement(at_least(runs, count + 1, total), total)
+    exact = intersect(at_least(runs, count, total), complement(at_least(runs, count + 1, total), total))
+    return exact if op in ("=", "==") else complement(exact, total)
+
+
+class VideoIndex:
+    """Index của thư viện: video -> {fps, số frame, lớp -> đoạn frame}, lưu thành JSON nén gzip"""
+
+    VERSION = 2
+
+    def __init__(self, path=None):
+        self.path = path
+        self.videos = {}
+        # File kết quả đã đọc -> {source_key, video}: một video có thể có nhiều file kết quả
+        # (batch .jsonl, file đi kèm video xuất từ giao diện) nên nhớ theo file, không theo video
+        self.sources = {}
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or VIDEO_INDEX['path']
+        index = cls(path)
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == cls.VERSION:
+                index.videos = data["videos"]
+                index.sources = data["sources"]
+        return index
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".part"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "videos": self.videos, "sources": self.sources}, f,
+                      separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+    def add(self, video, fps, builder, source, source_key):
+        runs = builder.finish()
+        self.videos[os.path.normpath(video)] = {
+            "source": source,
+            "source_key": source_key,
+            "fps": fps or 0,
+            "frame_count": builder.last_frame + 1,
+            "classes": runs
+        }
+
+    def add_result(self, path):
+        """Index (lại) một file kết quả; trả về False nếu mục của video không đổi
+
+        Video có nhiều file kết quả giữ mục của file sửa đổi gần nhất; file không đổi từ lần trước
+        thì không đọc lại.
+        """
+        stat = os.stat(path)
+        source_key = [stat.st_size, stat.st_mtime]
+        source = os.path.normpath(path)
+        known = self.sources.get(source)
+        if known is not None and known["source_key"] == source_key:
+            return False
+
+        meta, builder = INDEXERS[os.path.splitext(path)[1].lower()](path)
+        # Số frame thật lấy từ meta: frame cuối không có đối tượng vẫn thuộc video
+        builder.last_frame = max(builder.last_frame, int(meta.get("frame_count") or 0) - 1)
+        video = os.path.normpath(meta.get("video") or path)
+        self.sources[source] = {"source_key": source_key, "video": video}
+
+        entry = self.videos.get(video)
+        if entry is not None and entry["source"] != source and entry["source"] in self.sources \
+                and entry["source_key"][1] > stat.st_mtime:
+            return False  # Đã có mục từ file kết quả mới hơn
+        self.add(video, meta.get("fps"), builder, source, source_key)
+        return True
+
+    def remove_missing(self, directories):
+        """Bỏ các file kết quả đã bị xóa trong directories; trả về số video bị xóa khỏi index
+
+        Video còn file kết quả khác được index lại từ file đó ở lần add_result tiếp theo.
+        """
+        missing = [source for source in self.sources
+                   if os.path.dirname(source) in directories and not os.path.exists(source)]
+        removed = 0
+        for source in missing:
+            video = self.sources.pop(source)["video"]
+            entry = self.videos.get(video)
+            if entry is not None and entry["source"] == source:
+                del self.videos[video]
+                removed += 1
+                # Quên các file còn lại của video để chúng được đọc lại
+                for other in [s for s, known in self.sources.items() if known["video"] == video]:
+                    del self.sources[other]
+        return removed
+
+    def update_from_results(self, sources):
+        """Index các file kết quả mới/đã đổi trong các thư mục (hoặc file) sources, bỏ mục đã bị xóa"""
+        files = []
+        directories = []
+        for source in sources:
+            if os.path.isdir(source):
+                directories.append(os.path.normpath(source))
+                files += [os.path.join(source, name) for name in sorted(os.listdir(source))
+                          if os.path.splitext(name)[1].lower() in RESULT_EXTENSIONS]
+            elif os.path.isfile(source):
+                files.append(source)
+
+        # Bỏ file đã xóa trước để video còn file kết quả khác được index lại ngay trong lần này
+        removed = self.remove_missing(directories)
+        changed = 0
+        for path in files:
+            try:
+                if self.add_result(path):
+                    changed += 1
+            except Exception as e:
+                print(f"Bỏ qua {path}: {str(e)}")
+        return changed, removed
+
+    def update_from_store(self, store_path="cache/detections.sqlite", model=None):
+        """Index các lần chạy trong detection store (lần chạy mới nhất của mỗi video)
+
+        Store chỉ có các frame đã từng được phát nên frame chưa phát coi như không có đối tượng.
+        """
+        import sqlite3
+        import numpy as np
+        from detection_store import DETECTION_DTYPE
+
+        with open("coco.names", "r") as f:
+            classes = [line.strip() for line in f.readlines()]
+
+        conn = sqlite3.connect(store_path)
+        try:
+            query = ("SELECT runs.id, files.path, COUNT(frames.frame), MAX(frames.frame) FROM runs"
+                     " JOIN files ON files.hash = runs.video_hash JOIN frames ON frames.run_id = runs.id")
+            params = ()
+            if model:
+                query += " WHERE runs.model = ?"
+                params = (model,)
+            latest = {}
+            for run_id, video, frame_rows, last_frame in conn.execute(query + " GROUP BY runs.id, files.path", params):
+                if os.path.exists(video) and (video not in latest or run_id > latest[video][0]):
+                    latest[video] = (run_id, [frame_rows, last_frame])
+
+            changed = 0
+            for video, (run_id, source_key) in latest.items():
+                source = f"store:{run_id}"
+                entry = self.videos.get(os.path.normpath(video))
+                if entry is not None and entry["source"] == source and entry["source_key"] == source_key:
+                    continue
+                builder = RunBuilder()
+                for frame, data in conn.execute(
+                        "SELECT frame, data FROM frames WHERE run_id = ? ORDER BY frame", (run_id,)):
+                    class_ids = np.frombuffer(data, dtype=DETECTION_DTYPE)['class_id']
+                    builder.add(frame, Counter(classes[int(i)] for i in class_ids))
+                self.add(video, video_fps(video), builder, source, source_key)
+                changed += 1
+        finally:
+            conn.close()
+        return changed
+
+    def query(self, expression, min_frames=1, videos=None):
+        """List (video, fps, [(start, end), ...]) các video có đoạn thỏa mãn biểu thức
+
+        min_frames: bỏ các đoạn ngắn hơn số frame này; videos: chỉ tìm trong các video này.
+        """
+        node = parse_query(expression)
+        results = []
+        for video, entry in sorted(self.videos.items()):
+            if videos is not None and video not in videos:
+                continue
+            ranges = [(start, end) for start, end in evaluate(node, entry) if end - start >= min_frames]
+            if ranges:
+                results.append((video, entry["fps"], ranges))
+        return results
+
+    def first_match(self, video, expression, after=-1):
+        """Frame đầu tiên sau after của video thỏa mãn biểu thức (None nếu không có)"""
+        entry = self.videos.get(os.path.normpath(video))
+        if entry is None:
+            return None
+        for start, end in evaluate(parse_query(expression), entry):
+            if end - 1 > after:
+                return max(start, after + 1)
+        return None
+
+
+def update_index(result_paths, index_path=None):
+    """Thêm các file kết quả vừa xử lý xong vào index (gọi sau batch_process/segment_process)"""
+    index = VideoIndex.load(index_path)
+    changed = sum(1 for path in result_paths if index.add_result(path))
+    if changed:
+        index.save()
+    return changed
+
+
+def video_fps(path):
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps
+
+
+def format_time(frame, fps):
+    if not fps:
+        return f"frame {frame}"
+    seconds = frame / fps
+    return f"{int(seconds // 3600):d}:{int(seconds // 60 % 60):02d}:{seconds % 60:04.1f}"
+
+
+def format_range(start, end, fps):
+    """Đoạn [start, end) dạng thời gian kèm số frame"""
+    return f"{format_time(start, fps)} - {format_time(end, fps)} (frame {start}-{end - 1})"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Index tìm kiếm lớp -> đoạn frame cho thư viện video")
+    parser.add_argument("--index", default=VIDEO_INDEX['path'], help="File index (JSON nén gzip)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = commands.add_parser("update", help="Index các file kết quả mới hoặc đã thay đổi")
+    update_parser.add_argument("sources", nargs="*", default=VIDEO_INDEX['sources'],
+                               help="Thư mục hoặc file kết quả (.jsonl, .npz)")
+    update_parser.add_argument("--store", nargs="?", const="cache/detections.sqlite", default=None,
+                               help="Index thêm detection store")
+    update_parser.add_argument("--model", default=None, help="Chỉ lấy lần chạy của model này trong store")
+
+    query_parser = commands.add_parser("query", help='Tìm đoạn video, ví dụ "person>=3 and truck"')
+    query_parser.add_argument("expression")
+    query_parser.add_argument("--min-frames", type=int, default=1, help="Bỏ các đoạn ngắn hơn số frame này")
+    query_parser.add_argument("--limit", type=int, default=20, help="Số đoạn hiển thị tối đa mỗi video")
+
+    commands.add_parser("stats", help="Thống kê index")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    index = VideoIndex.load(args.index)
+
+    if args.command == "update":
+        started = time.perf_counter()
+        changed, removed = index.update_from_results(args.sources)
+        if args.store:
+            changed += index.update_from_store(args.store, args.model)
+        index.save()
+        print(f"Đã index {changed} video, xóa {removed} video trong {time.perf_counter() - started:.2f}s"
+              f" (tổng {len(index.videos)} video): {args.index}")
+        return 0
+
+    if args.command == "stats":
+        for video, entry in sorted(index.videos.items()):
+            classes = ", ".join(f"{name} {len(runs) // 3}" for name, runs in sorted(entry["classes"].items()))
+            print(f"{video}: {entry['frame_count']} frame, {entry['fps']:.2f} fps | {classes}")
+        print(f"Tổng {len(index.videos)} video")
+        return 0
+
+    started = time.perf_counter()
+    try:
+        results = index.query(args.expression, args.min_frames)
+    except ValueError as e:
+        print(f"Lỗi: {str(e)}")
+        return 2
+    elapsed = (time.perf_counter() - started) * 1000
+
+    for video, fps, ranges in results:
+        print(f"{video}: {len(ranges)} đoạn")
+        for start, end in ranges[:args.limit]:
+            print(f"  {format_range(start, end, fps)}")
+        if len(ranges) > args.limit:
+            print(f"  ... còn {len(ranges) - args.limit} đoạn")
+    print(f"{len(results)}/{len(index.videos)} video khớp trong {elapsed:.1f} ms")
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
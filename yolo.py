@@ -0,0 +1,179 @@
+import cv2
+import numpy as np
+
+from engines import create_engine
+from timing import timings
+
+
+class YOLODetector:
+    def __init__(self, weights_path, config_path, conf_threshold=0.5, nms_threshold=0.4, batch_size=1,
+                 backend="auto", input_size=(416, 416), engine=None):
+        # backend: "auto" dùng GPU nếu có, "cpu" luôn chạy trên CPU
+        # engine: dict chọn engine chạy mạng (xem engines.py), mặc định là OpenCV DNN
+        self.backend = backend
+        self.engine = create_engine(weights_path, config_path, engine, backend)
+        self.device = self.engine.device
+
+        self.conf_threshold = conf_threshold
+        self.nms_threshold = nms_threshold
+        self.batch_size = max(1, int(batch_size))
+        self.set_input_size(input_size)
+
+        with open("coco.names", "r") as f:
+            self.classes = [line.strip() for line in f.readlines()]
+
+        # Cache mask lớp theo danh sách đối tượng cần phát hiện
+        self._mask_key = None
+        self._class_mask = None
+
+    def set_input_size(self, input_size):
+        """Đổi kích thước blob đầu vào (bội số của 32); mạng Darknet tự reshape, không cần nạp lại"""
+        if isinstance(input_size, int):
+            input_size = (input_size, input_size)
+        # Model ONNX chỉ chạy ở kích thước đã xuất
+        self.input_size = self.engine.fixed_input_size or tuple(input_size)
+
+    def warmup(self):
+        """Chạy một lần forward với frame rỗng để cấp phát bộ nhớ trước khi dùng thật"""
+        width, height = self.input_size
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.detect_batch([frame] * self.batch_size, [])
+
+    def get_class_mask(self, target_objects):
+        """Trả về mask boolean theo chỉ số lớp cho các đối tượng cần phát hiện"""
+        key = tuple(target_objects)
+        if key != self._mask_key:
+            targets = set(target_objects)
+            self._class_mask = np.array([name in targets for name in self.classes], dtype=bool)
+            self._mask_key = key
+        return self._class_mask
+
+    def detect(self, frame, target_objects):
+        height, width, _ = frame.shape
+
+        # Chuyển frame sang blob
+        with timings.measure("blob"):
+            blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, self.input_size, swapRB=True, crop=False)
+
+        # KHÔNG chuyển blob sang tensor PyTorch, giữ nguyên dạng numpy array
+        with timings.measure("forward"):
+            outputs = self.engine.forward(blob)
+
+        return self.postprocess(outputs, width, height, target_objects)
+
+    def detect_batch(self, frames, target_objects):
+        """Phát hiện đối tượng trên nhiều frame, mỗi batch chỉ forward một lần"""
+        results = []
+        for start in range(0, len(frames), self.batch_size):
+            chunk = frames[start:start + self.batch_size]
+
+            # Gộp các frame thành một blob N x 3 x H x W
+            with timings.measure("blob"):
+                blob = cv2.dnn.blobFromImages(chunk, 1 / 255.0, self.input_size, swapRB=True, crop=False)
+            with timings.measure("forward"):
+                outputs = self.engine.forward(blob)
+
+            # Tách output của từng frame trong batch (batch = 1 trả về mảng 2 chiều)
+            outputs = [output.reshape(len(chunk), -1, output.shape[-1]) for output in outputs]
+            for i, frame in enumerate(chunk):
+                height, width = frame.shape[:2]
+                results.append(self.postprocess([output[i] for output in outputs], width, height, target_objects))
+
+        return results
+
+    def detect_regions(self, frame, regions, target_objects):
+        """Chỉ detect trong các vùng (x, y, w, h) của frame, các vùng được gộp chung batch"""
+        height, width = frame.shape[:2]
+        crops = []
+        offsets = []
+        for x, y, w, h in regions:
+            # Giới hạn vùng trong frame
+            x1, y1 = max(0, int(x)), max(0, int(y))
+            x2, y2 = min(width, int(x + w)), min(height, int(y + h))
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                continue
+            crops.append(frame[y1:y2, x1:x2])
+            offsets.append((x1, y1))
+
+        detections = []
+        for crop_detections, (dx, dy) in zip(self.detect_batch(crops, target_objects), offsets):
+            # Đổi tọa độ box từ vùng cắt về frame gốc
+            for class_name, conf, (x, y, w, h) in crop_detections:
+                detections.append((class_name, conf, [x + dx, y + dy, w, h]))
+
+        # Vùng chồng lên nhau có thể cho cùng một đối tượng: NMS lại trên toàn frame
+        return self.merge_detections(detections) if len(offsets) > 1 else detections
+
+    def detect_tiled(self, frame, target_objects, tile_size=832, overlap=0.2, include_full_frame=True):
+        """Chia frame độ phân giải cao thành các ô chồng lấn để giữ được đối tượng nhỏ"""
+        height, width = frame.shape[:2]
+        regions = tile_regions(width, height, tile_size, overlap)
+        if include_full_frame and len(regions) > 1:
+            # Thêm cả frame để không cắt mất các đối tượng lớn hơn một ô
+            regions.append((0, 0, width, height))
+        return self.detect_regions(frame, regions, target_objects)
+
+    def merge_detections(self, detections):
+        """NMS trên detections gộp từ nhiều vùng/ô"""
+        if not detections:
+            return []
+        boxes = [box for _, _, box in detections]
+        confidences = [conf for _, conf, _ in detections]
+        indices = cv2.dnn.NMSBoxes(boxes, confidences, self.conf_threshold, self.nms_threshold)
+        return [detections[i] for i in np.array(indices, dtype=int).flatten()]
+
+    def postprocess(self, outputs, width, height, target_objects):
+        """Lọc kết quả của mạng bằng numpy (không lặp từng dòng) và áp dụng NMS"""
+        with timings.measure("postprocess"):
+            return self.filter_outputs(outputs, width, height, target_objects)
+
+    def filter_outputs(self, outputs, width, height, target_objects):
+        """Phần xử lý của postprocess (tách riêng để đo thời gian)"""
+        # Gộp tất cả output layer thành một mảng (N, 5 + số lớp)
+        data = np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs])
+        if data.size == 0:
+            return []
+
+        scores = data[:, 5:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+
+        class_mask = self.get_class_mask(target_objects)
+        keep = (confidences > self.conf_threshold) & class_mask[class_ids]
+        if not keep.any():
+            return []
+
+        data = data[keep]
+        class_ids = class_ids[keep]
+        confidences = confidences[keep]
+
+        # Đổi (cx, cy, w, h) tương đối sang (x, y, w, h) theo pixel cho tất cả box cùng lúc
+        center_x, center_y, w, h = (data[:, :4] * np.array([width, height, width, height])).astype(int).T
+        x = (center_x - w / 2).astype(int)
+        y = (center_y - h / 2).astype(int)
+        boxes = np.stack([x, y, w, h], axis=1).tolist()
+        confidences = confidences.astype(float).tolist()
+
+        with timings.measure("nms"):
+            indices = cv2.dnn.NMSBoxes(boxes, confidences, self.conf_threshold, self.nms_threshold)
+
+        detections = []
+        for i in np.array(indices, dtype=int).flatten():
+            detections.append((self.classes[class_ids[i]], confidences[i], boxes[i]))
+
+        return detections
+
+
+def tile_regions(width, height, tile_size, overlap=0.2):
+    """Các ô vuông tile_size phủ kín frame, chồng lấn nhau theo tỉ lệ overlap"""
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        stride = max(1, int(tile_size * (1 - overlap)))
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)  # Ô cuối sát mép frame
+        return positions
+
+    tile_w = min(tile_size, width)
+    tile_h = min(tile_size, height)
+    return [(x, y, tile_w, tile_h) for y in starts(height) for x in starts(width)]